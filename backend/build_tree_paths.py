@@ -1,79 +1,86 @@
 #!/usr/bin/env python3
 """
-Migration script to build tree_path for all existing users.
+Bulk rebuild tool for the user hierarchy index.
 
 This script:
-1. Finds all supermasters and assigns them root tree_paths (1, 2, 3...)
-2. Assigns all other users under the first supermaster
-3. Updates level and tree_path for all users
+1. Rebuilds the user_closure table from users.parent_id (one recursive CTE)
+2. Recomputes tree_path ("1/5/23") and level for every user from the closure
+3. Recomputes the per-user downline counters (user_downline_counts)
+4. Optionally (--reset-parents) re-parents every non-supermaster under the
+   first supermaster first - the original one-off bootstrap behaviour
 
-Run this ONCE after deploying the hierarchy scoping system.
+Safe to re-run at any time; without --reset-parents it never changes parent_id.
+
+Usage:
+    python build_tree_paths.py
+    python build_tree_paths.py --reset-parents
 """
 
+import argparse
+from sqlalchemy import func
 from src.app import create_app
 from src.models.user import User
+from src.models.user_closure import UserClosure
+from src.models.user_downline_count import UserDownlineCount
 from src.database import db
 
-def build_tree_paths():
-    """Build tree_path for all users"""
+
+def reset_parents():
+    """Assign supermasters as roots and everyone else under the first supermaster"""
+    supermasters = User.query.filter_by(role='supermaster').order_by(User.id).all()
+    print(f"👑 Supermasters: {len(supermasters)}")
+    
+    if not supermasters:
+        print("⚠️  No supermaster found, parents left unchanged")
+        return
+    
+    User.query.filter(User.role == 'supermaster').update(
+        {User.parent_id: None}, synchronize_session=False
+    )
+    moved = User.query.filter(User.role != 'supermaster').update(
+        {User.parent_id: supermasters[0].id}, synchronize_session=False
+    )
+    print(f"📌 Assigned {moved} users under: {supermasters[0].email}")
+
+
+def build_tree_paths(reset=False):
+    """Rebuild the closure table, tree_path and level for all users"""
     
     app = create_app()
     with app.app_context():
-        print("🔧 Building tree_path for all users...")
+        print("🔧 Rebuilding user hierarchy index...")
         print("=" * 60)
         
-        # Get all users
-        all_users = User.query.all()
-        print(f"📊 Found {len(all_users)} users")
+        if reset:
+            reset_parents()
         
-        # Find supermasters
-        supermasters = [u for u in all_users if u.role == 'supermaster']
-        other_users = [u for u in all_users if u.role != 'supermaster']
+        closure_rows = UserClosure.rebuild()
+        print(f"✅ user_closure rebuilt: {closure_rows} rows")
         
-        print(f"👑 Supermasters: {len(supermasters)}")
-        print(f"👥 Other users: {len(other_users)}")
-        print()
+        updated = UserClosure.rebuild_tree_paths()
+        print(f"✅ tree_path/level recomputed for {updated} users")
         
-        # Assign tree_path to supermasters
-        for idx, sm in enumerate(supermasters, start=1):
-            sm.tree_path = str(idx)
-            sm.level = 0
-            sm.parent_id = None
-            print(f"✅ {sm.email} (supermaster) -> tree_path={sm.tree_path}, level={sm.level}")
+        buckets = UserDownlineCount.rebuild()
+        print(f"✅ downline counters rebuilt: {buckets} buckets")
         
-        # Commit supermasters first
         db.session.commit()
-        print()
-        
-        # Assign other users under first supermaster
-        if supermasters and other_users:
-            first_supermaster = supermasters[0]
-            print(f"📌 Assigning other users under: {first_supermaster.email}")
-            print()
-            
-            for idx, user in enumerate(other_users, start=1):
-                user.parent_id = first_supermaster.id
-                user.level = 1
-                user.tree_path = f"{first_supermaster.tree_path}.{idx}"
-                print(f"✅ {user.email} ({user.role}) -> tree_path={user.tree_path}, level={user.level}, parent={first_supermaster.email}")
-            
-            db.session.commit()
         
+        # Verify: every user must have exactly one self row
+        users = db.session.query(func.count(User.id)).scalar()
+        self_rows = db.session.query(func.count()).select_from(UserClosure).filter(
+            UserClosure.depth == 0
+        ).scalar()
         print()
-        print("=" * 60)
-        print("✅ Tree paths built successfully!")
-        print()
-        
-        # Verify
-        print("📋 Final hierarchy:")
-        print("-" * 60)
-        all_users = User.query.order_by(User.tree_path).all()
-        for u in all_users:
-            parent = User.query.get(u.parent_id) if u.parent_id else None
-            parent_email = parent.email if parent else "None"
-            print(f"  {u.email:30s} | tree_path={u.tree_path:10s} | level={u.level} | parent={parent_email}")
+        print(f"📋 Users: {users}, self rows: {self_rows}, max depth: "
+              f"{db.session.query(func.max(UserClosure.depth)).scalar()}")
+        if users != self_rows:
+            print("⚠️  Mismatch - check for parent_id cycles deeper than the rebuild guard")
         print("=" * 60)
 
-if __name__ == "__main__":
-    build_tree_paths()
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the user hierarchy index')
+    parser.add_argument('--reset-parents', action='store_true',
+                        help='Re-parent all non-supermasters under the first supermaster first')
+    args = parser.parse_args()
+    build_tree_paths(reset=args.reset_parents)
@@ -0,0 +1,102 @@
+"""Add daily analytics rollup tables
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create rollup tables and the indexes used by the catch-up job"""
+    
+    op.create_table('analytics_daily_payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('payment_method', sa.String(length=50), nullable=True),
+        sa.Column('payment_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_amount', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analytics_daily_payments_day_tenant', 'analytics_daily_payments', ['day', 'tenant_id'], unique=False)
+    
+    op.create_table('analytics_daily_registrations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('registrations', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analytics_daily_registrations_day_tenant', 'analytics_daily_registrations', ['day', 'tenant_id'], unique=False)
+    
+    op.create_table('analytics_daily_challenges',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('challenge_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analytics_daily_challenges_day_tenant', 'analytics_daily_challenges', ['day', 'tenant_id'], unique=False)
+    
+    op.create_table('analytics_daily_kyc',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('submissions', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analytics_daily_kyc_day_tenant', 'analytics_daily_kyc', ['day', 'tenant_id'], unique=False)
+    
+    op.create_table('analytics_rollup_state',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=True),
+        sa.Column('completed_through', sa.Date(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    
+    # Watermark scans and live-bucket reads
+    op.create_index('ix_payment_created_at', 'payments', ['created_at'], unique=False)
+    op.create_index('ix_payment_updated_at', 'payments', ['updated_at'], unique=False)
+    op.create_index('ix_challenge_created_at', 'challenges', ['created_at'], unique=False)
+    op.create_index('ix_challenge_updated_at', 'challenges', ['updated_at'], unique=False)
+    op.create_index('ix_user_created_at', 'users', ['created_at'], unique=False)
+    op.create_index('ix_user_updated_at', 'users', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop rollup tables and watermark indexes"""
+    
+    op.drop_index('ix_user_updated_at', table_name='users')
+    op.drop_index('ix_user_created_at', table_name='users')
+    op.drop_index('ix_challenge_updated_at', table_name='challenges')
+    op.drop_index('ix_challenge_created_at', table_name='challenges')
+    op.drop_index('ix_payment_updated_at', table_name='payments')
+    op.drop_index('ix_payment_created_at', table_name='payments')
+    
+    op.drop_table('analytics_rollup_state')
+    
+    op.drop_index('ix_analytics_daily_kyc_day_tenant', table_name='analytics_daily_kyc')
+    op.drop_table('analytics_daily_kyc')
+    
+    op.drop_index('ix_analytics_daily_challenges_day_tenant', table_name='analytics_daily_challenges')
+    op.drop_table('analytics_daily_challenges')
+    
+    op.drop_index('ix_analytics_daily_registrations_day_tenant', table_name='analytics_daily_registrations')
+    op.drop_table('analytics_daily_registrations')
+    
+    op.drop_index('ix_analytics_daily_payments_day_tenant', table_name='analytics_daily_payments')
+    op.drop_table('analytics_daily_payments')
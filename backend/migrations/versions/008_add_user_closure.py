@@ -0,0 +1,50 @@
+"""Add user_closure hierarchy index
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the ancestor/descendant closure table and populate it from parent_id"""
+    
+    op.create_table('user_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_user_closure_descendant', 'user_closure', ['descendant_id', 'ancestor_id'], unique=False)
+    
+    # Backfill: every user is its own depth-0 ancestor, then walk parent_id down
+    op.execute("""
+        INSERT INTO user_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM users
+            UNION ALL
+            SELECT tree.ancestor_id, users.id, tree.depth + 1
+            FROM tree JOIN users ON users.parent_id = tree.descendant_id
+            WHERE tree.depth < 100
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+
+
+def downgrade() -> None:
+    """Drop the closure table"""
+    
+    op.drop_index('ix_user_closure_descendant', table_name='user_closure')
+    op.drop_table('user_closure')
@@ -0,0 +1,62 @@
+"""Add per-agent commission summaries
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create agent_commission_summaries and backfill it from commissions"""
+    
+    op.create_table('agent_commission_summaries',
+        sa.Column('agent_id', sa.Integer(), nullable=False),
+        sa.Column('pending_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_amount', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+        sa.Column('approved_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('approved_amount', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+        sa.Column('paid_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('paid_amount', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['agent_id'], ['agents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('agent_id')
+    )
+    
+    # Backfill every agent (zero rows included) with one grouped scan of commissions
+    op.execute("""
+        INSERT INTO agent_commission_summaries (
+            agent_id,
+            pending_count, pending_amount,
+            approved_count, approved_amount,
+            paid_count, paid_amount,
+            updated_at
+        )
+        SELECT
+            agents.id,
+            COUNT(*) FILTER (WHERE c.status = 'pending'),
+            COALESCE(SUM(c.commission_amount) FILTER (WHERE c.status = 'pending'), 0),
+            COUNT(*) FILTER (WHERE c.status = 'approved'),
+            COALESCE(SUM(c.commission_amount) FILTER (WHERE c.status = 'approved'), 0),
+            COUNT(*) FILTER (WHERE c.status = 'paid'),
+            COALESCE(SUM(c.commission_amount) FILTER (WHERE c.status = 'paid'), 0),
+            NOW()
+        FROM agents
+        LEFT JOIN commissions c ON c.agent_id = agents.id
+        GROUP BY agents.id
+    """)
+
+
+def downgrade() -> None:
+    """Drop the commission summaries"""
+    
+    op.drop_table('agent_commission_summaries')
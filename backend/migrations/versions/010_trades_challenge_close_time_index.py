@@ -0,0 +1,27 @@
+"""Index trades by challenge and close time
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Support streaming a challenge's closed trades in close_time order"""
+    
+    op.create_index('ix_trades_challenge_close_time', 'trades', ['challenge_id', 'close_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the evaluation index"""
+    
+    op.drop_index('ix_trades_challenge_close_time', table_name='trades')
@@ -0,0 +1,46 @@
+"""Add background jobs
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the background_jobs table used for exports and bulk jobs"""
+    
+    op.create_table('background_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('job_type', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('processed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_background_jobs_user_created', 'background_jobs', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the background_jobs table"""
+    
+    op.drop_index('ix_background_jobs_user_created', table_name='background_jobs')
+    op.drop_table('background_jobs')
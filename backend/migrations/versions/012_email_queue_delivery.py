@@ -0,0 +1,37 @@
+"""Add email queue retry scheduling
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add next_attempt_at (retry time / claim lease) to email_queue"""
+    
+    # email_queue is created by db.create_all() on some installs; it then picks up the column itself
+    if not sa.inspect(op.get_bind()).has_table('email_queue'):
+        return
+    
+    op.add_column('email_queue', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.create_index('idx_email_queue_status_next_attempt', 'email_queue', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop next_attempt_at from email_queue"""
+    
+    if not sa.inspect(op.get_bind()).has_table('email_queue'):
+        return
+    
+    op.drop_index('idx_email_queue_status_next_attempt', table_name='email_queue')
+    op.drop_column('email_queue', 'next_attempt_at')
@@ -0,0 +1,46 @@
+"""Add notification digest buffer
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create notification_digest_items for daily/weekly email digests"""
+    
+    # notifications is created by db.create_all() on some installs; it then creates this table too
+    if not sa.inspect(op.get_bind()).has_table('notifications'):
+        return
+    
+    op.create_table('notification_digest_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('frequency', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_notification_digest_items_frequency_user', 'notification_digest_items', ['frequency', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop notification_digest_items"""
+    
+    if not sa.inspect(op.get_bind()).has_table('notification_digest_items'):
+        return
+    
+    op.drop_index('idx_notification_digest_items_frequency_user', table_name='notification_digest_items')
+    op.drop_table('notification_digest_items')
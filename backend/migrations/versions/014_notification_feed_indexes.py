@@ -0,0 +1,41 @@
+"""Index the notification feed and unread count
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Replace the is_read index with partial per-user feed and unread indexes"""
+    
+    # notifications is created by db.create_all() on some installs, possibly with these indexes already
+    if not sa.inspect(op.get_bind()).has_table('notifications'):
+        return
+    
+    op.create_index('idx_notifications_user_feed', 'notifications', ['user_id', 'created_at', 'id'], unique=False,
+                    postgresql_where=sa.text('is_deleted = false'), if_not_exists=True)
+    op.create_index('idx_notifications_user_unread', 'notifications', ['user_id'], unique=False,
+                    postgresql_where=sa.text('is_read = false AND is_deleted = false'), if_not_exists=True)
+    op.drop_index('idx_notifications_is_read', table_name='notifications', if_exists=True)
+
+
+def downgrade() -> None:
+    """Restore the is_read index"""
+    
+    if not sa.inspect(op.get_bind()).has_table('notifications'):
+        return
+    
+    op.create_index('idx_notifications_is_read', 'notifications', ['is_read'], unique=False)
+    op.drop_index('idx_notifications_user_unread', table_name='notifications')
+    op.drop_index('idx_notifications_user_feed', table_name='notifications')
@@ -0,0 +1,53 @@
+"""Add notifications archive
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create notifications_archive for the notification retention job"""
+    
+    # notifications is created by db.create_all() on some installs; it then creates this table too
+    if not sa.inspect(op.get_bind()).has_table('notifications'):
+        return
+    
+    op.create_table('notifications_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('data', sa.JSON(), nullable=True),
+        sa.Column('priority', sa.String(length=20), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_notifications_archive_user_created', 'notifications_archive', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop notifications_archive"""
+    
+    if not sa.inspect(op.get_bind()).has_table('notifications_archive'):
+        return
+    
+    op.drop_index('idx_notifications_archive_user_created', table_name='notifications_archive')
+    op.drop_table('notifications_archive')
@@ -0,0 +1,60 @@
+"""Add wallet history keyset index and balance snapshots
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Index transactions for keyset history and create wallet_balance_snapshots"""
+    
+    # wallets/transactions are created by db.create_all(), which then creates all of this too
+    if not sa.inspect(op.get_bind()).has_table('transactions'):
+        return
+    
+    # (wallet_id, created_at, id) serves history pages and statements; it replaces the wallet_id index
+    op.create_index('ix_transaction_wallet_created', 'transactions', ['wallet_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.drop_index('ix_transaction_wallet_id', table_name='transactions', if_exists=True)
+    
+    if sa.inspect(op.get_bind()).has_table('wallet_balance_snapshots'):
+        return
+    
+    op.create_table('wallet_balance_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('wallet_id', sa.Integer(), nullable=False),
+        sa.Column('balance_type', sa.String(length=20), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_at', sa.DateTime(), nullable=False),
+        sa.Column('balance', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id']),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('wallet_id', 'balance_type', 'transaction_id', name='uq_wallet_snapshot_transaction')
+    )
+    op.create_index('ix_wallet_snapshot_lookup', 'wallet_balance_snapshots', ['wallet_id', 'balance_type', 'snapshot_at', 'transaction_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop wallet_balance_snapshots and restore the wallet_id index"""
+    
+    if not sa.inspect(op.get_bind()).has_table('transactions'):
+        return
+    
+    if sa.inspect(op.get_bind()).has_table('wallet_balance_snapshots'):
+        op.drop_index('ix_wallet_snapshot_lookup', table_name='wallet_balance_snapshots')
+        op.drop_table('wallet_balance_snapshots')
+    
+    op.create_index('ix_transaction_wallet_id', 'transactions', ['wallet_id'], unique=False, if_not_exists=True)
+    op.drop_index('ix_transaction_wallet_created', table_name='transactions', if_exists=True)
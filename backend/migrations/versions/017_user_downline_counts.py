@@ -0,0 +1,44 @@
+"""Add user_downline_counts
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '017'
+down_revision = '016'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the per-user downline counter buckets and populate them from user_closure"""
+    
+    op.create_table('user_downline_counts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'role', 'depth', 'is_active')
+    )
+    
+    op.execute("""
+        INSERT INTO user_downline_counts (user_id, role, depth, is_active, count)
+        SELECT user_closure.ancestor_id, users.role, user_closure.depth, users.is_active, count(*)
+        FROM user_closure JOIN users ON users.id = user_closure.descendant_id
+        WHERE user_closure.depth > 0
+        GROUP BY user_closure.ancestor_id, users.role, user_closure.depth, users.is_active
+    """)
+
+
+def downgrade() -> None:
+    """Drop the downline counters"""
+    
+    op.drop_table('user_downline_counts')
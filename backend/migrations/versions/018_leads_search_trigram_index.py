@@ -0,0 +1,39 @@
+"""Add trigram search index on leads
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '018'
+down_revision = '017'
+branch_labels = None
+depends_on = None
+
+# Must match Lead.search_document()
+SEARCH_DOCUMENT = "(first_name || ' ' || last_name || ' ' || email || ' ' || coalesce(phone, ''))"
+
+
+def upgrade() -> None:
+    """Index lead name, email and phone for ILIKE '%term%' search"""
+    
+    # leads is created by db.create_all(), which then creates the index (and extension) too
+    if not sa.inspect(op.get_bind()).has_table('leads'):
+        return
+    
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(f'CREATE INDEX IF NOT EXISTS ix_leads_search_trgm ON leads USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    """Drop the lead search index"""
+    
+    if not sa.inspect(op.get_bind()).has_table('leads'):
+        return
+    
+    op.drop_index('ix_leads_search_trgm', table_name='leads', if_exists=True)
@@ -0,0 +1,34 @@
+"""Add background job heartbeats and checkpoints
+
+Revision ID: 019
+Revises: 018
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '019'
+down_revision = '018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Track the worker and heartbeat of each job, and resumable job state"""
+    
+    op.add_column('background_jobs', sa.Column('worker_id', sa.String(length=100), nullable=True))
+    op.add_column('background_jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    op.add_column('background_jobs', sa.Column('checkpoint', sa.JSON(), nullable=True))
+    op.create_index('ix_background_jobs_status_heartbeat', 'background_jobs', ['status', 'heartbeat_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the heartbeat and checkpoint columns"""
+    
+    op.drop_index('ix_background_jobs_status_heartbeat', table_name='background_jobs')
+    op.drop_column('background_jobs', 'checkpoint')
+    op.drop_column('background_jobs', 'heartbeat_at')
+    op.drop_column('background_jobs', 'worker_id')
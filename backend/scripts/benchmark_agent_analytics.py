@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Regression check: /reports/agent/analytics runs a constant number of queries
+
+Seeds two agents in the app's database, one with --traders referred traders
+and one with 10x as many (each trader with a challenge, trades and a
+commission; every third challenge funded), then calls the endpoint for each
+agent with a before_cursor_execute listener counting statements. Exits 1 if
+the counts differ, i.e. if the endpoint grew a per-trader query again.
+
+The seed data is inserted in one transaction that is rolled back at the end
+(the endpoint runs inside it). Uses the app's DATABASE_URL (PostgreSQL).
+Run from backend/: python3 scripts/benchmark_agent_analytics.py --traders 50
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+from src.app import create_app
+from src.database import db
+from src.models.agent import Agent
+from src.models.commission import Commission
+from src.models.referral import Referral
+from src.models.tenant import Tenant
+from src.models.trade import Trade
+from src.models.trading_program import TradingProgram, Challenge
+from src.models.user import User
+from src.routes.reports import get_agent_analytics
+
+TRADES_PER_CHALLENGE = 3
+
+
+def insert_rows(model, rows):
+    """Bulk insert without ORM events, returning the new ids in order"""
+    table = model.__table__
+    return db.session.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+
+def seed_agent(tag, program_id, traders):
+    """An agent user with `traders` referred traders and their activity; returns the agent user"""
+    now = datetime.utcnow()
+    agent_user_id = insert_rows(User, [{
+        'email': f'bench-{tag}-agent@example.com',
+        'password_hash': 'x',
+        'first_name': 'Bench',
+        'last_name': 'Agent',
+        'role': 'agent',
+        'is_active': True
+    }])[0]
+    agent_id = insert_rows(Agent, [{'agent_code': f'BENCH-{tag}', 'user_id': agent_user_id}])[0]
+
+    trader_ids = insert_rows(User, [{
+        'email': f'bench-{tag}-{i}@example.com',
+        'password_hash': 'x',
+        'first_name': 'Trader',
+        'last_name': str(i),
+        'role': 'trader',
+        'parent_id': agent_user_id,
+        'is_active': i % 4 != 0,
+        'created_at': now - timedelta(days=(i * 7) % 365)
+    } for i in range(traders)])
+    referral_ids = insert_rows(Referral, [{
+        'agent_id': agent_id,
+        'referred_user_id': trader_id,
+        'referral_code': f'BENCH-{tag}',
+        'status': 'active'
+    } for trader_id in trader_ids])
+
+    challenge_ids = insert_rows(Challenge, [{
+        'user_id': trader_id,
+        'program_id': program_id,
+        'status': 'funded' if i % 3 == 0 else 'active',
+        'passed_at': now - timedelta(days=(i * 11) % 365) if i % 3 == 0 else None,
+        'initial_balance': 10000,
+        'current_balance': 10000 + (i % 17) * 150 - 600
+    } for i, trader_id in enumerate(trader_ids)])
+
+    insert_rows(Trade, [{
+        'challenge_id': challenge_id,
+        'symbol': 'EURUSD',
+        'trade_type': 'buy',
+        'volume': 1,
+        'open_price': 1.1,
+        'open_time': now - timedelta(days=j),
+        'profit': (j - 1) * 25
+    } for challenge_id in challenge_ids for j in range(TRADES_PER_CHALLENGE)])
+
+    insert_rows(Commission, [{
+        'agent_id': agent_id,
+        'referral_id': referral_id,
+        'challenge_id': challenge_id,
+        'sale_amount': 100,
+        'commission_rate': 10,
+        'commission_amount': 10,
+        'created_at': now - timedelta(days=(i * 5) % 365)
+    } for i, (referral_id, challenge_id) in enumerate(zip(referral_ids, challenge_ids))])
+
+    return db.session.get(User, agent_user_id)
+
+
+def measure(app, agent_user):
+    """Statements and milliseconds of one analytics request for agent_user"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    headers = {'Authorization': f'Bearer {agent_user.generate_access_token()}'}
+    with app.test_request_context('/api/v1/reports/agent/analytics', headers=headers):
+        # Warm up the principal cache so both agents pay the same auth cost
+        get_agent_analytics()
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            started = time.perf_counter()
+            response, status = get_agent_analytics()
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+    if status != 200:
+        raise RuntimeError(f'Analytics returned {status}: {response.get_json()}')
+    return statements, elapsed, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--traders', type=int, default=50, help='Traders of the small agent (the large one gets 10x)')
+    parser.add_argument('--verbose', action='store_true', help='Print the statements of each run')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        tag = uuid.uuid4().hex[:8]
+        tenant_id = insert_rows(Tenant, [{'name': 'Bench', 'subdomain': f'bench-{tag}'}])[0]
+        program_id = insert_rows(TradingProgram, [{
+            'tenant_id': tenant_id,
+            'name': 'Bench 10k',
+            'type': 'two_phase',
+            'account_size': 10000,
+            'price': 100
+        }])[0]
+
+        results = []
+        try:
+            for traders in (args.traders, args.traders * 10):
+                agent_user = seed_agent(f'{tag}-{traders}', program_id, traders)
+                statements, elapsed, data = measure(app, agent_user)
+                results.append((traders, statements))
+                print(f'{traders:>7} traders: {len(statements):>3} statements, {elapsed:8.1f} ms '
+                      f'({data["overview"]["active_traders"]} active, {len(data["top_traders"])} top traders)')
+                if args.verbose:
+                    for statement in statements:
+                        print('    ' + ' '.join(statement.split())[:160])
+        finally:
+            db.session.rollback()
+
+    (small, small_statements), (large, large_statements) = results
+    if len(small_statements) != len(large_statements):
+        print(f'❌ Query count grows with traders: {len(small_statements)} for {small}, '
+              f'{len(large_statements)} for {large}')
+        sys.exit(1)
+    print(f'✅ Constant query count: {len(small_statements)} statements for {small} and {large} traders')
+
+
+if __name__ == '__main__':
+    main()
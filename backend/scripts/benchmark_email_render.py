@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-email render cost of the old f-string HTML builders
+versus the compiled Jinja templates (single and batch rendering)
+Run from backend/: python3 scripts/benchmark_email_render.py [count]
+"""
+
+import sys
+import os
+import timeit
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.email_templates import render_email, render_email_batch, warm_email_templates
+
+
+def legacy_notification_html(notification, user):
+    """The f-string builder EmailService._generate_notification_html used before templates"""
+    priority_colors = {
+        'low': '#6B7280',
+        'normal': '#3B82F6',
+        'high': '#F59E0B',
+        'urgent': '#EF4444'
+    }
+    priority_color = priority_colors.get(notification.priority, '#3B82F6')
+    
+    action_button = ''
+    if notification.type == 'withdrawal':
+        action_button = f'<a href="https://marketedgepros.com/trader/withdrawals" style="display: inline-block; padding: 12px 24px; background-color: {priority_color}; color: white; text-decoration: none; border-radius: 6px; margin-top: 20px;">View Withdrawals</a>'
+    elif notification.type == 'commission':
+        action_button = f'<a href="https://marketedgepros.com/agent/commissions" style="display: inline-block; padding: 12px 24px; background-color: {priority_color}; color: white; text-decoration: none; border-radius: 6px; margin-top: 20px;">View Commissions</a>'
+    elif notification.type == 'kyc':
+        action_button = f'<a href="https://marketedgepros.com/kyc" style="display: inline-block; padding: 12px 24px; background-color: {priority_color}; color: white; text-decoration: none; border-radius: 6px; margin-top: 20px;">View KYC Status</a>'
+    
+    user_name = user.first_name or 'User'
+    
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #F3F4F6;">
+    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #F3F4F6; padding: 20px;">
+        <tr>
+            <td align="center">
+                <table width="600" cellpadding="0" cellspacing="0" style="background-color: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; text-align: center;">
+                            <h1 style="margin: 0; color: white; font-size: 24px;">MarketEdgePros</h1>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 40px 30px;">
+                            <p style="margin: 0 0 10px 0; color: #6B7280; font-size: 14px;">Hi {user_name},</p>
+                            <h2 style="margin: 20px 0; color: #111827; font-size: 20px;">{notification.title}</h2>
+                            <div style="background-color: #F9FAFB; border-left: 4px solid {priority_color}; padding: 15px; margin: 20px 0; border-radius: 4px;">
+                                <p style="margin: 0; color: #374151; font-size: 16px; line-height: 1.6;">{notification.message}</p>
+                            </div>
+                            {action_button}
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="background-color: #F9FAFB; padding: 20px 30px; text-align: center; border-top: 1px solid #E5E7EB;">
+                            <p style="margin: 0 0 10px 0; color: #6B7280; font-size: 12px;">
+                                This is an automated notification from MarketEdgePros.
+                            </p>
+                            <p style="margin: 0; color: #6B7280; font-size: 12px;">
+                                <a href="https://marketedgepros.com/settings" style="color: #3B82F6; text-decoration: none;">Manage notification preferences</a>
+                            </p>
+                            <p style="margin: 10px 0 0 0; color: #9CA3AF; font-size: 11px;">
+                                © 2025 MarketEdgePros. All rights reserved.
+                            </p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+        """.strip()
+
+
+def legacy_withdrawal_approved_html(user, withdrawal_amount, dashboard_url):
+    """The f-string builder send_withdrawal_approved_email used before templates"""
+    return f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
+                .amount-box {{ background: white; border: 2px solid #11998e; padding: 30px; text-align: center; border-radius: 10px; margin: 25px 0; }}
+                .amount {{ font-size: 48px; font-weight: bold; color: #11998e; }}
+                .button {{ display: inline-block; padding: 12px 30px; background: #11998e; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>✅ Withdrawal Approved!</h1>
+                </div>
+                <div class="content">
+                    <h2>Hi {user.first_name},</h2>
+                    <p>Good news! Your withdrawal request has been approved.</p>
+                    <div class="amount-box">
+                        <div class="amount">${withdrawal_amount:.2f}</div>
+                        <p style="color: #666; margin-top: 10px;">Withdrawal Amount</p>
+                    </div>
+                    <p>The funds will be transferred to your account within 3-5 business days.</p>
+                    <p style="text-align: center;">
+                        <a href="{dashboard_url}" class="button">View Dashboard</a>
+                    </p>
+                    <p>Thank you for being a valued member of MarketEdgePros!</p>
+                    <p>Best regards,<br>The MarketEdgePros Team</p>
+                </div>
+                <div class="footer">
+                    <p>© 2025 MarketEdgePros. All rights reserved.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+
+def per_email_us(func, count):
+    return min(timeit.repeat(func, number=1, repeat=5)) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = [SimpleNamespace(id=i, first_name=f'Trader{i}', tenant_id=None) for i in range(count)]
+    notification = SimpleNamespace(type='withdrawal', title='Withdrawal approved', message='Your withdrawal of $250.00 was approved.', priority='high')
+    dashboard_url = 'https://marketedgepros.com/dashboard'
+    
+    warm_email_templates()
+    
+    print(f'Per-email render cost over {count} recipients (best of 5, microseconds)')
+    print()
+    print('notification email')
+    print(f"  f-string builder:     {per_email_us(lambda: [legacy_notification_html(notification, user) for user in users], count):8.1f}")
+    print(f"  render_email:         {per_email_us(lambda: [render_email('email/notification.html', notification=notification, user=user) for user in users], count):8.1f}")
+    print(f"  render_email_batch:   {per_email_us(lambda: render_email_batch('email/notification.html', users, notification=notification), count):8.1f}")
+    print()
+    print('withdrawal approved email (layout + partials)')
+    print(f"  f-string builder:     {per_email_us(lambda: [legacy_withdrawal_approved_html(user, 250, dashboard_url) for user in users], count):8.1f}")
+    print(f"  render_email:         {per_email_us(lambda: [render_email('email/withdrawal_approved.html', user=user, withdrawal_amount=250, dashboard_url=dashboard_url) for user in users], count):8.1f}")
+    print(f"  render_email_batch:   {per_email_us(lambda: render_email_batch('email/withdrawal_approved.html', users, withdrawal_amount=250, dashboard_url=dashboard_url), count):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PermissionManager latency against downline size
+
+Builds a synthetic --users tree (--branching children per node) in the
+app's database, then for viewers whose downlines range from a few hundred
+users to the whole tree times:
+- can_view_user on the deepest user of the downline, against the old
+  parent-by-parent get_ancestors() walk
+- filter_payments_by_permission (closure subquery) against the old
+  materialized id list inlined into IN (...)
+
+The synthetic users are inserted in one transaction that is rolled back at
+the end (pass --keep to commit them). Uses the app's DATABASE_URL.
+Run from backend/: python3 scripts/benchmark_permissions.py --users 100000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, insert, literal
+
+from src.app import create_app
+from src.database import db
+from src.models.payment import Payment
+from src.models.user import User
+from src.models.user_closure import UserClosure
+from src.utils.permissions import PermissionManager
+
+
+def build_tree(users, branching):
+    """
+    Insert a complete tree level by level (no ORM events), with its closure rows
+
+    Returns:
+        list of levels, each a list of user ids
+    """
+    tag = uuid.uuid4().hex[:8]
+    users_table = User.__table__
+    levels = []
+    parents = [None]
+    created = 0
+
+    while created < users:
+        rows = []
+        for parent_id in parents:
+            for _ in range(1 if parent_id is None else branching):
+                if created + len(rows) >= users:
+                    break
+                rows.append({
+                    'email': f'bench-{tag}-{created + len(rows)}@example.com',
+                    'password_hash': 'x',
+                    'first_name': 'Bench',
+                    'last_name': str(created + len(rows)),
+                    'role': 'agent',
+                    'parent_id': parent_id,
+                    'level': len(levels),
+                    'is_active': True
+                })
+        ids = db.session.execute(
+            insert(users_table).returning(users_table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        # Self rows, then every ancestor of the parent for the new level
+        db.session.execute(insert(UserClosure), [
+            {'ancestor_id': user_id, 'descendant_id': user_id, 'depth': 0} for user_id in ids
+        ])
+        if levels:
+            db.session.execute(
+                insert(UserClosure).from_select(
+                    ['ancestor_id', 'descendant_id', 'depth'],
+                    select(
+                        UserClosure.ancestor_id,
+                        users_table.c.id,
+                        UserClosure.depth + literal(1)
+                    ).join(
+                        users_table, users_table.c.parent_id == UserClosure.descendant_id
+                    ).where(
+                        users_table.c.id.in_(ids)
+                    )
+                )
+            )
+
+        levels.append(ids)
+        parents = ids
+        created += len(ids)
+        print(f'  level {len(levels) - 1}: {len(ids)} users')
+
+    return levels
+
+
+def legacy_can_view(viewer, target):
+    """can_view_user before: walk target.parent up to the root"""
+    return viewer in target.get_ancestors()
+
+
+def legacy_payments(viewer):
+    """filter_payments_by_permission before: downline ids materialized into IN (...)"""
+    viewable_ids = [viewer.id] + [d.id for d in viewer.get_all_descendants()]
+    return Payment.query.filter(Payment.user_id.in_(viewable_ids))
+
+
+def timed(function, repeat):
+    """Median milliseconds of repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--branching', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--legacy-repeat', type=int, default=3)
+    parser.add_argument('--keep', action='store_true', help='Commit the synthetic tree instead of rolling back')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f'Building a {args.users}-user tree...')
+        levels = build_tree(args.users, args.branching)
+        deepest = levels[-1][-1]
+        target = db.session.get(User, deepest)
+
+        print(f'\n{"downline":>9} {"depth":>5} | {"can_view":>9} {"legacy":>9} | {"payments":>9} {"legacy":>9}  (median ms)')
+        for depth, level in enumerate(levels[:-1]):
+            # The viewer on this level whose downline contains the deepest user
+            viewer_id = db.session.execute(
+                select(UserClosure.ancestor_id).where(
+                    UserClosure.descendant_id == deepest,
+                    UserClosure.ancestor_id.in_(level)
+                )
+            ).scalar_one()
+            viewer = db.session.get(User, viewer_id)
+            downline = db.session.execute(
+                select(db.func.count()).select_from(UserClosure).where(UserClosure.ancestor_id == viewer_id)
+            ).scalar_one()
+
+            assert PermissionManager.can_view_user(viewer, target) and legacy_can_view(viewer, target)
+
+            can_view = timed(lambda: PermissionManager.can_view_user(viewer, target), args.repeat)
+            can_view_legacy = timed(lambda: legacy_can_view(viewer, target), args.legacy_repeat)
+            payments = timed(
+                lambda: PermissionManager.filter_payments_by_permission(viewer, Payment.query).limit(50).all(),
+                args.repeat
+            )
+            payments_legacy = timed(lambda: legacy_payments(viewer).limit(50).all(), args.legacy_repeat)
+
+            print(f'{downline:>9} {depth:>5} | {can_view:>9.2f} {can_view_legacy:>9.2f} | {payments:>9.2f} {payments_legacy:>9.2f}')
+
+        if args.keep:
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
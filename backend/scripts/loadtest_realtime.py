@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load test: fan-out latency of realtime notifications to many connected clients
+
+Opens --clients Socket.IO connections to the /notifications namespace,
+authenticated as the first --users active users (cycled), then publishes
+probe events through RealtimeService (the Redis message queue, as the app
+does) to their tenant rooms or to every user room, and reports delivery and
+latency percentiles per round.
+
+Uses the app's DATABASE_URL, REDIS_URL and JWT_SECRET_KEY; needs aiohttp
+(pip install aiohttp). One process holding 10k sockets can itself become
+the bottleneck, so check CPU of this process when latencies look high.
+Run from backend/:
+    python3 scripts/loadtest_realtime.py --url http://localhost:5000 --clients 10000
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio
+
+from src.app import create_app
+from src.models.user import User
+from src.services.realtime_service import NAMESPACE, RealtimeService
+
+
+def mint_tokens(app, count):
+    """(user_id, tenant_id, access token) for the first active users"""
+    with app.app_context():
+        users = User.query.filter_by(is_active=True).order_by(User.id).limit(count).all()
+        return [(user.id, user.tenant_id, user.generate_access_token()) for user in users]
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def connect_clients(url, tokens, count, concurrency, on_probe):
+    semaphore = asyncio.Semaphore(concurrency)
+    clients = []
+    failures = []
+
+    async def connect(index):
+        _, _, token = tokens[index % len(tokens)]
+        client = socketio.AsyncClient(reconnection=False)
+        client.on('notifications_changed', on_probe, namespace=NAMESPACE)
+        async with semaphore:
+            try:
+                await client.connect(
+                    url, namespaces=[NAMESPACE], transports=['websocket'],
+                    auth={'token': token}, wait_timeout=30
+                )
+                clients.append(client)
+            except Exception as e:
+                failures.append(str(e))
+
+    await asyncio.gather(*(connect(index) for index in range(count)))
+    return clients, failures
+
+
+async def run(args):
+    app = create_app()
+    tokens = mint_tokens(app, args.users)
+    if not tokens:
+        sys.exit('No active users to authenticate as')
+    used = tokens[:args.clients]
+
+    received = {}
+
+    async def on_probe(data):
+        received.setdefault(data['round'], []).append(time.time() - data['sent_at'])
+
+    print(f'Open files limit: {raise_open_files_limit()}')
+    started = time.monotonic()
+    clients, failures = await connect_clients(args.url, tokens, args.clients, args.connect_concurrency, on_probe)
+    print(f'Connected {len(clients)}/{args.clients} clients as {len(used)} users in {time.monotonic() - started:.1f}s')
+    if failures:
+        print(f'  {len(failures)} failed, e.g. {failures[0]}')
+    if not clients:
+        return
+
+    if args.target == 'tenant':
+        rooms = sorted({RealtimeService.tenant_room(tenant_id) for _, tenant_id, _ in used})
+    else:
+        rooms = sorted({RealtimeService.user_room(user_id) for user_id, _, _ in used})
+
+    def publish(payload):
+        with app.app_context():
+            RealtimeService.publish([('notifications_changed', payload, room) for room in rooms])
+
+    loop = asyncio.get_running_loop()
+    print(f'Publishing to {len(rooms)} {args.target} room(s), {args.rounds} round(s)')
+    for round_number in range(1, args.rounds + 1):
+        payload = {'round': round_number, 'sent_at': time.time()}
+        await loop.run_in_executor(None, publish, payload)
+        await asyncio.sleep(args.wait)
+
+        latencies = received.get(round_number, [])
+        if not latencies:
+            print(f'  round {round_number}: nothing delivered')
+            continue
+        print(
+            f'  round {round_number}: delivered {len(latencies)}/{len(clients)}  '
+            f'p50 {percentile(latencies, 50) * 1000:.1f}ms  p95 {percentile(latencies, 95) * 1000:.1f}ms  '
+            f'p99 {percentile(latencies, 99) * 1000:.1f}ms  max {max(latencies) * 1000:.1f}ms'
+        )
+
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000, help='Distinct users to authenticate as')
+    parser.add_argument('--target', choices=('tenant', 'user'), default='tenant',
+                        help='tenant: one emit per tenant room; user: one emit per user room')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--wait', type=float, default=5.0, help='Seconds to collect each round')
+    parser.add_argument('--connect-concurrency', type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the wallet ledger (lost updates, ledger continuity)
+
+Runs --threads workers that hammer a few hot wallets with random deposits,
+deductions, transfers and batches through WalletService, then checks that
+every final balance equals its starting balance plus the sum of the
+postings that succeeded, and that each wallet's new Transaction rows form
+an unbroken chain (balance_before of each row == balance_after of the
+previous one). Balances are restored with adjustments afterwards unless
+--keep is given.
+
+Writes real ledger rows: point it at a development database.
+Run from backend/: python3 scripts/stress_wallet_ledger.py --user-ids 1,2,3 --threads 16
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+
+from src.app import create_app
+from src.database import db
+from src.models.wallet import Wallet, Transaction
+from src.services.wallet_service import WalletService, Posting
+
+
+def random_amount(low=1, high=1000):
+    return Decimal(random.randint(low, high)) / 100
+
+
+def worker(app, user_ids, balance_type, iterations, expected, counts, lock):
+    deltas = Counter()
+    done = Counter()
+    with app.app_context():
+        for _ in range(iterations):
+            operation = random.choice(('add', 'deduct', 'transfer', 'batch'))
+            try:
+                if operation == 'add':
+                    user_id, amount = random.choice(user_ids), random_amount()
+                    WalletService.add_funds(user_id, amount, balance_type, description='stress test')
+                    changes = {user_id: amount}
+                elif operation == 'deduct':
+                    user_id, amount = random.choice(user_ids), random_amount()
+                    WalletService.deduct_funds(user_id, amount, balance_type, description='stress test')
+                    changes = {user_id: -amount}
+                elif operation == 'transfer':
+                    sender, recipient = random.sample(user_ids, 2)
+                    amount = random_amount()
+                    WalletService.transfer_funds(sender, recipient, amount, balance_type, description='stress test')
+                    changes = {sender: -amount, recipient: amount}
+                else:
+                    postings = [
+                        Posting(random.choice(user_ids), random_amount(-500, 1000) or Decimal('0.01'), balance_type,
+                                description='stress test')
+                        for _ in range(random.randint(2, 10))
+                    ]
+                    WalletService.post_batch(postings)
+                    changes = Counter()
+                    for posting in postings:
+                        changes[posting.user_id] += posting.amount
+            except ValueError:
+                # Insufficient balance: nothing may have been written
+                db.session.rollback()
+                done[f'{operation}_rejected'] += 1
+                continue
+            except Exception as e:
+                # e.g. a deadlock or serialization failure: rolled back as a whole
+                db.session.rollback()
+                done[f'{operation}_failed ({type(e).__name__})'] += 1
+                continue
+
+            deltas.update(changes)
+            done[operation] += 1
+
+    with lock:
+        expected.update(deltas)
+        counts.update(done)
+
+
+def balances(user_ids, balance_type):
+    column = getattr(Wallet, f'{balance_type}_balance')
+    return dict(db.session.execute(select(Wallet.user_id, column).where(Wallet.user_id.in_(user_ids))).all())
+
+
+def check_chains(user_ids, balance_type, start_balances, final_balances, after_transaction_id):
+    """Problems found in the new Transaction rows of each wallet"""
+    wallet_users = dict(db.session.execute(select(Wallet.id, Wallet.user_id).where(Wallet.user_id.in_(user_ids))).all())
+    rows = db.session.execute(
+        select(Transaction.wallet_id, Transaction.balance_before, Transaction.balance_after).where(
+            Transaction.wallet_id.in_(wallet_users),
+            Transaction.balance_type == balance_type,
+            Transaction.id > after_transaction_id
+        ).order_by(Transaction.id)
+    ).all()
+
+    problems = []
+    running = {wallet_id: start_balances[user_id] for wallet_id, user_id in wallet_users.items()}
+    for wallet_id, balance_before, balance_after in rows:
+        if balance_before != running[wallet_id]:
+            problems.append(f'wallet {wallet_id}: balance_before {balance_before}, previous balance_after {running[wallet_id]}')
+        running[wallet_id] = balance_after
+    for wallet_id, user_id in wallet_users.items():
+        if running[wallet_id] != final_balances[user_id]:
+            problems.append(f'wallet {wallet_id}: ledger ends at {running[wallet_id]}, balance is {final_balances[user_id]}')
+    return problems, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--user-ids', required=True, help='Comma-separated users whose wallets are used')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--iterations', type=int, default=200, help='Operations per thread')
+    parser.add_argument('--balance-type', default='main', choices=('main', 'commission', 'bonus'))
+    parser.add_argument('--seed', type=Decimal, default=Decimal('1000.00'), help='Deposit per wallet before the run')
+    parser.add_argument('--keep', action='store_true', help='Do not restore the starting balances')
+    args = parser.parse_args()
+
+    user_ids = [int(user_id) for user_id in args.user_ids.split(',')]
+    if len(user_ids) < 2:
+        sys.exit('Need at least two users (transfers)')
+
+    app = create_app()
+    with app.app_context():
+        original = {user_id: WalletService.get_balance(user_id, args.balance_type) for user_id in user_ids}
+        WalletService.post_batch([Posting(user_id, args.seed, args.balance_type, description='stress test seed') for user_id in user_ids])
+        start_balances = balances(user_ids, args.balance_type)
+        after_transaction_id = db.session.execute(select(func.coalesce(func.max(Transaction.id), 0))).scalar()
+        db.session.commit()
+
+    expected = Counter()
+    counts = Counter()
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(app, user_ids, args.balance_type, args.iterations, expected, counts, lock))
+        for _ in range(args.threads)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    with app.app_context():
+        final_balances = balances(user_ids, args.balance_type)
+        problems, ledger_rows = check_chains(user_ids, args.balance_type, start_balances, final_balances, after_transaction_id)
+
+        lost = {
+            user_id: (start_balances[user_id] + expected[user_id], final_balances[user_id])
+            for user_id in user_ids
+            if start_balances[user_id] + expected[user_id] != final_balances[user_id]
+        }
+
+        if not args.keep:
+            WalletService.post_batch([
+                Posting(user_id, Decimal(str(original[user_id])) - final_balances[user_id], args.balance_type,
+                        'adjustment', description='stress test restore')
+                for user_id in user_ids
+                if Decimal(str(original[user_id])) != final_balances[user_id]
+            ], allow_negative=True)
+
+    operations = sum(counts.values())
+    print(f'{operations} operations on {len(user_ids)} wallets by {args.threads} threads in {elapsed:.1f}s ({operations / elapsed:.0f}/s)')
+    print('  ' + ', '.join(f'{name} {count}' for name, count in sorted(counts.items())))
+    print(f'  {ledger_rows} ledger rows checked')
+    for user_id, (should_be, actual) in lost.items():
+        print(f'  LOST UPDATE user {user_id}: expected {should_be}, balance {actual}')
+    for problem in problems:
+        print(f'  LEDGER {problem}')
+    if lost or problems:
+        sys.exit(1)
+    print('✅ No lost updates; ledger chains are continuous')
+
+
+if __name__ == '__main__':
+    main()
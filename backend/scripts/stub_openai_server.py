@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Local stub of the OpenAI Responses API for testing the chat endpoints
+
+Answers POST /v1/responses after --delay seconds with a canned completion
+that echoes the last user message, and counts the calls it served
+(GET /stats), so response caching, request coalescing and the bounded call
+pool can be checked without spending tokens. Point the app at it with:
+
+    OPENAI_API_KEY=stub OPENAI_API_BASE=http://localhost:8089/v1 flask run
+
+Run from backend/: python3 scripts/stub_openai_server.py --port 8089 --delay 2
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stats = {'calls': 0, 'in_flight': 0, 'max_in_flight': 0, 'failed': 0}
+stats_lock = threading.Lock()
+response_ids = itertools.count(1)
+
+
+def completion(request_body):
+    messages = request_body.get('input') or []
+    if isinstance(messages, str):
+        messages = [{'role': 'user', 'content': messages}]
+    question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    text = f'Stub answer ({request_body.get("model")}): {question[:200]}'
+    words = len(' '.join(str(m.get('content', '')) for m in messages).split())
+    response_id = next(response_ids)
+
+    return {
+        'id': f'resp_stub_{response_id}',
+        'object': 'response',
+        'created_at': int(time.time()),
+        'status': 'completed',
+        'model': request_body.get('model'),
+        'output': [{
+            'type': 'message',
+            'id': f'msg_stub_{response_id}',
+            'status': 'completed',
+            'role': 'assistant',
+            'content': [{'type': 'output_text', 'text': text, 'annotations': []}]
+        }],
+        'parallel_tool_calls': False,
+        'tool_choice': 'auto',
+        'tools': [],
+        'usage': {
+            'input_tokens': words,
+            'output_tokens': len(text.split()),
+            'total_tokens': words + len(text.split()),
+            'input_tokens_details': {'cached_tokens': 0},
+            'output_tokens_details': {'reasoning_tokens': 0}
+        }
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            return self.send_json(404, {'error': {'message': 'Not found'}})
+        with stats_lock:
+            return self.send_json(200, dict(stats))
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/responses'):
+            return self.send_json(404, {'error': {'message': 'Not found'}})
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with stats_lock:
+            stats['calls'] += 1
+            stats['in_flight'] += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            time.sleep(self.delay)
+            if random.random() < self.fail_rate:
+                with stats_lock:
+                    stats['failed'] += 1
+                return self.send_json(500, {'error': {'message': 'Stub failure', 'type': 'server_error'}})
+            return self.send_json(200, completion(body))
+        finally:
+            with stats_lock:
+                stats['in_flight'] -= 1
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds before each completion is returned')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of calls answered with HTTP 500')
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    StubHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f'Stub OpenAI API on http://{args.host}:{args.port}/v1 (delay {args.delay}s); GET /stats for call counts')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
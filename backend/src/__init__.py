@@ -13,3 +13,7 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 limiter = Limiter(key_func=get_remote_address)
 
+
+# Initialize Socket.IO (configured in app.py; realtime notifications)
+from flask_socketio import SocketIO
+socketio = SocketIO()
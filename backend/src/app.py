@@ -4,8 +4,6 @@ Main Flask application factory
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_wtf.csrf import CSRFProtect
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from src import limiter
 from src.config import get_config
@@ -42,6 +40,14 @@ def create_app(config_name=None):
     # Initialize tenant middleware
     init_tenant_middleware(app)
     
+    # Compile email templates once per process
+    from src.services.email_templates import warm_email_templates
+    warm_email_templates(app)
+    
+    # Realtime notification delivery (Socket.IO over the Redis message queue)
+    from src.services.realtime_service import init_realtime
+    init_realtime(app)
+    
     # Enable CORS
     csrf = CSRFProtect(app)
     
@@ -61,16 +67,10 @@ def create_app(config_name=None):
              "supports_credentials": True
          }})
     
-    # Rate Limiting
-    if app.config.get('RATELIMIT_ENABLED'):
-        limiter = Limiter(
-            app=app,
-            key_func=get_remote_address,
-            storage_uri=app.config.get('RATELIMIT_STORAGE_URL'),
-            default_limits=["5000 per day", "1000 per hour"]
-        )
-        limiter.init_app(app)
-        app.limiter = limiter
+    # Rate Limiting: bind the shared limiter whose @limiter.limit decorators the
+    # routes use (storage, default limits and RATELIMIT_ENABLED come from config)
+    limiter.init_app(app)
+    app.limiter = limiter
     
     # Initialize Talisman for security headers
     Talisman(app)
@@ -116,6 +116,7 @@ def create_app(config_name=None):
     from src.routes.commissions import commissions_bp
     from src.routes.wallet import wallet_bp
     from src.routes.notifications import notifications_bp
+    from src.routes.exports import exports_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
     app.register_blueprint(users_bp, url_prefix='/api/v1/users')
@@ -140,6 +141,11 @@ def create_app(config_name=None):
     app.register_blueprint(commissions_bp)
     app.register_blueprint(wallet_bp, url_prefix='/api/v1/wallet')
     app.register_blueprint(notifications_bp, url_prefix='/api/v1/notifications')
+    app.register_blueprint(exports_bp, url_prefix='/api/v1/exports')
+    
+    # Register CLI jobs
+    from src.cli import register_cli
+    register_cli(app)
     
     # Health check endpoint
     @app.route('/health', methods=['GET'])
@@ -182,6 +188,10 @@ def create_app(config_name=None):
     def not_found(error):
         return jsonify({'error': 'Resource not found'}), 404
     
+    @app.errorhandler(429)
+    def rate_limited(error):
+        return jsonify({'error': f'Rate limit exceeded: {error.description}'}), 429
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'error': 'Internal server error'}), 500
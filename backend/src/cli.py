@@ -0,0 +1,201 @@
+"""
+Flask CLI commands for scheduled and maintenance jobs
+
+Run with the app factory, e.g.:
+    flask analytics refresh-rollups
+"""
+import click
+from flask.cli import AppGroup
+
+analytics_cli = AppGroup('analytics', help='Analytics maintenance jobs')
+commissions_cli = AppGroup('commissions', help='Commission maintenance jobs')
+challenges_cli = AppGroup('challenges', help='Challenge evaluation jobs')
+email_cli = AppGroup('email', help='Email delivery jobs')
+notifications_cli = AppGroup('notifications', help='Notification maintenance jobs')
+wallet_cli = AppGroup('wallet', help='Wallet ledger jobs')
+hierarchy_cli = AppGroup('hierarchy', help='User hierarchy maintenance jobs')
+jobs_cli = AppGroup('jobs', help='Background job maintenance')
+
+
+@analytics_cli.command('refresh-rollups')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of only rows changed since the watermark')
+def refresh_rollups(full):
+    """Catch up the daily analytics rollup tables"""
+    from src.services.analytics_rollup_service import AnalyticsRollupService
+
+    result = AnalyticsRollupService.refresh(full=full)
+    click.echo(f"✅ Rebuilt {result['days_rebuilt']} day(s); rollups complete through {result['completed_through']}")
+
+
+@commissions_cli.command('reconcile')
+@click.option('--fix', is_flag=True, help='Rewrite drifted summaries from the commissions table')
+def reconcile_commissions(fix):
+    """Recompute agent commission summaries and report drift"""
+    from src.services.commission_service import CommissionService
+
+    result = CommissionService.reconcile_commission_summaries(fix=fix)
+    for drift in result['summary_drift']:
+        state = 'missing' if drift['missing'] else 'drifted'
+        click.echo(f"Agent {drift['agent_id']}: summary {state}")
+    for drift in result['balance_drift']:
+        click.echo(
+            f"Agent {drift['agent_id']}: pending_balance {drift['pending_balance']} "
+            f"(expected {drift['expected_pending_balance']}), total_earned {drift['total_earned']} "
+            f"(expected {drift['expected_total_earned']})"
+        )
+    click.echo(
+        f"✅ Checked {result['agents_checked']} agent(s): {len(result['summary_drift'])} summary drift, "
+        f"{len(result['balance_drift'])} balance drift, {result['fixed']} fixed"
+    )
+
+
+@commissions_cli.command('batch')
+@click.argument('csv_file', type=click.File('r'))
+@click.option('--dry-run', is_flag=True, help='Print the computed ledger without writing')
+@click.option('--no-notify', is_flag=True, help='Do not notify agents')
+def batch_commissions(csv_file, dry_run, no_notify):
+    """Create commissions from a CSV of challenge_id,sale_amount rows"""
+    import csv
+    from src.services.commission_service import CommissionService
+
+    items = [
+        (int(row[0]), row[1])
+        for row in csv.reader(csv_file)
+        if row and row[0].strip().isdigit()  # skips a header row
+    ]
+    result = CommissionService.calculate_commissions_batch(items, dry_run=dry_run, notify=not no_notify)
+    for entry in result['ledger']:
+        if entry['status'] == 'created':
+            click.echo(f"Challenge {entry['challenge_id']}: agent {entry['agent_id']} +{entry['commission_amount']}")
+        else:
+            click.echo(f"Challenge {entry['challenge_id']}: skipped ({entry['reason']})")
+    click.echo(
+        f"✅ {'Dry run: ' if dry_run else ''}{result['created']} commission(s) totalling "
+        f"{result['total_commission_amount']}, {result['skipped']} skipped"
+    )
+
+
+@challenges_cli.command('evaluate')
+@click.option('--workers', type=int, default=None, help='Process pool size (default: CPU count, 1 = inline)')
+@click.option('--dry-run', is_flag=True, help='Compute outcomes without updating challenges')
+def evaluate_challenges(workers, dry_run):
+    """Evaluate every active challenge from its trade history"""
+    from src.services.challenge_evaluation_service import ChallengeEvaluationService
+
+    result = ChallengeEvaluationService.evaluate_active_challenges(workers=workers, dry_run=dry_run)
+    click.echo(
+        f"✅ {'Dry run: ' if dry_run else ''}evaluated {result['evaluated']} challenge(s): "
+        f"{result['passed']} passed, {result['failed']} failed, {result['in_progress']} in progress"
+    )
+
+
+@email_cli.command('deliver')
+@click.option('--once', is_flag=True, help='Exit when the queue is drained instead of polling')
+@click.option('--concurrency', type=int, default=None, help='Sending threads (default: EMAIL_WORKER_CONCURRENCY)')
+@click.option('--batch-size', type=int, default=None, help='Emails claimed per batch (default: EMAIL_WORKER_BATCH_SIZE)')
+@click.option('--transport', type=click.Choice(['sendgrid', 'smtp']), default=None, help='Override EMAIL_TRANSPORT')
+def deliver_emails(once, concurrency, batch_size, transport):
+    """Deliver queued emails (safe to run several workers at once)"""
+    from flask import current_app
+    from src.services.email_delivery import EmailDeliveryWorker
+
+    worker = EmailDeliveryWorker(
+        current_app._get_current_object(),
+        transport=transport,
+        batch_size=batch_size,
+        concurrency=concurrency
+    )
+    metrics = worker.run(once=once)
+    click.echo(
+        f"✅ Sent {metrics['sent']}, retrying {metrics['retried']}, failed {metrics['failed']} "
+        f"in {metrics['elapsed_seconds']}s ({metrics['emails_per_second']}/s, avg send {metrics['avg_send_ms']}ms)"
+    )
+
+
+@email_cli.command('digest')
+@click.option('--frequency', type=click.Choice(['daily', 'weekly']), required=True, help='Digest to send (schedule each accordingly)')
+def send_digests(frequency):
+    """Queue one summary email per user for buffered daily/weekly notifications"""
+    from src.services.notification_service import NotificationService
+
+    result = NotificationService.send_digests(frequency)
+    click.echo(
+        f"✅ Queued {result['emails_queued']} {frequency} digest(s) covering "
+        f"{result['notifications']} notification(s)"
+    )
+
+
+@notifications_cli.command('reconcile-unread')
+def reconcile_unread():
+    """Recount cached unread counters from the database"""
+    from src.utils.unread_counter import reconcile_unread_counts
+
+    result = reconcile_unread_counts()
+    click.echo(f"✅ Checked {result['checked']} unread counter(s), corrected {result['corrected']}")
+
+
+@notifications_cli.command('compact')
+@click.option('--older-than-days', type=int, default=None, help='Age cutoff (default: NOTIFICATION_RETENTION_DAYS)')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default: NOTIFICATION_RETENTION_BATCH_SIZE)')
+@click.option('--archive/--no-archive', default=None, help='Copy rows to notifications_archive (default: NOTIFICATION_RETENTION_ARCHIVE)')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+def compact_notifications(older_than_days, batch_size, archive, pause):
+    """Archive or delete old read and soft-deleted notifications"""
+    from src.services.notification_service import NotificationService
+
+    result = NotificationService.compact_notifications(
+        older_than_days=older_than_days,
+        batch_size=batch_size,
+        archive=archive,
+        pause=pause
+    )
+    click.echo(
+        f"✅ Removed {result['deleted']} notification(s) in {result['batches']} batch(es), "
+        f"archived {result['archived']}"
+    )
+
+
+@wallet_cli.command('snapshot-balances')
+@click.option('--full', is_flag=True, help='Rank the whole ledger instead of only rows since the last snapshot')
+def snapshot_balances(full):
+    """Snapshot wallet balances that moved since the last run (schedule daily)"""
+    from src.services.wallet_service import WalletService
+
+    result = WalletService.snapshot_balances(full=full)
+    click.echo(f"✅ Created {result['snapshots']} balance snapshot(s)")
+
+
+@hierarchy_cli.command('rebuild-downline-counts')
+def rebuild_downline_counts():
+    """Recompute the per-user downline counters from user_closure"""
+    from src.database import db
+    from src.models.user_downline_count import UserDownlineCount
+
+    rows = UserDownlineCount.rebuild()
+    db.session.commit()
+    click.echo(f"✅ Rebuilt {rows} downline counter bucket(s)")
+
+
+@jobs_cli.command('recover')
+@click.option('--stale-seconds', type=int, default=None, help='Heartbeat age of an abandoned job (default: BACKGROUND_JOB_STALE_SECONDS)')
+def recover_jobs(stale_seconds):
+    """Fail or resume background jobs left behind by a stopped worker (run on deploy and from cron)"""
+    from src.services.job_service import JobService
+
+    result = JobService.recover_stale_jobs(stale_seconds=stale_seconds)
+    click.echo(
+        f"✅ Marked {result['failed']} abandoned job(s) failed, resumed {result['resumed']} "
+        f"({result['resumed_failed']} failed again)"
+    )
+
+
+def register_cli(app):
+    """Register all CLI command groups on the app"""
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(commissions_cli)
+    app.cli.add_command(challenges_cli)
+    app.cli.add_command(email_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(wallet_cli)
+    app.cli.add_command(hierarchy_cli)
+    app.cli.add_command(jobs_cli)
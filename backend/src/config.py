@@ -53,13 +53,73 @@ class Config:
     # File Upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
+    # Private files (e.g. exports) without Spaces; never served by /uploads
+    PRIVATE_STORAGE_FOLDER = os.getenv('PRIVATE_STORAGE_FOLDER', '/tmp/private-storage')
     
     # Pagination
     ITEMS_PER_PAGE = 20
     
-    # Rate Limiting
+    # Hierarchy scoping: downlines up to this size are inlined as an id list,
+    # larger ones use the user_closure subquery
+    HIERARCHY_SCOPE_INLINE_MAX_IDS = int(os.getenv('HIERARCHY_SCOPE_INLINE_MAX_IDS', 1000))
+    HIERARCHY_SCOPE_CACHE_TTL = 300  # seconds
+    
+    # Admin dashboard stats snapshots (per hierarchy scope), recomputed single-flight
+    ADMIN_DASHBOARD_CACHE_TTL = 5  # seconds
+    
+    # Authenticated principal cache (see src/utils/principal.py)
+    PRINCIPAL_CACHE_TTL = 300  # seconds, Redis
+    PRINCIPAL_CACHE_LOCAL_TTL = int(os.getenv('PRINCIPAL_CACHE_LOCAL_TTL', 15))  # seconds, per process
+    
+    # Tenant resolution snapshot; changes are also pushed to all workers via Redis
+    TENANT_CACHE_TTL = int(os.getenv('TENANT_CACHE_TTL', 60))  # seconds
+    
+    # Background jobs (exports, bulk notifications) run on this many threads per process
+    BACKGROUND_JOB_WORKERS = int(os.getenv('BACKGROUND_JOB_WORKERS', 2))
+    BACKGROUND_JOB_HEARTBEAT_SECONDS = 30
+    BACKGROUND_JOB_STALE_SECONDS = int(os.getenv('BACKGROUND_JOB_STALE_SECONDS', 300))  # no heartbeat for this long: worker is gone
+    
+    # Exports: server-side cursor batch size
+    EXPORT_YIELD_PER = 2000
+    
+    # Email delivery worker (flask email deliver)
+    EMAIL_TRANSPORT = os.getenv('EMAIL_TRANSPORT', 'sendgrid')  # sendgrid, smtp
+    EMAIL_SENDGRID_API_URL = os.getenv('EMAIL_SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send')
+    EMAIL_SMTP_HOST = os.getenv('EMAIL_SMTP_HOST', 'localhost')
+    EMAIL_SMTP_PORT = int(os.getenv('EMAIL_SMTP_PORT', 1025))
+    EMAIL_WORKER_CONCURRENCY = int(os.getenv('EMAIL_WORKER_CONCURRENCY', 8))
+    EMAIL_WORKER_BATCH_SIZE = int(os.getenv('EMAIL_WORKER_BATCH_SIZE', 100))
+    EMAIL_WORKER_POLL_SECONDS = 5
+    EMAIL_CLAIM_LEASE_SECONDS = 300
+    EMAIL_RETRY_BASE_SECONDS = 30
+    EMAIL_RETRY_MAX_SECONDS = 3600
+    
+    # Cached per-user unread notification counters (Redis); expiry forces a recount
+    NOTIFICATION_UNREAD_CACHE_TTL = 3600  # seconds
+    
+    # Notification retention (flask notifications compact): read/deleted rows older than this
+    # are moved to notifications_archive (or just deleted), in short batches
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90))
+    NOTIFICATION_RETENTION_BATCH_SIZE = 1000
+    NOTIFICATION_RETENTION_ARCHIVE = os.getenv('NOTIFICATION_RETENTION_ARCHIVE', 'true').lower() == 'true'
+    
+    # Realtime notifications (Socket.IO); the message queue relays emits to every worker
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', REDIS_URL)
+    SOCKETIO_CHANNEL = 'marketedgepros-socketio'
+    # threading for the API workers (they only emit); the dedicated Socket.IO process sets eventlet
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+    
+    # OpenAI: call slots shared by all workers and the FAQ/recommendation response cache
+    OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 8))  # keep below gunicorn workers x threads
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 30))
+    OPENAI_COALESCE_WAIT = 3  # seconds a duplicate request waits for the in-flight one before answering 503
+    OPENAI_CACHE_TTL = int(os.getenv('OPENAI_CACHE_TTL', 86400))
+    OPENAI_CACHE_MAX_ENTRIES = 10000
+    
+    # Rate Limiting (read by Flask-Limiter when the shared src.limiter is bound)
     RATELIMIT_ENABLED = True
-    RATELIMIT_STORAGE_URL = REDIS_URL
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URL', REDIS_URL) or 'memory://'
+    RATELIMIT_DEFAULT = '5000 per day;1000 per hour'
 
 
 class DevelopmentConfig(Config):
@@ -1,7 +1,7 @@
 """Authentication middleware"""
 from functools import wraps
 from flask import request, jsonify, g
-from src.models import User
+from src.utils.principal import load_current_user
 import jwt
 from flask import current_app
 from src.constants.roles import Roles
@@ -32,9 +32,9 @@ def jwt_required(f):
                 algorithms=["HS256"]
             )
             
-            # Get user
-            current_user = User.query.get(data['user_id'])
-            if not current_user or not current_user.is_active:
+            # Get user (cached principal, full row loaded lazily)
+            current_user = load_current_user(data['user_id'])
+            if not current_user:
                 return jsonify({'error': 'Invalid or inactive user'}), 401
             
             # Store in g object
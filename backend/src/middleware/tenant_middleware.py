@@ -3,43 +3,40 @@ Tenant Middleware for Multi-Tenant Support
 Automatically detects tenant from subdomain or custom domain
 """
 from flask import request, g, abort
+from src.database import db
 from src.models.tenant import Tenant
+from src.utils.tenant_cache import get_tenant_snapshot, warm_tenant_cache
 from functools import wraps
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def get_tenant_from_request():
+def resolve_tenant_id():
     """
-    Get tenant from request based on:
-    1. Custom domain (e.g., client.com)
-    2. Subdomain (e.g., client.marketedgepros.com)
-    3. X-Tenant-ID header (for API testing)
-    4. tenant_id query parameter (for development)
+    Resolve the tenant for a request based on:
+    1. X-Tenant-ID header (for API testing)
+    2. tenant_id query parameter (for development)
+    3. Custom domain (e.g., client.com)
+    4. Subdomain (e.g., client.marketedgepros.com)
+    5. The 'main' tenant, then any active tenant (fallback)
+    
+    Served from the in-process tenant snapshot; no query on the hot path.
     
     Returns:
-        Tenant: Tenant object or None
+        int: Active tenant ID or None
     """
-    # Check X-Tenant-ID header (for API testing)
-    tenant_id_header = request.headers.get('X-Tenant-ID')
-    if tenant_id_header:
-        try:
-            tenant = Tenant.query.get(int(tenant_id_header))
-            if tenant and tenant.status == 'active':
-                return tenant
-        except (ValueError, TypeError):
-            pass
-    
-    # Check tenant_id query parameter (for development)
-    tenant_id_param = request.args.get('tenant_id')
-    if tenant_id_param:
-        try:
-            tenant = Tenant.query.get(int(tenant_id_param))
-            if tenant and tenant.status == 'active':
-                return tenant
-        except (ValueError, TypeError):
-            pass
+    snapshot = get_tenant_snapshot()
+    
+    # Check X-Tenant-ID header, then tenant_id query parameter
+    for value in (request.headers.get('X-Tenant-ID'), request.args.get('tenant_id')):
+        if value:
+            try:
+                tenant_id = int(value)
+            except (ValueError, TypeError):
+                continue
+            if tenant_id in snapshot.by_id:
+                return tenant_id
     
     # Get host from request
     host = request.host.lower()
@@ -49,9 +46,9 @@ def get_tenant_from_request():
         host = host.split(':')[0]
     
     # Check for custom domain
-    tenant = Tenant.query.filter_by(custom_domain=host, status='active').first()
-    if tenant:
-        return tenant
+    tenant_id = snapshot.by_domain.get(host)
+    if tenant_id:
+        return tenant_id
     
     # Check for subdomain
     # Expected format: subdomain.marketedgepros.com
@@ -63,34 +60,38 @@ def get_tenant_from_request():
         
         # Skip common subdomains
         if subdomain not in ['www', 'api', 'admin', 'app']:
-            tenant = Tenant.query.filter_by(subdomain=subdomain, status='active').first()
-            if tenant:
-                return tenant
+            tenant_id = snapshot.by_subdomain.get(subdomain)
+            if tenant_id:
+                return tenant_id
     
-    # Default tenant (main platform)
-    # You can configure this in settings
-    default_tenant = Tenant.query.filter_by(subdomain='main', status='active').first()
-    if default_tenant:
-        return default_tenant
+    return snapshot.default_id
+
+
+def get_tenant_from_request():
+    """
+    Get tenant from request (see resolve_tenant_id)
     
-    # If no tenant found, return the first active tenant (fallback)
-    return Tenant.query.filter_by(status='active').first()
+    Returns:
+        Tenant: Tenant object or None
+    """
+    tenant_id = resolve_tenant_id()
+    return db.session.get(Tenant, tenant_id) if tenant_id else None
 
 
 def tenant_context():
     """
     Middleware to set tenant context for each request
     Should be registered in Flask app
+    
+    Only the id is resolved here; the Tenant row is loaded on demand by
+    get_current_tenant().
     """
-    tenant = get_tenant_from_request()
+    tenant_id = resolve_tenant_id()
+    g.tenant_id = tenant_id
     
-    if tenant:
-        g.tenant = tenant
-        g.tenant_id = tenant.id
-        logger.debug(f"Tenant context set: {tenant.name} (ID: {tenant.id})")
+    if tenant_id:
+        logger.debug(f"Tenant context set: ID {tenant_id}")
     else:
-        g.tenant = None
-        g.tenant_id = None
         logger.warning("No tenant found for request")
 
 
@@ -101,7 +102,7 @@ def require_tenant(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not hasattr(g, 'tenant') or g.tenant is None:
+        if not get_current_tenant_id():
             logger.error("Tenant required but not found")
             abort(400, description="Tenant not found. Please access via proper domain.")
         return f(*args, **kwargs)
@@ -123,7 +124,10 @@ def get_current_tenant():
     Returns:
         Tenant: Current tenant or None
     """
-    return getattr(g, 'tenant', None)
+    if 'tenant' not in g:
+        tenant_id = get_current_tenant_id()
+        g.tenant = db.session.get(Tenant, tenant_id) if tenant_id else None
+    return g.tenant
 
 
 def get_current_tenant_id():
@@ -190,5 +194,7 @@ def init_tenant_middleware(app):
     def set_tenant_context():
         tenant_context()
     
+    warm_tenant_cache(app)
+    
     logger.info("Tenant middleware initialized")
 
@@ -2,24 +2,36 @@
 Models package
 """
 from src.models.user import User, EmailVerificationToken, PasswordResetToken
+from src.models.user_closure import UserClosure
+from src.models.user_downline_count import UserDownlineCount
 from src.models.verification_attempt import VerificationAttempt
 from src.models.tenant import Tenant
 from src.models.trading_program import TradingProgram, ProgramAddOn, Challenge
 from src.models.lead import Lead, LeadActivity, LeadNote
 from src.models.agent import Agent
 from src.models.referral import Referral
-from src.models.commission import Commission
+from src.models.commission import Commission, AgentCommissionSummary
 from src.models.withdrawal import Withdrawal
 from src.models.trade import Trade
 from src.models.payment import Payment
 from src.models.payment_approval import PaymentApprovalRequest
-from src.models.wallet import Wallet, Transaction
-from src.models.notification import Notification, NotificationPreference, EmailQueue
+from src.models.wallet import Wallet, Transaction, WalletBalanceSnapshot
+from src.models.notification import Notification, NotificationPreference, EmailQueue, NotificationDigestItem, NotificationArchive
+from src.models.background_job import BackgroundJob
+from src.models.analytics_rollup import (
+    DailyPaymentRollup,
+    DailyRegistrationRollup,
+    DailyChallengeRollup,
+    DailyKYCRollup,
+    AnalyticsRollupState
+)
 
 __all__ = [
     'User',
     'EmailVerificationToken',
     'PasswordResetToken',
+    'UserClosure',
+    'UserDownlineCount',
     'VerificationAttempt',
     'Tenant',
     'TradingProgram',
@@ -28,6 +40,7 @@ __all__ = [
     'Agent',
     'Referral',
     'Commission',
+    'AgentCommissionSummary',
     'Withdrawal',
     'Trade',
     'Payment',
@@ -37,9 +50,18 @@ __all__ = [
     'LeadNote',
     'Wallet',
     'Transaction',
+    'WalletBalanceSnapshot',
     'Notification',
     'NotificationPreference',
-    'EmailQueue'
+    'EmailQueue',
+    'NotificationDigestItem',
+    'NotificationArchive',
+    'BackgroundJob',
+    'DailyPaymentRollup',
+    'DailyRegistrationRollup',
+    'DailyChallengeRollup',
+    'DailyKYCRollup',
+    'AnalyticsRollupState'
 ]
 
 # Alias for backward compatibility
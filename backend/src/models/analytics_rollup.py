@@ -0,0 +1,82 @@
+"""
+Daily analytics rollup tables
+Per-day, per-tenant aggregates maintained by AnalyticsRollupService
+"""
+from datetime import datetime
+from src.database import db
+
+
+class DailyPaymentRollup(db.Model):
+    """Payments per day/tenant/status/method (revenue and payment-method mix)"""
+
+    __tablename__ = 'analytics_daily_payments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(50))
+    payment_method = db.Column(db.String(50))
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_analytics_daily_payments_day_tenant', 'day', 'tenant_id'),)
+
+
+class DailyRegistrationRollup(db.Model):
+    """User registrations per day/tenant"""
+
+    __tablename__ = 'analytics_daily_registrations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    registrations = db.Column(db.Integer, nullable=False, default=0)
+    active = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_analytics_daily_registrations_day_tenant', 'day', 'tenant_id'),)
+
+
+class DailyChallengeRollup(db.Model):
+    """Challenges created per day/tenant, bucketed by their current status"""
+
+    __tablename__ = 'analytics_daily_challenges'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(20))
+    challenge_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_analytics_daily_challenges_day_tenant', 'day', 'tenant_id'),)
+
+
+class DailyKYCRollup(db.Model):
+    """KYC submissions per day/tenant"""
+
+    __tablename__ = 'analytics_daily_kyc'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    tenant_id = db.Column(db.Integer, nullable=True)
+    submissions = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_analytics_daily_kyc_day_tenant', 'day', 'tenant_id'),)
+
+
+class AnalyticsRollupState(db.Model):
+    """Watermark bookkeeping for the rollup catch-up job"""
+
+    __tablename__ = 'analytics_rollup_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    watermark = db.Column(db.DateTime)  # Rows changed at/after this point are re-aggregated on the next run
+    completed_through = db.Column(db.Date)  # Rollups cover every day strictly before this date
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'completed_through': self.completed_through.isoformat() if self.completed_through else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
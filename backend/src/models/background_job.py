@@ -0,0 +1,56 @@
+"""
+Background job tracking
+Status and progress of long-running work started from a request (exports,
+bulk notifications), polled by the client while a worker thread runs it.
+"""
+from src.database import db, TimestampMixin
+import uuid
+
+
+class BackgroundJob(db.Model, TimestampMixin):
+    """Long-running job with pollable progress"""
+    
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    job_type = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, completed, failed
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Integer)
+    
+    params = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    # Process running the job and its last sign of life; jobs whose worker
+    # stopped heartbeating are failed or resumed by `flask jobs recover`
+    worker_id = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    # Handler state committed with its work, for resumable job types
+    checkpoint = db.Column(db.JSON)
+    
+    __table_args__ = (
+        db.Index('ix_background_jobs_user_created', 'user_id', 'created_at'),
+        db.Index('ix_background_jobs_status_heartbeat', 'status', 'heartbeat_at'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'processed': self.processed,
+            'total': self.total,
+            'progress': round(self.processed / self.total * 100, 1) if self.total else None,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -1,6 +1,7 @@
 """
 Commission model for tracking agent earnings
 """
+from datetime import datetime
 from src.database import db, TimestampMixin
 
 
@@ -48,3 +49,27 @@ class Commission(db.Model, TimestampMixin):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+
+class AgentCommissionSummary(db.Model):
+    """
+    Per-agent commission totals by status
+    
+    Maintained by CommissionService in the same transaction as every
+    commission insert/status change, so stats are a primary key read.
+    """
+    
+    __tablename__ = 'agent_commission_summaries'
+    
+    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id', ondelete='CASCADE'), primary_key=True)
+    
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    approved_count = db.Column(db.Integer, nullable=False, default=0)
+    approved_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    paid_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    STATUSES = ('pending', 'approved', 'paid')
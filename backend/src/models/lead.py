@@ -2,6 +2,7 @@
 Lead model for CRM system
 """
 from src.database import db, TimestampMixin
+from sqlalchemy import event, func, literal_column, DDL
 from datetime import datetime
 
 
@@ -129,6 +130,26 @@ class Lead(db.Model, TimestampMixin):
         self.assigned_at = datetime.utcnow()
         db.session.commit()
     
+    @classmethod
+    def search_document(cls):
+        """
+        Name, email and phone as one searchable string
+        
+        Must stay identical to the expression of ix_leads_search_trgm for the
+        index to be used.
+        """
+        space = literal_column("' '")
+        return (
+            cls.first_name + space + cls.last_name + space + cls.email + space
+            + func.coalesce(cls.phone, literal_column("''"))
+        )
+    
+    @classmethod
+    def search_filter(cls, term):
+        """Case-insensitive substring match of term against name, email and phone"""
+        escaped = term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+        return cls.search_document().ilike(f'%{escaped}%', escape='/')
+    
     def to_dict(self):
         """Convert lead to dictionary"""
         return {
@@ -159,6 +180,20 @@ class Lead(db.Model, TimestampMixin):
         }
 
 
+# Trigram index for substring search (ILIKE '%term%') over name, email and phone
+db.Index(
+    'ix_leads_search_trgm',
+    Lead.search_document().label('search_document'),
+    postgresql_using='gin',
+    postgresql_ops={'search_document': 'gin_trgm_ops'}
+)
+event.listen(
+    Lead.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+
 class LeadActivity(db.Model, TimestampMixin):
     """Activity log for leads"""
     
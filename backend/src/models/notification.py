@@ -1,6 +1,6 @@
 from datetime import datetime
 from src.database import db, TimestampMixin
-from sqlalchemy import Index
+from sqlalchemy import Index, text, tuple_
 
 class Notification(db.Model, TimestampMixin):
     __tablename__ = 'notifications'
@@ -24,8 +24,13 @@ class Notification(db.Model, TimestampMixin):
     __table_args__ = (
         Index('idx_notifications_user_id', 'user_id'),
         Index('idx_notifications_type', 'type'),
-        Index('idx_notifications_is_read', 'is_read'),
         Index('idx_notifications_created_at', 'created_at'),
+        # Feed: a user's visible notifications, newest first (keyset on created_at, id)
+        Index('idx_notifications_user_feed', 'user_id', 'created_at', 'id',
+              postgresql_where=text('is_deleted = false')),
+        # Unread count: index-only count per user
+        Index('idx_notifications_user_unread', 'user_id',
+              postgresql_where=text('is_read = false AND is_deleted = false')),
     )
     
     def to_dict(self):
@@ -65,8 +70,17 @@ class Notification(db.Model, TimestampMixin):
         ).count()
     
     @staticmethod
-    def get_user_notifications(user_id, filters=None, page=1, per_page=50):
-        """Get notifications for user with optional filters"""
+    def get_user_notifications(user_id, filters=None, page=1, per_page=50, cursor=None):
+        """
+        Get notifications for user with optional filters, newest first
+        
+        With a cursor (next_cursor of the previous page) the page is read by
+        keyset from idx_notifications_user_feed, without an offset or a total
+        count; otherwise it is offset-paginated.
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
         query = Notification.query.filter_by(user_id=user_id, is_deleted=False)
         
         if filters:
@@ -77,7 +91,21 @@ class Notification(db.Model, TimestampMixin):
             if filters.get('priority'):
                 query = query.filter_by(priority=filters['priority'])
         
-        query = query.order_by(Notification.created_at.desc())
+        query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
+        
+        if cursor is not None:
+            created_at, notification_id = Notification.decode_cursor(cursor)
+            items = query.filter(
+                tuple_(Notification.created_at, Notification.id) < (created_at, notification_id)
+            ).limit(per_page + 1).all()
+            has_more = len(items) > per_page
+            items = items[:per_page]
+            
+            return {
+                'notifications': [n.to_dict() for n in items],
+                'per_page': per_page,
+                'next_cursor': Notification.encode_cursor(items[-1]) if has_more else None
+            }
         
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -86,8 +114,23 @@ class Notification(db.Model, TimestampMixin):
             'total': pagination.total,
             'page': page,
             'per_page': per_page,
-            'pages': pagination.pages
+            'pages': pagination.pages,
+            'next_cursor': Notification.encode_cursor(pagination.items[-1]) if pagination.has_next else None
         }
+    
+    @staticmethod
+    def encode_cursor(notification):
+        """Feed cursor pointing just past a notification"""
+        return f'{notification.created_at.isoformat()}_{notification.id}'
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """(created_at, id) from a feed cursor"""
+        try:
+            created_at, notification_id = cursor.rsplit('_', 1)
+            return datetime.fromisoformat(created_at), int(notification_id)
+        except (AttributeError, ValueError):
+            raise ValueError('Invalid cursor')
 
 
 class NotificationPreference(db.Model, TimestampMixin):
@@ -116,6 +159,9 @@ class NotificationPreference(db.Model, TimestampMixin):
     email_enabled = db.Column(db.Boolean, default=True)
     email_frequency = db.Column(db.String(20), default='instant')  # instant, daily, weekly
     
+    # Frequencies whose emails are batched into a digest (see NotificationDigestItem)
+    DIGEST_FREQUENCIES = ('daily', 'weekly')
+    
     # Relationships
     user = db.relationship('User', backref=db.backref('notification_preferences', uselist=False))
     
@@ -177,11 +223,12 @@ class EmailQueue(db.Model, TimestampMixin):
     subject = db.Column(db.String(255), nullable=False)
     body = db.Column(db.Text, nullable=False)
     html_body = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='pending')  # pending, sent, failed
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
     attempts = db.Column(db.Integer, default=0)
     max_attempts = db.Column(db.Integer, default=3)
     error_message = db.Column(db.Text, nullable=True)
     sent_at = db.Column(db.DateTime, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # retry time, or lease expiry while sending
     
     # Relationships
     user = db.relationship('User', backref=db.backref('email_queue', lazy='dynamic'))
@@ -190,6 +237,7 @@ class EmailQueue(db.Model, TimestampMixin):
     __table_args__ = (
         Index('idx_email_queue_status', 'status'),
         Index('idx_email_queue_created_at', 'created_at'),
+        Index('idx_email_queue_status_next_attempt', 'status', 'next_attempt_at'),
     )
     
     def to_dict(self):
@@ -217,3 +265,48 @@ class EmailQueue(db.Model, TimestampMixin):
         self.error_message = error_message
         db.session.commit()
 
+
+class NotificationDigestItem(db.Model):
+    """Notification waiting to be emailed in a daily/weekly digest"""
+    __tablename__ = 'notification_digest_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), nullable=False)
+    frequency = db.Column(db.String(20), nullable=False)  # daily, weekly
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_notification_digest_items_frequency_user', 'frequency', 'user_id'),
+    )
+
+
+class NotificationArchive(db.Model):
+    """Read / deleted notifications moved out of notifications by the retention job"""
+    __tablename__ = 'notifications_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original notifications.id
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    data = db.Column(db.JSON, nullable=True)
+    priority = db.Column(db.String(20))
+    is_read = db.Column(db.Boolean)
+    read_at = db.Column(db.DateTime, nullable=True)
+    is_deleted = db.Column(db.Boolean)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_notifications_archive_user_created', 'user_id', 'created_at'),
+    )
+    
+    # Columns copied from notifications
+    NOTIFICATION_COLUMNS = (
+        'id', 'user_id', 'type', 'title', 'message', 'data', 'priority',
+        'is_read', 'read_at', 'is_deleted', 'deleted_at', 'created_at'
+    )
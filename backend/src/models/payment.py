@@ -42,7 +42,12 @@ class Payment(db.Model):
     approver = db.relationship("User", foreign_keys=[approved_by])
 
     # Add indexes for performance
-    __table_args__ = (db.Index("ix_payment_user_id", "user_id"), db.Index("ix_payment_status", "status"))
+    __table_args__ = (
+        db.Index("ix_payment_user_id", "user_id"),
+        db.Index("ix_payment_status", "status"),
+        db.Index("ix_payment_created_at", "created_at"),
+        db.Index("ix_payment_updated_at", "updated_at"),  # Analytics rollup watermark scans
+    )
 
     # Note: payment_id in Challenge is a string (Stripe payment intent ID), not a foreign key
     
@@ -38,6 +38,11 @@ class Trade(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Evaluation streams a challenge's closed trades in close_time order
+    __table_args__ = (
+        db.Index('ix_trades_challenge_close_time', 'challenge_id', 'close_time'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
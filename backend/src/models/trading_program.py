@@ -185,7 +185,12 @@ class Challenge(db.Model, TimestampMixin):
     program = db.relationship("TradingProgram", back_populates="challenges")
 
     # Add indexes for performance
-    __table_args__ = (db.Index("ix_challenge_user_id", "user_id"), db.Index("ix_challenge_status", "status"))
+    __table_args__ = (
+        db.Index("ix_challenge_user_id", "user_id"),
+        db.Index("ix_challenge_status", "status"),
+        db.Index("ix_challenge_created_at", "created_at"),
+        db.Index("ix_challenge_updated_at", "updated_at"),  # Analytics rollup watermark scans
+    )
     
     def __repr__(self):
         return f'<Challenge {self.id} - User {self.user_id}>'
@@ -1,5 +1,6 @@
 """User model with authentication and security features"""
 from src.database import db, TimestampMixin
+from sqlalchemy import select, func
 from werkzeug.security import generate_password_hash, check_password_hash
 import pyotp
 import secrets
@@ -78,7 +79,7 @@ class User(db.Model, TimestampMixin, HierarchyScopedMixin):
     # Hierarchy (MLM Structure)
     parent_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # Who created this user
     level = db.Column(db.Integer, default=0, nullable=False, index=True)  # Depth in hierarchy (0 = top)
-    tree_path = db.Column(db.String(500), index=True)  # Path in tree: "1/5/23/45" for fast queries
+    tree_path = db.Column(db.String(500), index=True)  # Path in tree: "1/5/23/45" (display/ordering; scoping uses user_closure)
     commission_rate = db.Column(db.Numeric(5, 2), default=0.00)  # Custom commission rate for this user
     referral_code = db.Column(db.String(20), unique=True, nullable=True, index=True)  # Unique referral code for agents/masters
     
@@ -98,7 +99,11 @@ class User(db.Model, TimestampMixin, HierarchyScopedMixin):
     parent = db.relationship('User', remote_side=[id], backref='children', foreign_keys=[parent_id])
 
     # Add indexes for performance
-    __table_args__ = (db.Index('ix_user_tenant_id', 'tenant_id'),)
+    __table_args__ = (
+        db.Index('ix_user_tenant_id', 'tenant_id'),
+        db.Index('ix_user_created_at', 'created_at'),
+        db.Index('ix_user_updated_at', 'updated_at'),  # Analytics rollup watermark scans
+    )
     # children accessible via backref
     
     def __repr__(self):
@@ -218,9 +223,10 @@ class User(db.Model, TimestampMixin, HierarchyScopedMixin):
     # Hierarchy Methods
     def get_all_descendants(self):
         """Get all users in the downline (recursive)"""
-        if not self.tree_path:
-            return []
-        return User.query.filter(User.tree_path.startswith(self.tree_path + '/')).all()
+        from src.models.user_closure import UserClosure
+        return User.query.filter(
+            User.id.in_(UserClosure.descendant_ids(self.id, include_self=False))
+        ).all()
     
     def get_direct_children(self):
         """Get only direct children (1 level down)"""
@@ -248,8 +254,13 @@ class User(db.Model, TimestampMixin, HierarchyScopedMixin):
         return target_role in ROLE_HIERARCHY.get(self.role, [])
     
     def get_downline_count(self):
-        """Get total count of users in downline"""
-        return len(self.get_all_descendants())
+        """Get total count of users in downline (from the precomputed counters)"""
+        from src.models.user_downline_count import UserDownlineCount
+        return db.session.execute(
+            select(func.coalesce(func.sum(UserDownlineCount.count), 0)).where(
+                UserDownlineCount.user_id == self.id
+            )
+        ).scalar()
     
     def get_downline_by_level(self, max_level=None):
         """Get downline organized by level"""
@@ -306,9 +317,11 @@ class User(db.Model, TimestampMixin, HierarchyScopedMixin):
         if current_user.role == 'supermaster':
             return None
         
-        # Filter by tree_path - only users in this user's hierarchy
-        # tree_path LIKE 'current_user_path%' means all descendants
-        return cls.tree_path.like(f"{current_user.tree_path}%")
+        from src.utils.hierarchy_scoping import scope_user_ids
+        
+        # Only users in this user's hierarchy (self + all descendants): the
+        # request's precomputed id set, or the closure-table subquery
+        return cls.id.in_(scope_user_ids(current_user))
 
 
 class EmailVerificationToken(db.Model, TimestampMixin):
@@ -0,0 +1,220 @@
+"""
+Hierarchy closure table
+
+One row per (ancestor, descendant) pair in the users tree, including the
+(user, user, depth=0) self row. Descendant and ancestor lookups become
+indexed equality probes instead of tree_path prefix scans.
+"""
+from sqlalchemy import event, inspect, select, delete, insert, literal, func, cast, String, true
+from sqlalchemy.orm import object_session
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from src.database import db
+from src.models.user import User
+from src.utils.hierarchy_scoping import mark_hierarchy_changed
+
+# Guard against parent_id cycles in legacy data during a full rebuild
+MAX_TREE_DEPTH = 100
+
+
+class UserClosure(db.Model):
+    """Ancestor/descendant pairs of the user hierarchy"""
+
+    __tablename__ = 'user_closure'
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_user_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+    @staticmethod
+    def descendant_ids(ancestor_id, include_self=True):
+        """
+        Subquery of user ids in ancestor_id's downline
+
+        Args:
+            ancestor_id: Root of the subtree
+            include_self: Include the root itself (depth 0)
+
+        Returns:
+            SELECT usable in IN (...) clauses
+        """
+        query = select(UserClosure.descendant_id).where(UserClosure.ancestor_id == ancestor_id)
+        if not include_self:
+            query = query.where(UserClosure.depth > 0)
+        return query
+
+    @staticmethod
+    def insert_node(connection, user_id, parent_id):
+        """Add closure rows for a newly inserted user"""
+        rows = select(
+            literal(user_id).label('ancestor_id'),
+            literal(user_id).label('descendant_id'),
+            literal(0).label('depth')
+        )
+        if parent_id is not None:
+            rows = rows.union_all(
+                select(
+                    UserClosure.ancestor_id,
+                    literal(user_id),
+                    UserClosure.depth + 1
+                ).where(UserClosure.descendant_id == parent_id)
+            )
+        connection.execute(insert(UserClosure).from_select(['ancestor_id', 'descendant_id', 'depth'], rows))
+
+    @staticmethod
+    def move_subtree(connection, user_id, new_parent_id):
+        """
+        Re-parent user_id (and its whole subtree) under new_parent_id
+
+        Raises:
+            ValueError: if new_parent_id is inside the moved subtree
+        """
+        subtree = select(UserClosure.descendant_id).where(UserClosure.ancestor_id == user_id)
+
+        if new_parent_id is not None:
+            cycle = connection.execute(
+                select(UserClosure.descendant_id).where(
+                    UserClosure.ancestor_id == user_id,
+                    UserClosure.descendant_id == new_parent_id
+                )
+            ).first()
+            if cycle:
+                raise ValueError('Cannot move a user under its own downline')
+
+        # Detach: drop every link from an outside ancestor into the subtree
+        connection.execute(
+            delete(UserClosure).where(
+                UserClosure.descendant_id.in_(subtree),
+                UserClosure.ancestor_id.notin_(subtree)
+            )
+        )
+
+        if new_parent_id is None:
+            return
+
+        # Attach: every ancestor of the new parent x every node of the subtree
+        above = UserClosure.__table__.alias('above')
+        below = UserClosure.__table__.alias('below')
+        connection.execute(
+            insert(UserClosure).from_select(
+                ['ancestor_id', 'descendant_id', 'depth'],
+                select(
+                    above.c.ancestor_id,
+                    below.c.descendant_id,
+                    above.c.depth + below.c.depth + 1
+                ).select_from(
+                    above.join(below, true())
+                ).where(
+                    above.c.descendant_id == new_parent_id,
+                    below.c.ancestor_id == user_id
+                )
+            )
+        )
+
+    @staticmethod
+    def rebuild():
+        """
+        Rebuild the whole closure table from users.parent_id
+
+        Returns:
+            Number of closure rows written
+        """
+        tree = select(
+            User.id.label('ancestor_id'),
+            User.id.label('descendant_id'),
+            literal(0).label('depth')
+        ).cte('tree', recursive=True)
+        tree = tree.union_all(
+            select(
+                tree.c.ancestor_id,
+                User.id,
+                tree.c.depth + 1
+            ).join(
+                User, User.parent_id == tree.c.descendant_id
+            ).where(
+                tree.c.depth < MAX_TREE_DEPTH
+            )
+        )
+
+        db.session.execute(delete(UserClosure))
+        db.session.execute(
+            insert(UserClosure).from_select(
+                ['ancestor_id', 'descendant_id', 'depth'],
+                select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+            )
+        )
+        return db.session.query(func.count()).select_from(UserClosure).scalar()
+
+    @staticmethod
+    def rebuild_tree_paths():
+        """Recompute users.tree_path ("1/5/23") and users.level from the closure table"""
+        paths = select(
+            UserClosure.descendant_id.label('user_id'),
+            func.string_agg(
+                cast(UserClosure.ancestor_id, String),
+                aggregate_order_by(literal('/'), UserClosure.depth.desc())
+            ).label('tree_path'),
+            func.max(UserClosure.depth).label('level')
+        ).group_by(UserClosure.descendant_id).subquery()
+
+        result = db.session.execute(
+            User.__table__.update().where(
+                User.__table__.c.id == paths.c.user_id
+            ).values(
+                tree_path=paths.c.tree_path,
+                level=paths.c.level
+            )
+        )
+        return result.rowcount
+
+
+def _bucket_changed(target):
+    """Whether the flush changes a user's downline-counter bucket (role / active flag)"""
+    state = inspect(target).attrs
+    return state.role.history.has_changes() or state.is_active.history.has_changes()
+
+
+@event.listens_for(User, 'after_insert')
+def _closure_after_insert(mapper, connection, target):
+    """Keep the closure table (and the ancestors' downline counters) in sync when a user is created"""
+    from src.models.user_downline_count import UserDownlineCount
+
+    UserClosure.insert_node(connection, target.id, target.parent_id)
+    UserDownlineCount.apply(connection, UserDownlineCount.node_deltas(target.id))
+    mark_hierarchy_changed(object_session(target))
+
+
+@event.listens_for(User, 'before_update')
+def _closure_before_update(mapper, connection, target):
+    """Uncount a user from its old bucket while its row still has the old role / active flag"""
+    from src.models.user_downline_count import UserDownlineCount
+
+    if _bucket_changed(target):
+        UserDownlineCount.apply(connection, UserDownlineCount.node_deltas(target.id, -1))
+
+
+@event.listens_for(User, 'after_update')
+def _closure_after_update(mapper, connection, target):
+    """Keep the closure table and downline counters in sync when a user is re-parented, re-roled or (de)activated"""
+    from src.models.user_downline_count import UserDownlineCount
+
+    if _bucket_changed(target):
+        UserDownlineCount.apply(connection, UserDownlineCount.node_deltas(target.id))
+
+    if inspect(target).attrs.parent_id.history.has_changes():
+        # Buckets inside the subtree keep their relative depths; only those above it change
+        UserDownlineCount.apply(connection, UserDownlineCount.subtree_deltas(target.id, -1))
+        UserClosure.move_subtree(connection, target.id, target.parent_id)
+        UserDownlineCount.apply(connection, UserDownlineCount.subtree_deltas(target.id))
+        mark_hierarchy_changed(object_session(target))
+
+
+@event.listens_for(User, 'before_delete')
+def _closure_before_delete(mapper, connection, target):
+    """Uncount a deleted user from its ancestors (its closure rows go with it by cascade)"""
+    from src.models.user_downline_count import UserDownlineCount
+
+    UserDownlineCount.apply(connection, UserDownlineCount.node_deltas(target.id, -1))
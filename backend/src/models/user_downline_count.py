@@ -0,0 +1,190 @@
+"""
+Denormalized downline counters
+
+One row per (user, role, relative depth, active flag) bucket of the user's
+downline, holding how many descendants fall into it. Every downline
+statistic (total, direct, by role, by level, active/inactive, max depth)
+is a sum over a user's few bucket rows, i.e. a primary-key range read.
+
+The buckets are kept current by the user_closure hooks: creating a user,
+changing its role or active flag, re-parenting it (with its subtree) or
+deleting it adjusts the affected buckets of all its ancestors with one
+INSERT ... SELECT ... ON CONFLICT DO UPDATE over the closure rows.
+`flask hierarchy rebuild-downline-counts` recomputes them from scratch.
+"""
+from sqlalchemy import select, delete, insert, literal, func, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.database import db
+from src.models.user import User
+
+
+class UserDownlineCount(db.Model):
+    """Descendants of user_id per role, relative depth and active flag"""
+
+    __tablename__ = 'user_downline_counts'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    role = db.Column(db.String(20), primary_key=True)
+    depth = db.Column(db.Integer, primary_key=True)
+    is_active = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def apply(connection, deltas):
+        """
+        Add signed counts to buckets
+
+        Args:
+            connection: Connection of the flush (inside mapper events)
+            deltas: SELECT of (user_id, role, depth, is_active, count)
+        """
+        statement = pg_insert(UserDownlineCount).from_select(
+            ['user_id', 'role', 'depth', 'is_active', 'count'], deltas
+        )
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=['user_id', 'role', 'depth', 'is_active'],
+                set_={'count': UserDownlineCount.count + statement.excluded.count}
+            )
+        )
+
+    @staticmethod
+    def node_deltas(user_id, sign=1):
+        """
+        One node counted (or uncounted, sign=-1) in the buckets of all its
+        ancestors, with the role and active flag its row has at that moment
+        """
+        from src.models.user_closure import UserClosure
+
+        return select(
+            UserClosure.ancestor_id,
+            User.role,
+            UserClosure.depth,
+            User.is_active,
+            literal(sign)
+        ).join(
+            User, User.id == UserClosure.descendant_id
+        ).where(
+            UserClosure.descendant_id == user_id,
+            UserClosure.depth > 0
+        )
+
+    @staticmethod
+    def subtree_deltas(user_id, sign=1):
+        """
+        The whole subtree of user_id counted (or uncounted) in the buckets of
+        the ancestors above user_id; buckets inside the subtree are unaffected
+        by a move
+        """
+        from src.models.user_closure import UserClosure
+
+        above = UserClosure.__table__.alias('above')
+        below = UserClosure.__table__.alias('below')
+        depth = above.c.depth + below.c.depth
+        return select(
+            above.c.ancestor_id,
+            User.role,
+            depth,
+            User.is_active,
+            func.count() * sign
+        ).select_from(
+            above.join(below, true()).join(User, User.id == below.c.descendant_id)
+        ).where(
+            above.c.descendant_id == user_id,
+            above.c.depth > 0,
+            below.c.ancestor_id == user_id
+        ).group_by(above.c.ancestor_id, User.role, depth, User.is_active)
+
+    @staticmethod
+    def stats(user_id):
+        """
+        Downline statistics of one user from its buckets
+
+        Returns:
+            dict: total_downline, direct_children, by_role, by_level, active,
+            inactive, max_depth
+        """
+        rows = db.session.execute(
+            select(
+                UserDownlineCount.role,
+                UserDownlineCount.depth,
+                UserDownlineCount.is_active,
+                UserDownlineCount.count
+            ).where(
+                UserDownlineCount.user_id == user_id,
+                UserDownlineCount.count > 0
+            )
+        ).all()
+
+        by_role = {}
+        by_level = {}
+        active = 0
+        for role, depth, is_active, count in rows:
+            by_role[role] = by_role.get(role, 0) + count
+            by_level[depth] = by_level.get(depth, 0) + count
+            if is_active:
+                active += count
+        total = sum(by_level.values())
+
+        return {
+            'total_downline': total,
+            'direct_children': by_level.get(1, 0),
+            'by_role': by_role,
+            'by_level': dict(sorted(by_level.items())),
+            'active': active,
+            'inactive': total - active,
+            'max_depth': max(by_level) if by_level else 0
+        }
+
+    @staticmethod
+    def totals(user_ids):
+        """
+        Direct and total downline counts for several users
+
+        Returns:
+            dict: user id -> (children_count, downline_count)
+        """
+        counts = {user_id: (0, 0) for user_id in user_ids}
+        if not counts:
+            return counts
+
+        rows = db.session.execute(
+            select(
+                UserDownlineCount.user_id,
+                func.coalesce(func.sum(UserDownlineCount.count).filter(UserDownlineCount.depth == 1), 0),
+                func.sum(UserDownlineCount.count)
+            ).where(
+                UserDownlineCount.user_id.in_(counts)
+            ).group_by(UserDownlineCount.user_id)
+        ).all()
+        counts.update({user_id: (children, total) for user_id, children, total in rows})
+        return counts
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every bucket from user_closure (caller commits)
+
+        Returns:
+            Number of bucket rows written
+        """
+        from src.models.user_closure import UserClosure
+
+        db.session.execute(delete(UserDownlineCount))
+        db.session.execute(
+            insert(UserDownlineCount).from_select(
+                ['user_id', 'role', 'depth', 'is_active', 'count'],
+                select(
+                    UserClosure.ancestor_id,
+                    User.role,
+                    UserClosure.depth,
+                    User.is_active,
+                    func.count()
+                ).join(
+                    User, User.id == UserClosure.descendant_id
+                ).where(
+                    UserClosure.depth > 0
+                ).group_by(UserClosure.ancestor_id, User.role, UserClosure.depth, User.is_active)
+            )
+        )
+        return db.session.query(func.count()).select_from(UserDownlineCount).scalar()
@@ -2,6 +2,7 @@
 Wallet model for managing user balances
 """
 from datetime import datetime
+from sqlalchemy import tuple_
 from src.database import db, TimestampMixin
 
 
@@ -84,11 +85,16 @@ class Transaction(db.Model, TimestampMixin):
     
     # Indexes
     __table_args__ = (
-        db.Index('ix_transaction_wallet_id', 'wallet_id'),
+        db.Index('ix_transaction_wallet_created', 'wallet_id', 'created_at', 'id'),  # history keyset
         db.Index('ix_transaction_type', 'type'),
         db.Index('ix_transaction_created_at', 'created_at'),
     )
     
+    @property
+    def delta(self):
+        """Signed change to the balance"""
+        return self.balance_after - self.balance_before
+    
     def to_dict(self):
         """Convert to dictionary"""
         return {
@@ -104,4 +110,60 @@ class Transaction(db.Model, TimestampMixin):
             'description': self.description,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+    
+    @staticmethod
+    def after_cursor(query, cursor, descending=True):
+        """Restrict a (created_at, id)-ordered query to rows past a cursor"""
+        created_at, transaction_id = Transaction.decode_cursor(cursor)
+        position = tuple_(Transaction.created_at, Transaction.id)
+        if descending:
+            return query.filter(position < (created_at, transaction_id))
+        return query.filter(position > (created_at, transaction_id))
+    
+    @staticmethod
+    def encode_cursor(transaction):
+        """History cursor pointing just past a transaction"""
+        return f'{transaction.created_at.isoformat()}_{transaction.id}'
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """(created_at, id) from a history cursor"""
+        try:
+            created_at, transaction_id = cursor.rsplit('_', 1)
+            return datetime.fromisoformat(created_at), int(transaction_id)
+        except (AttributeError, ValueError):
+            raise ValueError('Invalid cursor')
+
+
+class WalletBalanceSnapshot(db.Model):
+    """Balance of one wallet balance type as of a ledger row (flask wallet snapshot-balances)"""
+    
+    __tablename__ = 'wallet_balance_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.id'), nullable=False)
+    balance_type = db.Column(db.String(20), nullable=False)
+    
+    # Last ledger row included: the snapshot sits at (snapshot_at, transaction_id) in ledger order
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False)
+    snapshot_at = db.Column(db.DateTime, nullable=False)  # created_at of that row
+    balance = db.Column(db.Numeric(12, 2), nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_wallet_snapshot_lookup', 'wallet_id', 'balance_type', 'snapshot_at', 'transaction_id'),
+        db.UniqueConstraint('wallet_id', 'balance_type', 'transaction_id', name='uq_wallet_snapshot_transaction'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'wallet_id': self.wallet_id,
+            'balance_type': self.balance_type,
+            'transaction_id': self.transaction_id,
+            'snapshot_at': self.snapshot_at.isoformat() if self.snapshot_at else None,
+            'balance': float(self.balance)
+        }
 
@@ -9,12 +9,13 @@ from src.models.user import User
 from src.models.trading_program import Challenge
 from src.models.payment import Payment
 from src.models.trading_program import TradingProgram as Program
+from src.services.admin_dashboard_service import AdminDashboardService
 from src.utils.decorators import token_required, admin_required
 from src.utils.validators import validate_required_fields, validate_email_format
 from src.utils.error_messages import format_error_response
 from src.utils.hierarchy_scoping import without_hierarchy_scope
-from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from datetime import datetime
+from sqlalchemy import or_
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -23,76 +24,9 @@ admin_bp = Blueprint('admin', __name__)
 @token_required
 @admin_required
 def get_dashboard_stats():
-    """Get admin dashboard statistics"""
+    """Get admin dashboard statistics (cached for a few seconds per hierarchy scope)"""
     try:
-        # User statistics
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        pending_kyc = User.query.filter_by(kyc_status='pending').count()
-        
-        # Revenue statistics
-        total_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.status == 'completed'
-        ).scalar() or 0
-        
-        # Monthly revenue (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        monthly_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            and_(
-                Payment.status == 'completed',
-                Payment.created_at >= thirty_days_ago
-            )
-        ).scalar() or 0
-        
-        # Challenge statistics
-        total_challenges = Challenge.query.count()
-        active_challenges = Challenge.query.filter_by(status='active').count()
-        completed_challenges = Challenge.query.filter_by(status='completed').count()
-        failed_challenges = Challenge.query.filter_by(status='failed').count()
-        funded_challenges = Challenge.query.filter_by(status='funded').count()
-        
-        # Recent users (last 5) - automatically filtered by hierarchy!
-        recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-        
-        # Recent payments (last 5)
-        recent_payments = Payment.query.order_by(Payment.created_at.desc()).limit(5).all()
-        
-        return jsonify({
-            'users': {
-                'total': total_users,
-                'active': active_users,
-                'pending_kyc': pending_kyc,
-                'suspended': User.query.filter_by(is_active=False).count()
-            },
-            'revenue': {
-                'total': float(total_revenue),
-                'monthly': float(monthly_revenue),
-                'average_per_user': float(total_revenue / total_users) if total_users > 0 else 0
-            },
-            'challenges': {
-                'total': total_challenges,
-                'active': active_challenges,
-                'completed': completed_challenges,
-                'failed': failed_challenges,
-                'funded': funded_challenges
-            },
-            'recent_users': [{
-                'id': user.id,
-                'name': f"{user.first_name} {user.last_name}",
-                'email': user.email,
-                'role': user.role,
-                'status': 'active' if user.is_active else 'inactive',
-                'created_at': user.created_at.isoformat()
-            } for user in recent_users],
-            'recent_payments': [{
-                'id': payment.id,
-                'user_id': payment.user_id,
-                'amount': float(payment.amount),
-                'type': payment.purpose,
-                'status': payment.status,
-                'created_at': payment.created_at.isoformat()
-            } for payment in recent_payments]
-        }), 200
+        return jsonify(AdminDashboardService.get_stats()), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -294,10 +228,7 @@ def create_user():
             db.session.commit()
             
             # Build tree_path after commit
-            if g.current_user.tree_path:
-                user.tree_path = f"{g.current_user.tree_path}.{user.id}"
-            else:
-                user.tree_path = str(user.id)
+            user.update_tree_path()
             db.session.commit()
         
         # Generate referral code AFTER commit (to avoid NOT NULL issues)
@@ -795,6 +726,15 @@ def get_user_full_details(user_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/system/hierarchy-scope-stats', methods=['GET'])
+@token_required
+@admin_required
+def get_hierarchy_scope_stats():
+    """Get hierarchy scoping counters for this worker process"""
+    from src.utils.hierarchy_scoping import get_hierarchy_scope_stats as scope_stats
+    return jsonify({'stats': scope_stats()}), 200
+
+
 
 
 # /users/hierarchy endpoint removed - no longer needed!
@@ -7,6 +7,7 @@ from src.models.trading_program import Challenge
 from src.models.trading_program import TradingProgram as Program
 from src.models.trade import Trade
 from src.models.payment import Payment
+from src.services.challenge_evaluation_service import ChallengeEvaluationService
 from src.utils.decorators import token_required, admin_required
 from datetime import datetime
 from sqlalchemy import desc, and_
@@ -110,63 +111,26 @@ def start_challenge(challenge_id):
 @token_required
 @admin_required
 def evaluate_challenge(challenge_id):
-    """Evaluate a challenge and update status"""
+    """Evaluate a challenge against its program rules and update status"""
     try:
         challenge = Challenge.query.get_or_404(challenge_id)
         
         if challenge.status != 'active':
             return jsonify({'error': 'Challenge is not active'}), 400
         
-        # Get all trades for this challenge
-        trades = Trade.query.filter_by(challenge_id=challenge_id).all()
-        
-        # Calculate metrics
-        initial_balance = float(challenge.initial_balance)
-        current_balance = float(challenge.current_balance)
-        max_balance = float(challenge.max_balance or initial_balance)
-        
-        # Calculate profit
-        profit = current_balance - initial_balance
-        profit_percentage = (profit / initial_balance) * 100
-        
-        # Calculate drawdown
-        drawdown = ((max_balance - current_balance) / max_balance) * 100
-        
-        # Check if profit target is met
-        profit_target = float(challenge.profit_target)
-        profit_target_met = profit >= profit_target
-        
-        # Check if minimum trading days are met
-        min_days = challenge.min_trading_days or 5
-        trading_days = challenge.trading_days or 0
-        days_requirement_met = trading_days >= min_days
-        
-        # Check if drawdown limits are violated
-        max_drawdown = float(challenge.max_total_drawdown)
-        drawdown_violated = drawdown > max_drawdown
-        
-        # Determine challenge outcome
-        if drawdown_violated:
-            challenge.status = 'failed'
-            challenge.failure_reason = f'Maximum drawdown exceeded: {drawdown:.2f}%'
-            challenge.completed_at = datetime.utcnow()
-        elif profit_target_met and days_requirement_met:
-            # Check if this is a two-phase challenge
-            program = Program.query.get(challenge.program_id)
-            
-            if program.type == 'two_phase' and challenge.phase == 1:
-                # Move to phase 2
-                challenge.phase = 2
-                challenge.profit_target = program.profit_target  # Reset for phase 2
-                challenge.trading_days = 0  # Reset trading days
-                message = 'Phase 1 completed! Moving to Phase 2'
-            else:
-                # Challenge completed successfully
-                challenge.status = 'completed'
-                challenge.completed_at = datetime.utcnow()
-                message = 'Challenge completed successfully! Awaiting funding'
+        previous_phase = challenge.current_phase
+        result = ChallengeEvaluationService.evaluate_challenge(challenge)
+        
+        if result['outcome'] == 'failed':
+            reason = 'Maximum daily loss exceeded' if result['daily_loss_violated'] else 'Maximum drawdown exceeded'
+            message = f'Challenge failed: {reason}'
+        elif challenge.current_phase != previous_phase:
+            message = f'Phase {previous_phase} completed! Moving to Phase {challenge.current_phase}'
+        elif result['outcome'] == 'passed':
+            message = 'Challenge completed successfully! Awaiting funding'
         else:
-            message = f'Challenge in progress. Profit: {profit_percentage:.2f}%, Days: {trading_days}/{min_days}'
+            min_days = ChallengeEvaluationService.get_rules(challenge.program)['min_trading_days']
+            message = f"Challenge in progress. Profit: {result['profit_percentage']:.2f}%, Days: {result['trading_days']}/{min_days}"
         
         db.session.commit()
         
@@ -175,14 +139,15 @@ def evaluate_challenge(challenge_id):
             'challenge': {
                 'id': challenge.id,
                 'status': challenge.status,
-                'phase': challenge.phase,
-                'profit': profit,
-                'profit_percentage': round(profit_percentage, 2),
-                'drawdown': round(drawdown, 2),
-                'trading_days': trading_days,
-                'profit_target_met': profit_target_met,
-                'days_requirement_met': days_requirement_met
-            }
+                'phase': challenge.current_phase,
+                'profit': result['net_profit'],
+                'profit_percentage': result['profit_percentage'],
+                'drawdown': result['max_drawdown_percentage'],
+                'trading_days': result['trading_days'],
+                'profit_target_met': result['profit_target_met'],
+                'days_requirement_met': result['days_requirement_met']
+            },
+            'evaluation': result
         }), 200
         
     except Exception as e:
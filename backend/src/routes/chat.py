@@ -2,6 +2,7 @@
 Chat routes for OpenAI GPT-5 integration
 """
 from flask import Blueprint, request, jsonify, g
+from src import limiter
 from src.services.openai_service import get_openai_service
 from src.utils.decorators import token_required
 from src.models import Challenge
@@ -11,6 +12,15 @@ logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
 
+MAX_FAQ_QUESTION_LENGTH = 1000
+
+
+def _failure(response, default_error):
+    """503 with Retry-After when the OpenAI pool is saturated, else 500"""
+    if response.get('busy'):
+        return jsonify({'error': response['error']}), 503, {'Retry-After': '5'}
+    return jsonify({'error': response.get('error', default_error)}), 500
+
 
 @chat_bp.route('/message', methods=['POST'])
 @token_required
@@ -53,7 +63,7 @@ def send_message():
         response = openai_service.get_trading_advice(message, user_context)
         
         if not response['success']:
-            return jsonify({'error': response.get('error', 'Failed to get response')}), 500
+            return _failure(response, 'Failed to get response')
         
         return jsonify({
             'message': response['message'],
@@ -94,11 +104,12 @@ def get_program_recommendation():
         response = openai_service.get_program_recommendation(user_profile)
         
         if not response['success']:
-            return jsonify({'error': response.get('error', 'Failed to get recommendation')}), 500
+            return _failure(response, 'Failed to get recommendation')
         
         return jsonify({
             'recommendation': response['message'],
-            'usage': response.get('usage', {})
+            'usage': response.get('usage', {}),
+            'cached': response.get('cached', False)
         }), 200
         
     except Exception as e:
@@ -176,7 +187,7 @@ def analyze_performance():
         response = openai_service.analyze_trading_performance(performance_data)
         
         if not response['success']:
-            return jsonify({'error': response.get('error', 'Failed to analyze performance')}), 500
+            return _failure(response, 'Failed to analyze performance')
         
         return jsonify({
             'performance': performance_data,
@@ -190,10 +201,12 @@ def analyze_performance():
 
 
 @chat_bp.route('/faq', methods=['POST'])
+@limiter.limit("20 per minute")
 def answer_faq():
     """
     Get AI-generated answer for FAQ question
-    No authentication required for public FAQ
+    No authentication required for public FAQ (rate limited per IP; answers
+    to repeated questions come from the response cache)
     
     Request body:
     {
@@ -209,16 +222,22 @@ def answer_faq():
     question = data['question']
     context = data.get('context')
     
+    if not isinstance(question, str) or not question.strip():
+        return jsonify({'error': 'Question is required'}), 400
+    if len(question) > MAX_FAQ_QUESTION_LENGTH or len(str(context or '')) > MAX_FAQ_QUESTION_LENGTH:
+        return jsonify({'error': f'Question must be at most {MAX_FAQ_QUESTION_LENGTH} characters'}), 400
+    
     try:
         openai_service = get_openai_service()
         response = openai_service.generate_faq_answer(question, context)
         
         if not response['success']:
-            return jsonify({'error': response.get('error', 'Failed to generate answer')}), 500
+            return _failure(response, 'Failed to generate answer')
         
         return jsonify({
             'answer': response['message'],
-            'usage': response.get('usage', {})
+            'usage': response.get('usage', {}),
+            'cached': response.get('cached', False)
         }), 200
         
     except Exception as e:
@@ -8,10 +8,15 @@ from src.models.user import User
 from src.utils.decorators import token_required
 from src.utils.permissions import PermissionManager
 from datetime import datetime, timedelta
-from sqlalchemy import or_, func
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 
 crm_bp = Blueprint('crm', __name__)
 
+LEAD_STATUSES = ['new', 'contacted', 'qualified', 'negotiating', 'converted', 'lost']
+PIPELINE_STAGES = ['new', 'contacted', 'qualified', 'negotiating']
+PIPELINE_STAGE_LIMIT = 20
+
 
 @crm_bp.route('/leads', methods=['GET'])
 @token_required
@@ -49,34 +54,29 @@ def get_leads():
             query = query.filter_by(assigned_to=int(assigned_to))
         
         if search:
-            query = query.filter(
-                or_(
-                    Lead.first_name.ilike(f'%{search}%'),
-                    Lead.last_name.ilike(f'%{search}%'),
-                    Lead.email.ilike(f'%{search}%'),
-                    Lead.phone.ilike(f'%{search}%')
-                )
-            )
+            # Served by the ix_leads_search_trgm trigram index
+            query = query.filter(Lead.search_filter(search))
         
         # Order by score (high to low) and created date
         query = query.order_by(Lead.score.desc(), Lead.created_at.desc())
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Paginate; assigned users of the page are loaded in one query
+        pagination = query.options(selectinload(Lead.assigned_user)).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         leads = []
         for lead in pagination.items:
             lead_data = lead.to_dict()
             
             # Add assigned user info
-            if lead.assigned_to:
-                assigned_user = User.query.get(lead.assigned_to)
-                if assigned_user:
-                    lead_data['assigned_user'] = {
-                        'id': assigned_user.id,
-                        'name': f"{assigned_user.first_name} {assigned_user.last_name}",
-                        'email': assigned_user.email
-                    }
+            assigned_user = lead.assigned_user
+            if assigned_user:
+                lead_data['assigned_user'] = {
+                    'id': assigned_user.id,
+                    'name': f"{assigned_user.first_name} {assigned_user.last_name}",
+                    'email': assigned_user.email
+                }
             
             leads.append(lead_data)
         
@@ -176,8 +176,7 @@ def get_lead(lead_id):
             return jsonify({'error': 'Lead not found'}), 404
         
         # Check permission
-        viewable_ids = PermissionManager.get_viewable_user_ids(current_user)
-        if lead.assigned_to and lead.assigned_to not in viewable_ids:
+        if lead.assigned_to and not PermissionManager.is_in_downline(current_user, lead.assigned_to):
             return jsonify({'error': 'Access denied'}), 403
         
         lead_data = lead.to_dict()
@@ -501,34 +500,34 @@ def get_crm_stats():
         base_query = Lead.query
         base_query = PermissionManager.filter_leads_by_permission(current_user, base_query)
         
-        # Total leads
-        total = base_query.count()
-        
-        # By status
-        by_status = {}
-        for status in ['new', 'contacted', 'qualified', 'negotiating', 'converted', 'lost']:
-            count = base_query.filter_by(status=status).count()
-            by_status[status] = count
-        
-        # By source
-        by_source = {}
-        sources = db.session.query(Lead.source, func.count(Lead.id)).group_by(Lead.source).all()
-        for source, count in sources:
-            by_source[source] = count
-        
-        # This month
         first_day = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        this_month = base_query.filter(Lead.created_at >= first_day).count()
         
-        # Converted this month
-        converted_this_month = base_query.filter(
-            Lead.status == 'converted',
-            Lead.converted_at >= first_day
-        ).count()
+        # One grouped pass: counts per (status, source), with this month's
+        # created and converted leads as filtered aggregates
+        rows = base_query.with_entities(
+            Lead.status,
+            Lead.source,
+            func.count(Lead.id),
+            func.count(Lead.id).filter(Lead.created_at >= first_day),
+            func.count(Lead.id).filter(Lead.status == 'converted', Lead.converted_at >= first_day)
+        ).group_by(Lead.status, Lead.source).all()
+        
+        total = 0
+        this_month = 0
+        converted_this_month = 0
+        by_status = dict.fromkeys(LEAD_STATUSES, 0)
+        by_source = {}
+        for status, source, count, created_count, converted_count in rows:
+            total += count
+            this_month += created_count
+            converted_this_month += converted_count
+            if status in by_status:
+                by_status[status] += count
+            by_source[source] = by_source.get(source, 0) + count
         
         # Conversion rate
-        qualified = base_query.filter_by(status='qualified').count()
-        converted = base_query.filter_by(status='converted').count()
+        qualified = by_status['qualified']
+        converted = by_status['converted']
         conversion_rate = (converted / qualified * 100) if qualified > 0 else 0
         
         return jsonify({
@@ -558,12 +557,21 @@ def get_pipeline():
         base_query = Lead.query
         base_query = PermissionManager.filter_leads_by_permission(current_user, base_query)
         
-        pipeline = {}
-        stages = ['new', 'contacted', 'qualified', 'negotiating']
-        
-        for stage in stages:
-            leads = base_query.filter_by(status=stage).order_by(Lead.score.desc()).limit(20).all()
-            pipeline[stage] = [l.to_dict() for l in leads]
+        # Top leads of every stage in one query: rank by score within each stage
+        ranked = base_query.filter(Lead.status.in_(PIPELINE_STAGES)).with_entities(
+            Lead.id,
+            func.row_number().over(
+                partition_by=Lead.status,
+                order_by=(Lead.score.desc(), Lead.id.desc())
+            ).label('stage_rank')
+        ).subquery()
+        leads = Lead.query.join(ranked, ranked.c.id == Lead.id).filter(
+            ranked.c.stage_rank <= PIPELINE_STAGE_LIMIT
+        ).order_by(ranked.c.stage_rank).all()
+        
+        pipeline = {stage: [] for stage in PIPELINE_STAGES}
+        for lead in leads:
+            pipeline[lead.status].append(lead.to_dict())
         
         return jsonify(pipeline), 200
         
@@ -0,0 +1,116 @@
+"""
+Export routes
+Streaming CSV/NDJSON downloads of report datasets and background export
+jobs (including Parquet) with progress polling.
+"""
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context, redirect, send_file
+from src.services.export_service import ExportService, FORMATS, STREAMING_FORMATS
+from src.services.job_service import JobService
+from src.services.storage_service import StorageService
+from src.utils.decorators import token_required
+from datetime import datetime
+import os
+
+exports_bp = Blueprint('exports', __name__)
+
+
+def _export_filters(source):
+    return {key: source.get(key) for key in ('since', 'until', 'status') if source.get(key)}
+
+
+@exports_bp.route('/<dataset>', methods=['GET'])
+@token_required
+def stream_export(dataset):
+    """Stream a dataset as CSV (default) or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in STREAMING_FORMATS:
+        return jsonify({'error': f'Streaming supports {", ".join(STREAMING_FORMATS)}; use an export job for {fmt}'}), 400
+    
+    try:
+        requester = ExportService.get_requester(g.current_user)
+        ExportService.validate(dataset, fmt, requester)
+        columns, query = ExportService.build_query(dataset, requester, _export_filters(request.args))
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    content_type, extension = FORMATS[fmt]
+    filename = f"{dataset}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+    
+    return Response(
+        stream_with_context(ExportService.stream(fmt, columns, ExportService.iter_rows(query))),
+        mimetype=content_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@exports_bp.route('/jobs', methods=['POST'])
+@token_required
+def create_export_job():
+    """Start a background export (csv, ndjson or parquet)"""
+    data = request.get_json() or {}
+    dataset = data.get('dataset')
+    fmt = data.get('format', 'csv')
+    
+    try:
+        requester = ExportService.get_requester(g.current_user)
+        ExportService.validate(dataset, fmt, requester)
+        filters = _export_filters(data.get('filters') or {})
+        # Fail fast on bad filter values instead of inside the job
+        ExportService.build_query(dataset, requester, filters)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        job = JobService.submit(
+            'export',
+            ExportService.run_export_job,
+            params={'dataset': dataset, 'format': fmt, 'filters': filters, 'requester': requester},
+            user_id=g.current_user.id
+        )
+        return jsonify({'job': job.to_dict()}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@exports_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_export_job(job_id):
+    """Poll an export job's progress"""
+    job = JobService.get_job(job_id, user_id=g.current_user.id)
+    if not job or job.job_type != 'export':
+        return jsonify({'error': 'Export job not found'}), 404
+    
+    return jsonify({'job': job.to_dict()}), 200
+
+
+@exports_bp.route('/jobs/<job_id>/download', methods=['GET'])
+@token_required
+def download_export(job_id):
+    """Send the finished export file (local storage) or redirect to a short-lived presigned URL (Spaces)"""
+    job = JobService.get_job(job_id, user_id=g.current_user.id)
+    if not job or job.job_type != 'export':
+        return jsonify({'error': 'Export job not found'}), 404
+    if job.status != 'completed':
+        return jsonify({'error': f'Export is {job.status}'}), 409
+    
+    storage = StorageService()
+    key = job.result['key']
+    if job.result.get('local', storage.client is None):
+        try:
+            path = storage.private_path(key)
+        except ValueError:
+            return jsonify({'error': 'Export file unavailable'}), 500
+        if not os.path.exists(path):
+            return jsonify({'error': 'Export file unavailable'}), 410
+        
+        content_type = FORMATS.get(job.result.get('format'), ('application/octet-stream',))[0]
+        return send_file(path, mimetype=content_type, as_attachment=True, download_name=os.path.basename(key))
+    
+    url = storage.get_file_url(key, expires_in=300)
+    if not url:
+        return jsonify({'error': 'Export file unavailable'}), 500
+    return redirect(url)
@@ -4,7 +4,9 @@ Hierarchy routes for MLM structure
 from flask import Blueprint, request, jsonify, g
 from src.database import db
 from src.models.user import User
+from src.services.hierarchy_service import HierarchyService
 from src.utils.decorators import token_required
+from src.utils.permissions import PermissionManager
 from datetime import datetime
 from sqlalchemy import or_
 
@@ -18,31 +20,11 @@ def get_my_downline():
     try:
         current_user = g.current_user
         
-        # Get all descendants
-        descendants = current_user.get_all_descendants()
-        
-        # Organize by level
-        downline_by_level = {}
-        for user in descendants:
-            level_diff = user.level - current_user.level
-            if level_diff not in downline_by_level:
-                downline_by_level[level_diff] = []
-            
-            downline_by_level[level_diff].append({
-                'id': user.id,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'role': user.role,
-                'level': user.level,
-                'parent_id': user.parent_id,
-                'is_active': user.is_active,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'children_count': len(user.children)
-            })
+        # One level-order load of the downline, children counted from the same rows
+        total, downline_by_level = HierarchyService.downline_by_level(current_user.id)
         
         return jsonify({
-            'total_downline': len(descendants),
+            'total_downline': total,
             'downline_by_level': downline_by_level,
             'levels_deep': max(downline_by_level.keys()) if downline_by_level else 0
         }), 200
@@ -86,9 +68,11 @@ def get_my_direct_team():
         
         # Paginate
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        counts = HierarchyService.downline_counts([user.id for user in pagination.items])
         
         users = []
         for user in pagination.items:
+            children_count, downline_count = counts[user.id]
             users.append({
                 'id': user.id,
                 'email': user.email,
@@ -99,8 +83,8 @@ def get_my_direct_team():
                 'is_active': user.is_active,
                 'kyc_status': user.kyc_status,
                 'created_at': user.created_at.isoformat() if user.created_at else None,
-                'children_count': len(user.children),
-                'downline_count': user.get_downline_count()
+                'children_count': children_count,
+                'downline_count': downline_count
             })
         
         return jsonify({
@@ -191,10 +175,10 @@ def get_downline_user(user_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Check if user is in current user's downline
-        if user.id != current_user.id:
-            ancestors = user.get_ancestors()
-            if current_user not in ancestors:
-                return jsonify({'error': 'Access denied'}), 403
+        if not PermissionManager.is_in_downline(current_user, user.id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        children_count, downline_count = HierarchyService.downline_counts([user.id])[user.id]
         
         # Get user details with hierarchy info
         return jsonify({
@@ -218,8 +202,8 @@ def get_downline_user(user_id):
                 'name': f"{user.parent.first_name} {user.parent.last_name}",
                 'role': user.parent.role
             } if user.parent else None,
-            'children_count': len(user.children),
-            'downline_count': user.get_downline_count()
+            'children_count': children_count,
+            'downline_count': downline_count
         }), 200
         
     except Exception as e:
@@ -240,8 +224,7 @@ def update_downline_user(user_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Check if user is in current user's downline
-        ancestors = user.get_ancestors()
-        if current_user not in ancestors and user.id != current_user.id:
+        if not PermissionManager.is_in_downline(current_user, user.id):
             return jsonify({'error': 'Access denied'}), 403
         
         # Update allowed fields
@@ -285,30 +268,8 @@ def get_hierarchy_tree():
         current_user = g.current_user
         max_depth = int(request.args.get('max_depth', 5))
         
-        def build_tree(user, current_depth=0):
-            """Recursively build tree structure"""
-            if current_depth >= max_depth:
-                return None
-            
-            node = {
-                'id': user.id,
-                'email': user.email,
-                'name': f"{user.first_name} {user.last_name}",
-                'role': user.role,
-                'level': user.level,
-                'is_active': user.is_active,
-                'children_count': len(user.children),
-                'children': []
-            }
-            
-            for child in user.children:
-                child_node = build_tree(child, current_depth + 1)
-                if child_node:
-                    node['children'].append(child_node)
-            
-            return node
-        
-        tree = build_tree(current_user)
+        # Subtree in level order + grouped child counts, assembled in Python
+        tree = HierarchyService.build_tree(current_user.id, max_depth)
         
         return jsonify({
             'tree': tree,
@@ -326,33 +287,8 @@ def get_hierarchy_stats():
     try:
         current_user = g.current_user
         
-        # Get all descendants
-        descendants = current_user.get_all_descendants()
-        
-        # Count by role
-        role_counts = {}
-        for user in descendants:
-            role_counts[user.role] = role_counts.get(user.role, 0) + 1
-        
-        # Count by level
-        level_counts = {}
-        for user in descendants:
-            level_diff = user.level - current_user.level
-            level_counts[level_diff] = level_counts.get(level_diff, 0) + 1
-        
-        # Count active vs inactive
-        active_count = sum(1 for u in descendants if u.is_active)
-        inactive_count = len(descendants) - active_count
-        
-        return jsonify({
-            'total_downline': len(descendants),
-            'direct_children': len(current_user.children),
-            'by_role': role_counts,
-            'by_level': level_counts,
-            'active': active_count,
-            'inactive': inactive_count,
-            'max_depth': max(level_counts.keys()) if level_counts else 0
-        }), 200
+        # Point read of the precomputed downline counters
+        return jsonify(HierarchyService.downline_stats(current_user.id)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
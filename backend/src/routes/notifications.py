@@ -18,6 +18,7 @@ def get_notifications():
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        cursor = request.args.get('cursor')
         notification_type = request.args.get('type')
         is_read = request.args.get('is_read')
         priority = request.args.get('priority')
@@ -36,11 +37,14 @@ def get_notifications():
             user_id=current_user.id,
             filters=filters,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor
         )
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -238,20 +242,39 @@ def admin_broadcast_notification():
         notification_data = data.get('data')
         role = data.get('role')  # Optional: broadcast to specific role
         
-        # Broadcast
-        count = NotificationService.broadcast_notification(
+        # Broadcast (fan-out runs in the background)
+        job = NotificationService.broadcast_notification(
             notification_type=notification_type,
             title=title,
             message=message,
             data=notification_data,
             priority=priority,
-            role=role
+            role=role,
+            requested_by=get_current_user().id
         )
         
         return jsonify({
-            'message': f'Notification broadcast to {count} users',
-            'count': count
-        }), 200
+            'message': 'Notification broadcast queued',
+            'job_id': job.id,
+            'job': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@notifications_bp.route('/admin/broadcast/<job_id>', methods=['GET'])
+@admin_required
+def admin_get_broadcast(job_id):
+    """Get progress of a broadcast job"""
+    try:
+        from src.services.job_service import JobService
+        
+        job = JobService.get_job(job_id)
+        if not job or job.job_type != 'notification_broadcast':
+            return jsonify({'error': 'Broadcast not found'}), 404
+        
+        return jsonify({'job': job.to_dict()}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
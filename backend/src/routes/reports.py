@@ -12,8 +12,7 @@ from src.models.referral import Referral
 from src.models.agent import Agent
 from src.utils.decorators import token_required, admin_required
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, desc, extract
-from collections import defaultdict
+from sqlalchemy import func, and_, desc, extract, case
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -333,140 +332,155 @@ def get_agent_analytics():
         if not agent:
             return jsonify({'error': 'User is not an agent'}), 403
         
-        # Get referrals
-        referrals = Referral.query.filter_by(agent_id=agent.id).all()
-        trader_ids = [r.referred_user_id for r in referrals]
-        
-        # Monthly trends (last 12 months)
-        monthly_data = defaultdict(lambda: {'traders': 0, 'commissions': 0, 'funded': 0})
-        
-        # Get new traders per month
-        for i in range(12):
-            month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=30)
-            
-            new_traders = User.query.filter(
-                and_(
-                    User.id.in_(trader_ids),
-                    User.created_at >= month_start,
-                    User.created_at < month_end
-                )
-            ).count()
-            
-            month_commissions = db.session.query(func.sum(Commission.amount)).filter(
-                and_(
-                    Commission.agent_id == agent.id,
-                    Commission.created_at >= month_start,
-                    Commission.created_at < month_end
-                )
-            ).scalar() or 0
-            
-            funded_count = db.session.query(Challenge.user_id).filter(
-                and_(
-                    Challenge.user_id.in_(trader_ids),
-                    Challenge.status == 'funded',
-                    Challenge.funded_at >= month_start,
-                    Challenge.funded_at < month_end
-                )
-            ).distinct().count()
-            
-            month_key = month_start.strftime('%Y-%m')
-            monthly_data[month_key] = {
-                'traders': new_traders,
-                'commissions': float(month_commissions),
-                'funded': funded_count
-            }
+        # Referred traders stay a subquery so no id list is ever materialized
+        trader_ids = db.session.query(Referral.referred_user_id).filter(
+            Referral.agent_id == agent.id
+        ).scalar_subquery()
+        
+        now = datetime.utcnow()
+        month_keys = _last_month_keys(now, 12)
+        window_start = datetime.strptime(month_keys[0], '%Y-%m')
+        
+        # Monthly trends (last 12 calendar months), one grouped query per series
+        monthly_data = {key: {'traders': 0, 'commissions': 0, 'funded': 0} for key in month_keys}
+        
+        user_month = func.date_trunc('month', User.created_at, type_=db.DateTime)
+        for row in db.session.query(
+            user_month.label('month'),
+            func.count(User.id).label('count')
+        ).filter(
+            User.id.in_(trader_ids),
+            User.created_at >= window_start
+        ).group_by(user_month):
+            monthly_data[row.month.strftime('%Y-%m')]['traders'] = row.count
+        
+        commission_month = func.date_trunc('month', Commission.created_at, type_=db.DateTime)
+        for row in db.session.query(
+            commission_month.label('month'),
+            func.sum(Commission.commission_amount).label('amount')
+        ).filter(
+            Commission.agent_id == agent.id,
+            Commission.created_at >= window_start
+        ).group_by(commission_month):
+            monthly_data[row.month.strftime('%Y-%m')]['commissions'] = float(row.amount or 0)
+        
+        # Challenges carry no funded timestamp; passed_at (or the last update
+        # that moved it to funded) is the closest record of when it happened
+        funded_at = func.coalesce(Challenge.passed_at, Challenge.updated_at)
+        funded_month = func.date_trunc('month', funded_at, type_=db.DateTime)
+        for row in db.session.query(
+            funded_month.label('month'),
+            func.count(func.distinct(Challenge.user_id)).label('count')
+        ).filter(
+            Challenge.user_id.in_(trader_ids),
+            Challenge.status == 'funded',
+            funded_at >= window_start
+        ).group_by(funded_month):
+            monthly_data[row.month.strftime('%Y-%m')]['funded'] = row.count
+        
+        # Top performing traders: profit over funded challenges, ranked in SQL
+        funded_profit = db.session.query(
+            Challenge.user_id.label('user_id'),
+            func.sum(Challenge.current_balance - Challenge.initial_balance).label('profit')
+        ).filter(
+            Challenge.user_id.in_(trader_ids),
+            Challenge.status == 'funded'
+        ).group_by(Challenge.user_id).subquery()
+        
+        funded_trades = db.session.query(
+            Challenge.user_id.label('user_id'),
+            func.count(Trade.id).label('total_trades'),
+            func.sum(case((Trade.profit > 0, 1), else_=0)).label('winning_trades')
+        ).join(
+            Trade, Trade.challenge_id == Challenge.id
+        ).filter(
+            Challenge.user_id.in_(trader_ids),
+            Challenge.status == 'funded'
+        ).group_by(Challenge.user_id).subquery()
+        
+        ranked = db.session.query(
+            funded_profit.c.user_id,
+            funded_profit.c.profit,
+            func.coalesce(funded_trades.c.total_trades, 0).label('total_trades'),
+            func.coalesce(funded_trades.c.winning_trades, 0).label('winning_trades'),
+            func.rank().over(order_by=funded_profit.c.profit.desc()).label('rank')
+        ).outerjoin(
+            funded_trades, funded_trades.c.user_id == funded_profit.c.user_id
+        ).subquery()
+        
+        top_rows = db.session.query(
+            ranked,
+            User.first_name,
+            User.last_name
+        ).join(
+            User, User.id == ranked.c.user_id
+        ).filter(
+            ranked.c.rank <= 10
+        ).order_by(ranked.c.rank).limit(10).all()
         
-        # Top performing traders
         top_traders = []
-        for trader_id in trader_ids[:10]:  # Limit to top 10
-            trader = User.query.get(trader_id)
-            if not trader:
-                continue
-            
-            # Get funded challenges
-            funded_challenges = Challenge.query.filter_by(
-                user_id=trader_id,
-                status='funded'
-            ).all()
-            
-            if not funded_challenges:
-                continue
-            
-            # Calculate total profit
-            total_profit = sum([
-                float(c.current_balance - c.initial_balance)
-                for c in funded_challenges
-            ])
-            
-            # Get trades
-            challenge_ids = [c.id for c in funded_challenges]
-            trades = Trade.query.filter(Trade.challenge_id.in_(challenge_ids)).all()
-            
-            winning_trades = len([t for t in trades if t.profit > 0])
-            total_trades = len(trades)
-            win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-            
+        for i, row in enumerate(top_rows, 1):
+            total_trades = int(row.total_trades)
+            win_rate = (int(row.winning_trades) / total_trades * 100) if total_trades > 0 else 0
             top_traders.append({
-                'trader_id': trader.id,
-                'name': f"{trader.first_name} {trader.last_name}",
-                'profit': round(total_profit, 2),
+                'trader_id': row.user_id,
+                'name': f"{row.first_name} {row.last_name}",
+                'profit': round(float(row.profit or 0), 2),
                 'win_rate': round(win_rate, 2),
-                'total_trades': total_trades
+                'total_trades': total_trades,
+                'rank': i
             })
         
-        # Sort by profit
-        top_traders.sort(key=lambda x: x['profit'], reverse=True)
-        
-        # Add rank
-        for i, trader in enumerate(top_traders[:10], 1):
-            trader['rank'] = i
-        
         # Overall statistics
-        total_traders = len(trader_ids)
-        active_traders = User.query.filter(
-            and_(User.id.in_(trader_ids), User.is_active == True)
-        ).count()
+        trader_stats = db.session.query(
+            func.count(User.id).label('total'),
+            func.sum(case((User.is_active == True, 1), else_=0)).label('active'),
+            func.sum(case((User.created_at >= now - timedelta(days=30), 1), else_=0)).label('new')
+        ).filter(User.id.in_(trader_ids)).one()
         
-        total_commissions = db.session.query(func.sum(Commission.amount)).filter(
+        total_traders = trader_stats.total
+        active_traders = int(trader_stats.active or 0)
+        
+        total_commissions = db.session.query(func.sum(Commission.commission_amount)).filter(
             Commission.agent_id == agent.id
         ).scalar() or 0
         
-        avg_commission_per_trader = (total_commissions / total_traders) if total_traders > 0 else 0
+        avg_commission_per_trader = (float(total_commissions) / total_traders) if total_traders > 0 else 0
         
         # Performance metrics
-        all_challenges = Challenge.query.filter(Challenge.user_id.in_(trader_ids)).all()
-        completed = len([c for c in all_challenges if c.status in ['completed', 'funded']])
-        total = len(all_challenges)
+        challenge_stats = db.session.query(
+            func.count(Challenge.id).label('total'),
+            func.sum(case((Challenge.status.in_(['completed', 'funded']), 1), else_=0)).label('completed'),
+            func.sum(case((Challenge.status == 'funded', 1), else_=0)).label('funded'),
+            func.sum(case(
+                (Challenge.status == 'funded', Challenge.current_balance - Challenge.initial_balance),
+                else_=0
+            )).label('funded_profit')
+        ).filter(Challenge.user_id.in_(trader_ids)).one()
+        
+        total = challenge_stats.total
+        completed = int(challenge_stats.completed or 0)
         pass_rate = (completed / total * 100) if total > 0 else 0
         
         # Calculate average win rate
-        all_trades = Trade.query.filter(
-            Trade.challenge_id.in_([c.id for c in all_challenges])
-        ).all()
-        winning = len([t for t in all_trades if t.profit > 0])
-        total_trades_count = len(all_trades)
-        avg_win_rate = (winning / total_trades_count * 100) if total_trades_count > 0 else 0
+        trade_stats = db.session.query(
+            func.count(Trade.id).label('total'),
+            func.sum(case((Trade.profit > 0, 1), else_=0)).label('winning')
+        ).join(
+            Challenge, Trade.challenge_id == Challenge.id
+        ).filter(Challenge.user_id.in_(trader_ids)).one()
         
-        # Average profit per trader
-        funded_challenges = [c for c in all_challenges if c.status == 'funded']
-        total_profit = sum([
-            float(c.current_balance - c.initial_balance)
-            for c in funded_challenges
-        ])
-        avg_profit = (total_profit / len(funded_challenges)) if funded_challenges else 0
+        total_trades_count = trade_stats.total
+        avg_win_rate = (int(trade_stats.winning or 0) / total_trades_count * 100) if total_trades_count > 0 else 0
         
-        # Funded accounts
-        funded_accounts = len(funded_challenges)
+        # Average profit per funded account
+        funded_accounts = int(challenge_stats.funded or 0)
+        total_profit = float(challenge_stats.funded_profit or 0)
+        avg_profit = (total_profit / funded_accounts) if funded_accounts else 0
         
         return jsonify({
             'overview': {
-                'new_traders': User.query.filter(
-                    and_(
-                        User.id.in_(trader_ids),
-                        User.created_at >= datetime.utcnow() - timedelta(days=30)
-                    )
-                ).count(),
+                'new_traders': int(trader_stats.new or 0),
                 'active_traders': active_traders,
                 'total_commissions': round(float(total_commissions), 2),
                 'avg_commission_per_trader': round(avg_commission_per_trader, 2)
@@ -477,14 +491,26 @@ def get_agent_analytics():
                 'avg_profit_per_trader': round(avg_profit, 2),
                 'funded_accounts': funded_accounts
             },
-            'monthly_trends': dict(sorted(monthly_data.items())),
-            'top_traders': top_traders[:10]
+            'monthly_trends': monthly_data,
+            'top_traders': top_traders
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _last_month_keys(now, count):
+    """Return 'YYYY-MM' keys for the last `count` calendar months, oldest first"""
+    keys = []
+    year, month = now.year, now.month
+    for _ in range(count):
+        keys.append(f'{year:04d}-{month:02d}')
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(keys))
+
+
 @reports_bp.route('/admin/analytics', methods=['GET'])
 @token_required
 @admin_required
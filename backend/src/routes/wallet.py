@@ -32,33 +32,75 @@ def get_balance():
 @wallet_bp.route('/transactions', methods=['GET'])
 @jwt_required
 def get_transactions():
-    """Get transaction history"""
+    """Get transaction history (pass next_cursor back as cursor for the next page)"""
     try:
         user_id = get_current_user().id
         
         # Query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        cursor = request.args.get('cursor')
         balance_type = request.args.get('balance_type')
         
         offset = (page - 1) * per_page
         
-        transactions = WalletService.get_transaction_history(
+        history = WalletService.get_transaction_history(
             user_id, 
             limit=per_page, 
             offset=offset,
-            balance_type=balance_type
+            balance_type=balance_type,
+            cursor=cursor
         )
+        transactions = history['transactions']
         
         return jsonify({
             'transactions': [t.to_dict() for t in transactions],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': len(transactions)
+                'total': len(transactions),
+                'next_cursor': history['next_cursor']
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@wallet_bp.route('/statement', methods=['GET'])
+@jwt_required
+def get_statement():
+    """Get a statement: opening/closing balance, totals and transactions for [start, end)"""
+    try:
+        user_id = get_current_user().id
+        
+        try:
+            start = datetime.fromisoformat(request.args['start'])
+            end = datetime.fromisoformat(request.args['end'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'start and end are required ISO dates'}), 400
+        if end <= start:
+            return jsonify({'error': 'end must be after start'}), 400
+        
+        statement = WalletService.get_statement(
+            user_id,
+            start,
+            end,
+            balance_type=request.args.get('balance_type', 'main'),
+            limit=request.args.get('per_page', 500, type=int),
+            cursor=request.args.get('cursor')
+        )
+        
+        for key in ('opening_balance', 'closing_balance', 'credited', 'debited'):
+            statement[key] = float(statement[key])
+        statement['transactions'] = [t.to_dict() for t in statement['transactions']]
+        
+        return jsonify({'statement': statement}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -200,15 +242,16 @@ def approve_withdrawal(withdrawal_id):
         withdrawal.approved_by = admin_id
         withdrawal.approved_at = datetime.utcnow()
         
-        # Deduct from wallet
+        # Deduct from wallet, committed together with the status change
         WalletService.deduct_funds(
             withdrawal.agent.user_id,
-            float(withdrawal.net_amount),
+            withdrawal.net_amount,
             balance_type='commission',
             description=f"Withdrawal approved: {withdrawal.id}",
             reference_type='withdrawal',
             reference_id=withdrawal.id,
-            created_by=admin_id
+            created_by=admin_id,
+            commit=False
         )
         
         db.session.commit()
@@ -0,0 +1,129 @@
+"""
+Admin dashboard statistics
+
+The dashboard is every admin's landing page, so its numbers come from two
+short-lived snapshots (src.utils.snapshot_cache) instead of a dozen queries
+per page load:
+- platform: payment and challenge figures (not hierarchy scoped), one
+  conditional-aggregate statement plus the latest payments, shared by all
+  admins
+- users: user counts for the caller's hierarchy scope, one
+  conditional-aggregate statement plus the latest users, keyed by role
+  and tree_path
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, true
+from src.database import db
+from src.models.user import User
+from src.models.trading_program import Challenge
+from src.models.payment import Payment
+from src.utils.hierarchy_scoping import hierarchy_filter, hierarchy_scope_key
+from src.utils.snapshot_cache import get_snapshot
+
+CHALLENGE_STATUSES = ('active', 'completed', 'failed', 'funded')
+RECENT_LIMIT = 5
+
+
+class AdminDashboardService:
+    """Service for the admin dashboard statistics"""
+
+    @staticmethod
+    def get_stats():
+        """
+        Dashboard statistics for the current request's hierarchy scope
+
+        Returns:
+            dict: users, revenue, challenges, recent_users, recent_payments
+        """
+        ttl = current_app.config.get('ADMIN_DASHBOARD_CACHE_TTL', 5)
+        platform = get_snapshot('admin-dashboard:platform', AdminDashboardService._platform_stats, ttl)
+        users = get_snapshot(
+            f'admin-dashboard:users:{hierarchy_scope_key()}',
+            AdminDashboardService._user_stats,
+            ttl
+        )
+
+        counts = users['counts']
+        total_revenue = platform['revenue']['total']
+        return {
+            'users': counts,
+            'revenue': {
+                **platform['revenue'],
+                'average_per_user': total_revenue / counts['total'] if counts['total'] > 0 else 0
+            },
+            'challenges': platform['challenges'],
+            'recent_users': users['recent_users'],
+            'recent_payments': platform['recent_payments']
+        }
+
+    @staticmethod
+    def _user_stats():
+        """User counts and latest users within the hierarchy scope"""
+        scope = hierarchy_filter(db.session, User)
+        statement = select(
+            func.count().label('total'),
+            func.count().filter(User.is_active.is_(True)).label('active'),
+            func.count().filter(User.kyc_status == 'pending').label('pending_kyc'),
+            func.count().filter(User.is_active.is_(False)).label('suspended')
+        ).select_from(User)
+        if scope is not None:
+            statement = statement.where(scope)
+        counts = db.session.execute(statement, execution_options={'skip_hierarchy_scope': True}).one()
+
+        # Hierarchy-scoped by the query hook
+        recent_users = User.query.order_by(User.created_at.desc()).limit(RECENT_LIMIT).all()
+
+        return {
+            'counts': dict(counts._mapping),
+            'recent_users': [{
+                'id': user.id,
+                'name': f"{user.first_name} {user.last_name}",
+                'email': user.email,
+                'role': user.role,
+                'status': 'active' if user.is_active else 'inactive',
+                'created_at': user.created_at.isoformat()
+            } for user in recent_users]
+        }
+
+    @staticmethod
+    def _platform_stats():
+        """Revenue and challenge counts in one statement, plus the latest payments"""
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        completed = Payment.status == 'completed'
+
+        revenue = select(
+            func.coalesce(func.sum(Payment.amount).filter(completed), 0).label('revenue_total'),
+            func.coalesce(
+                func.sum(Payment.amount).filter(completed, Payment.created_at >= thirty_days_ago), 0
+            ).label('revenue_monthly')
+        ).subquery()
+        challenges = select(
+            func.count().label('challenges_total'),
+            *(func.count().filter(Challenge.status == status).label(status) for status in CHALLENGE_STATUSES)
+        ).select_from(Challenge).subquery()
+
+        row = db.session.execute(
+            select(revenue, challenges).select_from(revenue.join(challenges, true()))
+        ).one()
+
+        recent_payments = Payment.query.order_by(Payment.created_at.desc()).limit(RECENT_LIMIT).all()
+
+        return {
+            'revenue': {
+                'total': float(row.revenue_total),
+                'monthly': float(row.revenue_monthly)
+            },
+            'challenges': {
+                'total': row.challenges_total,
+                **{status: getattr(row, status) for status in CHALLENGE_STATUSES}
+            },
+            'recent_payments': [{
+                'id': payment.id,
+                'user_id': payment.user_id,
+                'amount': float(payment.amount),
+                'type': payment.purpose,
+                'status': payment.status,
+                'created_at': payment.created_at.isoformat()
+            } for payment in recent_payments]
+        }
@@ -2,7 +2,7 @@
 Analytics Service
 Provides advanced analytics and reporting functionality
 """
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from sqlalchemy import func, and_, extract, case
 from src.database import db
 from src.models.user import User
@@ -11,6 +11,14 @@ from src.models.payment import Payment
 from src.models.commission import Commission
 from src.models.referral import Referral
 from src.models.agent import Agent
+from src.models.analytics_rollup import (
+    DailyPaymentRollup,
+    DailyRegistrationRollup,
+    DailyChallengeRollup,
+    DailyKYCRollup
+)
+from src.services.analytics_rollup_service import AnalyticsRollupService
+from src.utils.hierarchy_scoping import is_hierarchy_scope_active
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,81 +28,169 @@ class AnalyticsService:
     """Service for analytics and reporting"""
     
     @staticmethod
-    def get_revenue_over_time(days=30):
+    def _rollup_window(days):
+        """
+        Split a lookback window into a materialized part and a live part
+        
+        Args:
+            days: Number of days to look back
+            
+        Returns:
+            (start_day, cutoff, live_start): rollups cover [start_day, cutoff),
+            raw tables cover everything from live_start onwards. cutoff is None
+            when the rollups can't serve this request.
+        """
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+        
+        # Rollups are per-tenant, not per-downline, so hierarchy-scoped
+        # callers keep reading the (filtered) raw tables
+        cutoff = None
+        if not is_hierarchy_scope_active():
+            cutoff = AnalyticsRollupService.get_cutoff()
+            if cutoff is not None and cutoff <= start_day:
+                cutoff = None
+        
+        live_start = datetime.combine(cutoff or start_day, time.min)
+        return start_day, cutoff, live_start
+    
+    @staticmethod
+    def _filter_rollup(query, model, start_day, cutoff, tenant_id):
+        """Restrict a rollup query to [start_day, cutoff) and optionally one tenant"""
+        query = query.filter(model.day >= start_day, model.day < cutoff)
+        if tenant_id:
+            query = query.filter(model.tenant_id == tenant_id)
+        return query
+    
+    @staticmethod
+    def _filter_raw_tenant(query, model, tenant_id):
+        """Restrict a raw-table query to one tenant via the owning user"""
+        if not tenant_id:
+            return query
+        if model is User:
+            return query.filter(User.tenant_id == tenant_id)
+        return query.join(User, model.user_id == User.id).filter(User.tenant_id == tenant_id)
+    
+    @staticmethod
+    def get_revenue_over_time(days=30, tenant_id=None):
         """
         Get revenue data over time
         
         Args:
             days: Number of days to look back
+            tenant_id: Optional tenant to restrict to
             
         Returns:
             List of daily revenue data
         """
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Query daily revenue
-            daily_revenue = db.session.query(
-                func.date(Payment.created_at).label('date'),
-                func.sum(Payment.amount).label('revenue'),
-                func.count(Payment.id).label('transactions')
-            ).filter(
-                and_(
-                    Payment.status == 'completed',
-                    Payment.created_at >= start_date
-                )
+            start_day, cutoff, live_start = AnalyticsService._rollup_window(days)
+            result = []
+            
+            if cutoff:
+                rolled = AnalyticsService._filter_rollup(
+                    db.session.query(
+                        DailyPaymentRollup.day.label('date'),
+                        func.sum(DailyPaymentRollup.total_amount).label('revenue'),
+                        func.sum(DailyPaymentRollup.payment_count).label('transactions')
+                    ).filter(DailyPaymentRollup.status == 'completed'),
+                    DailyPaymentRollup, start_day, cutoff, tenant_id
+                ).group_by(
+                    DailyPaymentRollup.day
+                ).order_by(
+                    DailyPaymentRollup.day
+                ).all()
+                result.extend({
+                    'date': str(row.date),
+                    'revenue': float(row.revenue),
+                    'transactions': int(row.transactions)
+                } for row in rolled)
+            
+            # Query daily revenue for the live part of the window
+            daily_revenue = AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    func.date(Payment.created_at).label('date'),
+                    func.sum(Payment.amount).label('revenue'),
+                    func.count(Payment.id).label('transactions')
+                ).filter(
+                    and_(
+                        Payment.status == 'completed',
+                        Payment.created_at >= live_start
+                    )
+                ),
+                Payment, tenant_id
             ).group_by(
                 func.date(Payment.created_at)
             ).order_by(
                 func.date(Payment.created_at)
             ).all()
             
-            return [{
+            result.extend({
                 'date': str(row.date),
                 'revenue': float(row.revenue),
                 'transactions': row.transactions
-            } for row in daily_revenue]
+            } for row in daily_revenue)
+            
+            return result
             
         except Exception as e:
             logger.error(f'Error getting revenue over time: {str(e)}')
             return []
     
     @staticmethod
-    def get_user_growth(days=30):
+    def get_user_growth(days=30, tenant_id=None):
         """
         Get user registration growth over time
         
         Args:
             days: Number of days to look back
+            tenant_id: Optional tenant to restrict to
             
         Returns:
             List of daily user registration data
         """
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Query daily registrations
-            daily_users = db.session.query(
-                func.date(User.created_at).label('date'),
-                func.count(User.id).label('registrations'),
-                func.sum(case((User.is_active == True, 1), else_=0)).label('active')
-            ).filter(
-                User.created_at >= start_date
+            start_day, cutoff, live_start = AnalyticsService._rollup_window(days)
+            daily_users = []
+            
+            if cutoff:
+                daily_users.extend(AnalyticsService._filter_rollup(
+                    db.session.query(
+                        DailyRegistrationRollup.day.label('date'),
+                        func.sum(DailyRegistrationRollup.registrations).label('registrations'),
+                        func.sum(DailyRegistrationRollup.active).label('active')
+                    ),
+                    DailyRegistrationRollup, start_day, cutoff, tenant_id
+                ).group_by(
+                    DailyRegistrationRollup.day
+                ).order_by(
+                    DailyRegistrationRollup.day
+                ).all())
+            
+            # Query daily registrations for the live part of the window
+            daily_users.extend(AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    func.date(User.created_at).label('date'),
+                    func.count(User.id).label('registrations'),
+                    func.sum(case((User.is_active == True, 1), else_=0)).label('active')
+                ).filter(
+                    User.created_at >= live_start
+                ),
+                User, tenant_id
             ).group_by(
                 func.date(User.created_at)
             ).order_by(
                 func.date(User.created_at)
-            ).all()
+            ).all())
             
             # Calculate cumulative total
             cumulative = 0
             result = []
             for row in daily_users:
-                cumulative += row.registrations
+                cumulative += int(row.registrations)
                 result.append({
                     'date': str(row.date),
-                    'registrations': row.registrations,
-                    'active': row.active,
+                    'registrations': int(row.registrations),
+                    'active': int(row.active or 0),
                     'cumulative': cumulative
                 })
             
@@ -105,54 +201,67 @@ class AnalyticsService:
             return []
     
     @staticmethod
-    def get_challenge_statistics(days=30):
+    def get_challenge_statistics(days=30, tenant_id=None):
         """
         Get challenge statistics over time
         
         Args:
             days: Number of days to look back
+            tenant_id: Optional tenant to restrict to
             
         Returns:
             Challenge statistics data
         """
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Query challenge status distribution
-            status_distribution = db.session.query(
-                Challenge.status,
-                func.count(Challenge.id).label('count')
-            ).filter(
-                Challenge.created_at >= start_date
-            ).group_by(
-                Challenge.status
-            ).all()
+            start_day, cutoff, live_start = AnalyticsService._rollup_window(days)
+            
+            # One row per (day, status) from both sources, folded in Python
+            rows = []
+            if cutoff:
+                rows.extend(AnalyticsService._filter_rollup(
+                    db.session.query(
+                        DailyChallengeRollup.day.label('date'),
+                        DailyChallengeRollup.status,
+                        func.sum(DailyChallengeRollup.challenge_count).label('count')
+                    ),
+                    DailyChallengeRollup, start_day, cutoff, tenant_id
+                ).group_by(
+                    DailyChallengeRollup.day, DailyChallengeRollup.status
+                ).all())
             
-            # Query daily challenge creation
-            daily_challenges = db.session.query(
-                func.date(Challenge.created_at).label('date'),
-                func.count(Challenge.id).label('created'),
-                func.sum(case((Challenge.status == 'completed', 1), else_=0)).label('completed'),
-                func.sum(case((Challenge.status == 'funded', 1), else_=0)).label('funded')
-            ).filter(
-                Challenge.created_at >= start_date
+            rows.extend(AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    func.date(Challenge.created_at).label('date'),
+                    Challenge.status,
+                    func.count(Challenge.id).label('count')
+                ).filter(
+                    Challenge.created_at >= live_start
+                ),
+                Challenge, tenant_id
             ).group_by(
-                func.date(Challenge.created_at)
-            ).order_by(
-                func.date(Challenge.created_at)
-            ).all()
+                func.date(Challenge.created_at), Challenge.status
+            ).all())
+            
+            status_counts = {}
+            daily = {}
+            for row in rows:
+                count = int(row.count)
+                status_counts[row.status] = status_counts.get(row.status, 0) + count
+                
+                day = daily.setdefault(str(row.date), {'created': 0, 'completed': 0, 'funded': 0})
+                day['created'] += count
+                if row.status in ('completed', 'funded'):
+                    day[row.status] += count
             
             return {
                 'status_distribution': [{
-                    'status': row.status,
-                    'count': row.count
-                } for row in status_distribution],
+                    'status': status,
+                    'count': count
+                } for status, count in status_counts.items()],
                 'daily_data': [{
-                    'date': str(row.date),
-                    'created': row.created,
-                    'completed': row.completed,
-                    'funded': row.funded
-                } for row in daily_challenges]
+                    'date': date,
+                    **counts
+                } for date, counts in sorted(daily.items())]
             }
             
         except Exception as e:
@@ -160,37 +269,60 @@ class AnalyticsService:
             return {'status_distribution': [], 'daily_data': []}
     
     @staticmethod
-    def get_kyc_statistics():
+    def get_kyc_statistics(tenant_id=None):
         """
         Get KYC verification statistics
         
+        Args:
+            tenant_id: Optional tenant to restrict to
+            
         Returns:
             KYC statistics data
         """
         try:
-            # Query KYC status distribution
-            kyc_distribution = db.session.query(
-                User.kyc_status,
-                func.count(User.id).label('count')
+            # Query KYC status distribution (current state, not time-bucketed)
+            kyc_distribution = AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    User.kyc_status,
+                    func.count(User.id).label('count')
+                ),
+                User, tenant_id
             ).group_by(
                 User.kyc_status
             ).all()
             
             # Query recent KYC submissions (last 30 days)
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            recent_kyc = db.session.query(
-                func.date(User.kyc_submitted_at).label('date'),
-                func.count(User.id).label('submissions')
-            ).filter(
-                and_(
-                    User.kyc_submitted_at.isnot(None),
-                    User.kyc_submitted_at >= thirty_days_ago
-                )
+            start_day, cutoff, live_start = AnalyticsService._rollup_window(30)
+            recent_kyc = []
+            if cutoff:
+                recent_kyc.extend(AnalyticsService._filter_rollup(
+                    db.session.query(
+                        DailyKYCRollup.day.label('date'),
+                        func.sum(DailyKYCRollup.submissions).label('submissions')
+                    ),
+                    DailyKYCRollup, start_day, cutoff, tenant_id
+                ).group_by(
+                    DailyKYCRollup.day
+                ).order_by(
+                    DailyKYCRollup.day
+                ).all())
+            
+            recent_kyc.extend(AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    func.date(User.kyc_submitted_at).label('date'),
+                    func.count(User.id).label('submissions')
+                ).filter(
+                    and_(
+                        User.kyc_submitted_at.isnot(None),
+                        User.kyc_submitted_at >= live_start
+                    )
+                ),
+                User, tenant_id
             ).group_by(
                 func.date(User.kyc_submitted_at)
             ).order_by(
                 func.date(User.kyc_submitted_at)
-            ).all()
+            ).all())
             
             return {
                 'distribution': [{
@@ -199,7 +331,7 @@ class AnalyticsService:
                 } for row in kyc_distribution],
                 'recent_submissions': [{
                     'date': str(row.date),
-                    'submissions': row.submissions
+                    'submissions': int(row.submissions)
                 } for row in recent_kyc]
             }
             
@@ -267,53 +399,71 @@ class AnalyticsService:
             }
     
     @staticmethod
-    def get_payment_statistics(days=30):
+    def get_payment_statistics(days=30, tenant_id=None):
         """
         Get payment method and status statistics
         
         Args:
             days: Number of days to look back
+            tenant_id: Optional tenant to restrict to
             
         Returns:
             Payment statistics data
         """
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Payment method distribution
-            method_distribution = db.session.query(
-                Payment.payment_method,
-                func.count(Payment.id).label('count'),
-                func.sum(Payment.amount).label('total_amount')
-            ).filter(
-                and_(
-                    Payment.created_at >= start_date,
-                    Payment.status == 'completed'
-                )
-            ).group_by(
-                Payment.payment_method
-            ).all()
+            start_day, cutoff, live_start = AnalyticsService._rollup_window(days)
+            
+            # One row per (status, method) from both sources, folded in Python
+            rows = []
+            if cutoff:
+                rows.extend(AnalyticsService._filter_rollup(
+                    db.session.query(
+                        DailyPaymentRollup.status,
+                        DailyPaymentRollup.payment_method,
+                        func.sum(DailyPaymentRollup.payment_count).label('count'),
+                        func.sum(DailyPaymentRollup.total_amount).label('total_amount')
+                    ),
+                    DailyPaymentRollup, start_day, cutoff, tenant_id
+                ).group_by(
+                    DailyPaymentRollup.status, DailyPaymentRollup.payment_method
+                ).all())
             
-            # Payment status distribution
-            status_distribution = db.session.query(
-                Payment.status,
-                func.count(Payment.id).label('count')
-            ).filter(
-                Payment.created_at >= start_date
+            rows.extend(AnalyticsService._filter_raw_tenant(
+                db.session.query(
+                    Payment.status,
+                    Payment.payment_method,
+                    func.count(Payment.id).label('count'),
+                    func.coalesce(func.sum(Payment.amount), 0).label('total_amount')
+                ).filter(
+                    Payment.created_at >= live_start
+                ),
+                Payment, tenant_id
             ).group_by(
-                Payment.status
-            ).all()
+                Payment.status, Payment.payment_method
+            ).all())
+            
+            methods = {}
+            statuses = {}
+            for row in rows:
+                count = int(row.count)
+                statuses[row.status] = statuses.get(row.status, 0) + count
+                
+                # Method mix only counts completed payments
+                if row.status == 'completed':
+                    method = methods.setdefault(row.payment_method or 'unknown', {'count': 0, 'total_amount': 0.0})
+                    method['count'] += count
+                    method['total_amount'] += float(row.total_amount or 0)
             
             return {
                 'method_distribution': [{
-                    'method': row.payment_method or 'unknown',
-                    'count': row.count,
-                    'total_amount': float(row.total_amount)
-                } for row in method_distribution],
+                    'method': method,
+                    'count': data['count'],
+                    'total_amount': data['total_amount']
+                } for method, data in methods.items()],
                 'status_distribution': [{
-                    'status': row.status,
-                    'count': row.count
-                } for row in status_distribution]
+                    'status': status,
+                    'count': count
+                } for status, count in statuses.items()]
             }
             
         except Exception as e:
@@ -321,24 +471,25 @@ class AnalyticsService:
             return {'method_distribution': [], 'status_distribution': []}
     
     @staticmethod
-    def get_comprehensive_analytics(days=30):
+    def get_comprehensive_analytics(days=30, tenant_id=None):
         """
         Get comprehensive analytics data for dashboard
         
         Args:
             days: Number of days to look back
+            tenant_id: Optional tenant to restrict the time series to
             
         Returns:
             Comprehensive analytics data
         """
         try:
             return {
-                'revenue_over_time': AnalyticsService.get_revenue_over_time(days),
-                'user_growth': AnalyticsService.get_user_growth(days),
-                'challenge_statistics': AnalyticsService.get_challenge_statistics(days),
-                'kyc_statistics': AnalyticsService.get_kyc_statistics(),
+                'revenue_over_time': AnalyticsService.get_revenue_over_time(days, tenant_id),
+                'user_growth': AnalyticsService.get_user_growth(days, tenant_id),
+                'challenge_statistics': AnalyticsService.get_challenge_statistics(days, tenant_id),
+                'kyc_statistics': AnalyticsService.get_kyc_statistics(tenant_id),
                 'referral_statistics': AnalyticsService.get_referral_statistics(),
-                'payment_statistics': AnalyticsService.get_payment_statistics(days)
+                'payment_statistics': AnalyticsService.get_payment_statistics(days, tenant_id)
             }
         except Exception as e:
             logger.error(f'Error getting comprehensive analytics: {str(e)}')
@@ -0,0 +1,237 @@
+"""
+Challenge Evaluation Service
+Evaluates challenges against their program rules from the trades table.
+
+Closed trades are streamed in close_time order and handed to the NumPy
+equity-curve evaluator (src/utils/equity_curve.py), so the stored balance
+totals on Challenge are outputs of an evaluation rather than inputs.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from multiprocessing import get_context
+from sqlalchemy import select, update
+from src.database import db
+from src.models.trade import Trade
+from src.models.trading_program import Challenge, TradingProgram
+from src.utils.equity_curve import evaluate_equity_curve, evaluate_job
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_TRADING_DAYS = 5
+TRADES_YIELD_PER = 5000
+CHALLENGES_PER_BATCH = 200
+
+_EMPTY_DAYS = np.array([], dtype='datetime64[D]')
+_EMPTY_PNL = np.array([], dtype=np.float64)
+
+
+class ChallengeEvaluationService:
+    """Service for evaluating challenges from their trade history"""
+
+    @staticmethod
+    def get_rules(program):
+        """Extract the evaluation rules from a TradingProgram (or a row with the same columns)"""
+        def as_float(value):
+            return float(value) if value is not None else None
+
+        return {
+            'profit_target': as_float(program.profit_target),
+            'max_daily_loss': as_float(program.max_daily_loss),
+            'max_total_loss': as_float(program.max_total_loss),
+            'min_trading_days': int((program.rules or {}).get('min_trading_days', DEFAULT_MIN_TRADING_DAYS))
+        }
+
+    @staticmethod
+    def evaluate_challenge(challenge, apply=True):
+        """
+        Evaluate a single challenge
+
+        Args:
+            challenge: Challenge object
+            apply: Persist balances/status changes (caller commits)
+
+        Returns:
+            Evaluation result dictionary
+        """
+        program = challenge.program
+        curves = ChallengeEvaluationService._load_curves([(challenge.id, challenge.start_date)])
+        close_days, pnl = curves.get(challenge.id, (_EMPTY_DAYS, _EMPTY_PNL))
+
+        result = evaluate_equity_curve(
+            challenge.initial_balance or 0,
+            close_days,
+            pnl,
+            ChallengeEvaluationService.get_rules(program)
+        )
+        result['challenge_id'] = challenge.id
+
+        if apply:
+            db.session.execute(update(Challenge), [
+                ChallengeEvaluationService._challenge_changes(
+                    result, challenge.initial_balance, challenge.current_phase, challenge.total_phases
+                )
+            ])
+            db.session.refresh(challenge)
+        return result
+
+    @staticmethod
+    def evaluate_active_challenges(workers=None, dry_run=False):
+        """
+        Evaluate every active challenge (batch job)
+
+        Trades are loaded per batch of challenges in the main process and the
+        NumPy evaluation runs in a process pool; workers never touch the DB.
+
+        Args:
+            workers: Pool size (None = CPU count, 1 = evaluate inline)
+            dry_run: Compute outcomes without writing
+
+        Returns:
+            Summary with counts per outcome
+        """
+        challenges = db.session.execute(
+            select(
+                Challenge.id,
+                Challenge.initial_balance,
+                Challenge.start_date,
+                Challenge.current_phase,
+                Challenge.total_phases,
+                TradingProgram.profit_target,
+                TradingProgram.max_daily_loss,
+                TradingProgram.max_total_loss,
+                TradingProgram.rules
+            ).join(
+                TradingProgram, Challenge.program_id == TradingProgram.id
+            ).where(
+                Challenge.status == 'active'
+            ).order_by(Challenge.id)
+        ).all()
+
+        summary = {'evaluated': 0, 'passed': 0, 'failed': 0, 'in_progress': 0, 'dry_run': dry_run}
+        executor = None
+        if workers != 1 and len(challenges) > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+
+        try:
+            for i in range(0, len(challenges), CHALLENGES_PER_BATCH):
+                batch = challenges[i:i + CHALLENGES_PER_BATCH]
+                curves = ChallengeEvaluationService._load_curves([(row.id, row.start_date) for row in batch])
+
+                jobs = []
+                for row in batch:
+                    close_days, pnl = curves.get(row.id, (_EMPTY_DAYS, _EMPTY_PNL))
+                    jobs.append((
+                        row.id,
+                        float(row.initial_balance or 0),
+                        close_days,
+                        pnl,
+                        ChallengeEvaluationService.get_rules(row)
+                    ))
+
+                if executor:
+                    results = list(executor.map(evaluate_job, jobs, chunksize=16))
+                else:
+                    results = [evaluate_job(job) for job in jobs]
+
+                for result in results:
+                    summary['evaluated'] += 1
+                    summary[result['outcome']] += 1
+
+                if not dry_run:
+                    rows = {row.id: row for row in batch}
+                    db.session.execute(update(Challenge), [
+                        ChallengeEvaluationService._challenge_changes(
+                            result,
+                            rows[result['challenge_id']].initial_balance,
+                            rows[result['challenge_id']].current_phase,
+                            rows[result['challenge_id']].total_phases
+                        )
+                        for result in results
+                    ])
+                    db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error evaluating challenges: {str(e)}')
+            raise
+        finally:
+            if executor:
+                executor.shutdown()
+
+        logger.info(
+            f"Evaluated {summary['evaluated']} active challenge(s): {summary['passed']} passed, "
+            f"{summary['failed']} failed, {summary['in_progress']} in progress"
+        )
+        return summary
+
+    @staticmethod
+    def _load_curves(challenges):
+        """
+        Stream closed trades for several challenges into NumPy arrays
+
+        Args:
+            challenges: List of (challenge_id, start_date); trades closed
+                before start_date (previous phases) are ignored
+
+        Returns:
+            {challenge_id: (close_days datetime64[D] array, net pnl float array)}
+        """
+        start_dates = dict(challenges)
+        query = select(
+            Trade.challenge_id,
+            Trade.close_time,
+            Trade.profit,
+            Trade.commission,
+            Trade.swap
+        ).where(
+            Trade.challenge_id.in_(start_dates),
+            Trade.close_time.isnot(None)
+        ).order_by(
+            Trade.challenge_id, Trade.close_time, Trade.id
+        ).execution_options(yield_per=TRADES_YIELD_PER)
+
+        columns = {}
+        for challenge_id, close_time, profit, commission, swap in db.session.execute(query):
+            start_date = start_dates[challenge_id]
+            if start_date and close_time < start_date:
+                continue
+            times, pnl = columns.setdefault(challenge_id, ([], []))
+            times.append(close_time)
+            pnl.append(float((profit or 0) + (commission or 0) + (swap or 0)))
+
+        return {
+            challenge_id: (
+                np.array(times, dtype='datetime64[us]').astype('datetime64[D]'),
+                np.array(pnl, dtype=np.float64)
+            )
+            for challenge_id, (times, pnl) in columns.items()
+        }
+
+    @staticmethod
+    def _challenge_changes(result, initial_balance, current_phase, total_phases):
+        """Map an evaluation result onto Challenge column values (bulk UPDATE by primary key)"""
+        now = datetime.utcnow()
+        changes = {
+            'id': result['challenge_id'],
+            'current_balance': Decimal(str(result['final_balance'])),
+            'total_profit': Decimal(str(result['gross_profit'])),
+            'total_loss': Decimal(str(result['gross_loss'])),
+            'max_drawdown': Decimal(str(result['max_drawdown']))
+        }
+
+        if result['outcome'] == 'failed':
+            changes.update(status='failed', end_date=now)
+        elif result['outcome'] == 'passed':
+            if (current_phase or 1) < (total_phases or 1):
+                # Next phase starts from a fresh balance; older trades are excluded by start_date
+                changes.update(
+                    current_phase=(current_phase or 1) + 1,
+                    start_date=now,
+                    current_balance=initial_balance
+                )
+            else:
+                changes.update(status='passed', passed_at=now, end_date=now)
+
+        return changes
@@ -3,14 +3,20 @@ Commission Service
 Handles automatic commission calculation and tracking
 """
 from src.database import db
-from src.models import Commission, Agent, Referral, Challenge, User
+from src.models import Commission, AgentCommissionSummary, Agent, Referral, Challenge, User
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import logging
 from src.services.notification_service import NotificationService
 
 logger = logging.getLogger(__name__)
 
+# IN-list / bulk insert size for calculate_commissions_batch
+BATCH_CHUNK_SIZE = 500
+CENT = Decimal('0.01')
+
 
 class CommissionService:
     """Service for managing commissions"""
@@ -90,6 +96,8 @@ class CommissionService:
             referral.total_purchases = (referral.total_purchases or 0) + 1
             referral.total_spent = (referral.total_spent or Decimal('0')) + Decimal(str(sale_amount))
             
+            CommissionService._update_summary(agent.id, commission_amount, 'pending')
+            
             db.session.commit()
             
             # Send notification to agent
@@ -110,6 +118,206 @@ class CommissionService:
             logger.error(f"Error creating commission: {str(e)}")
             return None
     
+    @staticmethod
+    def calculate_commissions_batch(items, dry_run=False, notify=True):
+        """
+        Calculate and create commissions for many purchased challenges at once
+        
+        Challenges, referrals, agents and existing commissions are resolved
+        with one IN query each per chunk; commissions are bulk inserted and
+        agent/referral statistics are applied as one aggregated UPDATE per
+        agent and per referral.
+        
+        Args:
+            items: Iterable of (challenge_id, sale_amount) pairs
+            dry_run: Compute and return the ledger without writing anything
+            notify: Queue one notification per created commission
+            
+        Returns:
+            Dictionary with the ledger and per-agent totals
+        """
+        pairs = []
+        seen = set()
+        ledger = []
+        for challenge_id, sale_amount in items:
+            if challenge_id in seen:
+                ledger.append({'challenge_id': challenge_id, 'status': 'skipped', 'reason': 'duplicate_in_batch'})
+                continue
+            seen.add(challenge_id)
+            pairs.append((challenge_id, Decimal(str(sale_amount))))
+        
+        agent_totals = {}
+        
+        try:
+            for i in range(0, len(pairs), BATCH_CHUNK_SIZE):
+                chunk_ledger = CommissionService._calculate_chunk(pairs[i:i + BATCH_CHUNK_SIZE])
+                ledger.extend(chunk_ledger)
+                
+                created = [entry for entry in chunk_ledger if entry['status'] == 'created']
+                for entry in created:
+                    totals = agent_totals.setdefault(entry['agent_id'], {
+                        'agent_id': entry['agent_id'],
+                        'commission_count': 0,
+                        'sale_amount': Decimal('0'),
+                        'commission_amount': Decimal('0')
+                    })
+                    totals['commission_count'] += 1
+                    totals['sale_amount'] += entry['sale_amount']
+                    totals['commission_amount'] += entry['commission_amount']
+                
+                if not dry_run and created:
+                    CommissionService._persist_chunk(created, notify)
+                    db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error creating commission batch: {str(e)}")
+            raise
+        
+        created_count = sum(1 for entry in ledger if entry['status'] == 'created')
+        logger.info(
+            f"Commission batch {'(dry run) ' if dry_run else ''}processed {len(ledger)} item(s): "
+            f"{created_count} created across {len(agent_totals)} agent(s)"
+        )
+        
+        def serialize(entry):
+            return {
+                key: float(value) if isinstance(value, Decimal) else value
+                for key, value in entry.items()
+            }
+        
+        return {
+            'dry_run': dry_run,
+            'processed': len(ledger),
+            'created': created_count,
+            'skipped': len(ledger) - created_count,
+            'total_commission_amount': float(sum(
+                (totals['commission_amount'] for totals in agent_totals.values()), Decimal('0')
+            )),
+            'agents': [serialize(totals) for totals in agent_totals.values()],
+            'ledger': [serialize(entry) for entry in ledger]
+        }
+    
+    @staticmethod
+    def _calculate_chunk(pairs):
+        """Resolve one chunk of (challenge_id, sale_amount) pairs into ledger entries"""
+        challenge_ids = [challenge_id for challenge_id, _ in pairs]
+        
+        challenges = dict(
+            db.session.query(Challenge.id, Challenge.user_id).filter(Challenge.id.in_(challenge_ids))
+        )
+        existing = {
+            row.challenge_id
+            for row in db.session.query(Commission.challenge_id).filter(Commission.challenge_id.in_(challenge_ids))
+        }
+        
+        # Lowest id wins when a user has more than one active referral
+        referrals = {}
+        for referral in db.session.query(Referral.id, Referral.referred_user_id, Referral.agent_id).filter(
+            Referral.referred_user_id.in_(set(challenges.values())),
+            Referral.status == 'active'
+        ).order_by(Referral.id.desc()):
+            referrals[referral.referred_user_id] = referral
+        
+        agents = {
+            agent.id: agent
+            for agent in db.session.query(Agent.id, Agent.user_id, Agent.commission_rate, Agent.is_active).filter(
+                Agent.id.in_({referral.agent_id for referral in referrals.values()})
+            )
+        }
+        
+        ledger = []
+        for challenge_id, sale_amount in pairs:
+            entry = {'challenge_id': challenge_id, 'sale_amount': sale_amount}
+            user_id = challenges.get(challenge_id)
+            referral = referrals.get(user_id)
+            agent = agents.get(referral.agent_id) if referral else None
+            
+            if user_id is None:
+                entry.update(status='skipped', reason='challenge_not_found')
+            elif challenge_id in existing:
+                entry.update(status='skipped', reason='already_exists')
+            elif referral is None:
+                entry.update(status='skipped', reason='no_active_referral')
+            elif agent is None or not agent.is_active:
+                entry.update(status='skipped', reason='agent_inactive')
+            else:
+                entry.update(
+                    status='created',
+                    agent_id=agent.id,
+                    agent_user_id=agent.user_id,
+                    referral_id=referral.id,
+                    commission_rate=agent.commission_rate,
+                    commission_amount=((sale_amount * agent.commission_rate) / Decimal('100')).quantize(
+                        CENT, rounding=ROUND_HALF_UP
+                    )
+                )
+            ledger.append(entry)
+        
+        return ledger
+    
+    @staticmethod
+    def _persist_chunk(created, notify):
+        """Write the created ledger entries of one chunk in the current transaction"""
+        inserted = db.session.execute(insert(Commission).returning(Commission.challenge_id, Commission.id), [
+            {
+                'agent_id': entry['agent_id'],
+                'referral_id': entry['referral_id'],
+                'challenge_id': entry['challenge_id'],
+                'sale_amount': entry['sale_amount'],
+                'commission_rate': entry['commission_rate'],
+                'commission_amount': entry['commission_amount'],
+                'status': 'pending'
+            }
+            for entry in created
+        ])
+        commission_ids = dict(inserted.all())
+        for entry in created:
+            entry['commission_id'] = commission_ids.get(entry['challenge_id'])
+        
+        agent_deltas = {}
+        referral_deltas = {}
+        for entry in created:
+            count, sales, amount = agent_deltas.get(entry['agent_id'], (0, Decimal('0'), Decimal('0')))
+            agent_deltas[entry['agent_id']] = (count + 1, sales + entry['sale_amount'], amount + entry['commission_amount'])
+            purchases, spent = referral_deltas.get(entry['referral_id'], (0, Decimal('0')))
+            referral_deltas[entry['referral_id']] = (purchases + 1, spent + entry['sale_amount'])
+        
+        for agent_id, (count, sales, amount) in agent_deltas.items():
+            db.session.execute(
+                update(Agent).where(Agent.id == agent_id).values(
+                    total_sales=func.coalesce(Agent.total_sales, 0) + sales,
+                    pending_balance=func.coalesce(Agent.pending_balance, 0) + amount
+                ),
+                execution_options={'synchronize_session': False}
+            )
+            CommissionService._update_summary(agent_id, amount, 'pending', count=count)
+        
+        for referral_id, (purchases, spent) in referral_deltas.items():
+            db.session.execute(
+                update(Referral).where(Referral.id == referral_id).values(
+                    total_purchases=func.coalesce(Referral.total_purchases, 0) + purchases,
+                    total_spent=func.coalesce(Referral.total_spent, 0) + spent
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        
+        if notify:
+            NotificationService.create_notifications_bulk([
+                {
+                    'user_id': entry['agent_user_id'],
+                    'notification_type': 'commission',
+                    'title': 'New Commission Earned',
+                    'message': f"You earned ${entry['commission_amount']} commission from a sale of ${entry['sale_amount']}.",
+                    'data': {
+                        'commission_id': entry['commission_id'],
+                        'amount': float(entry['commission_amount']),
+                        'sale_amount': float(entry['sale_amount'])
+                    },
+                    'priority': 'normal'
+                }
+                for entry in created
+            ])
+    
     @staticmethod
     def approve_commission(commission_id, approved_by_id):
         """
@@ -134,6 +342,8 @@ class CommissionService:
             commission.status = 'approved'
             commission.approved_at = datetime.utcnow()
             
+            CommissionService._update_summary(commission.agent_id, commission.commission_amount, 'approved', 'pending')
+            
             db.session.commit()
             
             # Send notification to agent
@@ -195,6 +405,8 @@ class CommissionService:
             agent.total_earned = (agent.total_earned or Decimal('0')) + commission.commission_amount
             agent.total_withdrawn = (agent.total_withdrawn or Decimal('0')) + commission.commission_amount
             
+            CommissionService._update_summary(agent.id, commission.commission_amount, 'paid', 'approved')
+            
             db.session.commit()
             
             # Send notification to agent
@@ -246,6 +458,9 @@ class CommissionService:
         """
         Get commission statistics for an agent
         
+        Served from AgentCommissionSummary; agents without a summary row yet
+        fall back to a single grouped query over their commissions.
+        
         Args:
             agent_id: ID of the agent
             
@@ -253,72 +468,173 @@ class CommissionService:
             Dictionary with statistics
         """
         try:
-            agent = Agent.query.get(agent_id)
+            agent = db.session.get(Agent, agent_id)
             if not agent:
                 return None
             
-            # Get commission counts by status
-            pending_count = Commission.query.filter_by(
-                agent_id=agent_id,
-                status='pending'
-            ).count()
-            
-            approved_count = Commission.query.filter_by(
-                agent_id=agent_id,
-                status='approved'
-            ).count()
-            
-            paid_count = Commission.query.filter_by(
-                agent_id=agent_id,
-                status='paid'
-            ).count()
-            
-            # Get total amounts
-            pending_amount = db.session.query(
-                db.func.sum(Commission.commission_amount)
-            ).filter(
-                Commission.agent_id == agent_id,
-                Commission.status == 'pending'
-            ).scalar() or Decimal('0')
-            
-            approved_amount = db.session.query(
-                db.func.sum(Commission.commission_amount)
-            ).filter(
-                Commission.agent_id == agent_id,
-                Commission.status == 'approved'
-            ).scalar() or Decimal('0')
-            
-            paid_amount = db.session.query(
-                db.func.sum(Commission.commission_amount)
-            ).filter(
-                Commission.agent_id == agent_id,
-                Commission.status == 'paid'
-            ).scalar() or Decimal('0')
+            summary = db.session.get(AgentCommissionSummary, agent_id)
+            if summary:
+                totals = {
+                    status: (getattr(summary, f'{status}_count'), getattr(summary, f'{status}_amount'))
+                    for status in AgentCommissionSummary.STATUSES
+                }
+            else:
+                totals = CommissionService._aggregate_by_status(agent_id).get(agent_id, {})
             
-            return {
+            stats = {
                 'agent_id': agent_id,
                 'commission_rate': float(agent.commission_rate),
                 'pending_balance': float(agent.pending_balance),
                 'total_earned': float(agent.total_earned),
                 'total_withdrawn': float(agent.total_withdrawn),
                 'total_sales': float(agent.total_sales),
-                'pending': {
-                    'count': pending_count,
-                    'amount': float(pending_amount)
-                },
-                'approved': {
-                    'count': approved_count,
-                    'amount': float(approved_amount)
-                },
-                'paid': {
-                    'count': paid_count,
-                    'amount': float(paid_amount)
-                },
-                'total_commissions': pending_count + approved_count + paid_count,
-                'total_commission_amount': float(pending_amount + approved_amount + paid_amount)
+                'total_commissions': 0
             }
+            total_amount = Decimal('0')
+            for status in AgentCommissionSummary.STATUSES:
+                count, amount = totals.get(status, (0, Decimal('0')))
+                stats[status] = {
+                    'count': count,
+                    'amount': float(amount)
+                }
+                stats['total_commissions'] += count
+                total_amount += amount
+            stats['total_commission_amount'] = float(total_amount)
+            
+            return stats
             
         except Exception as e:
             logger.error(f"Error getting commission stats: {str(e)}")
             return None
-
+    
+    @staticmethod
+    def reconcile_commission_summaries(fix=False):
+        """
+        Recompute every agent's summary from the commissions table and report drift
+        
+        Besides the summary itself, the denormalized Agent balances are checked
+        against the same totals: pending_balance should equal pending + approved
+        amounts and total_earned the paid amount.
+        
+        Args:
+            fix: Rewrite drifted summaries (Agent balances are only reported)
+            
+        Returns:
+            Dictionary with the drift found
+        """
+        totals = CommissionService._aggregate_by_status()
+        summaries = {summary.agent_id: summary for summary in AgentCommissionSummary.query}
+        agents = db.session.query(Agent.id, Agent.pending_balance, Agent.total_earned).all()
+        
+        summary_drift = []
+        balance_drift = []
+        
+        for agent in agents:
+            expected = {
+                status: totals.get(agent.id, {}).get(status, (0, Decimal('0')))
+                for status in AgentCommissionSummary.STATUSES
+            }
+            
+            summary = summaries.get(agent.id)
+            actual = {
+                status: (
+                    getattr(summary, f'{status}_count'),
+                    getattr(summary, f'{status}_amount')
+                ) if summary else (0, Decimal('0'))
+                for status in AgentCommissionSummary.STATUSES
+            }
+            if summary is None or actual != expected:
+                summary_drift.append({
+                    'agent_id': agent.id,
+                    'missing': summary is None,
+                    'expected': {status: {'count': c, 'amount': float(a)} for status, (c, a) in expected.items()},
+                    'actual': {status: {'count': c, 'amount': float(a)} for status, (c, a) in actual.items()}
+                })
+                if fix:
+                    CommissionService._store_summary(agent.id, expected)
+            
+            expected_pending = expected['pending'][1] + expected['approved'][1]
+            expected_earned = expected['paid'][1]
+            if (agent.pending_balance or 0) != expected_pending or (agent.total_earned or 0) != expected_earned:
+                balance_drift.append({
+                    'agent_id': agent.id,
+                    'pending_balance': float(agent.pending_balance or 0),
+                    'expected_pending_balance': float(expected_pending),
+                    'total_earned': float(agent.total_earned or 0),
+                    'expected_total_earned': float(expected_earned)
+                })
+        
+        if fix:
+            db.session.commit()
+        
+        logger.info(
+            f"Commission summaries reconciled: {len(agents)} agent(s), "
+            f"{len(summary_drift)} summary drift, {len(balance_drift)} balance drift"
+        )
+        
+        return {
+            'agents_checked': len(agents),
+            'summary_drift': summary_drift,
+            'balance_drift': balance_drift,
+            'fixed': len(summary_drift) if fix else 0
+        }
+    
+    @staticmethod
+    def _aggregate_by_status(agent_id=None):
+        """
+        Count and sum commissions per agent and status in one grouped query
+        
+        Returns:
+            {agent_id: {status: (count, amount)}}
+        """
+        query = db.session.query(
+            Commission.agent_id,
+            Commission.status,
+            func.count(Commission.id),
+            func.coalesce(func.sum(Commission.commission_amount), 0)
+        )
+        if agent_id is not None:
+            query = query.filter(Commission.agent_id == agent_id)
+        
+        totals = {}
+        for row_agent_id, status, count, amount in query.group_by(Commission.agent_id, Commission.status):
+            totals.setdefault(row_agent_id, {})[status] = (count, Decimal(str(amount)))
+        return totals
+    
+    @staticmethod
+    def _store_summary(agent_id, totals):
+        """Write a full summary row (insert or overwrite) in the current transaction"""
+        values = {}
+        for status in AgentCommissionSummary.STATUSES:
+            count, amount = totals.get(status, (0, Decimal('0')))
+            values[f'{status}_count'] = count
+            values[f'{status}_amount'] = amount
+        db.session.merge(AgentCommissionSummary(agent_id=agent_id, **values))
+    
+    @staticmethod
+    def _update_summary(agent_id, amount, to_status, from_status=None, count=1):
+        """
+        Move commissions into to_status (and out of from_status) in the agent's summary
+        
+        Runs in the caller's transaction as an atomic in-place UPDATE. An
+        agent created after the backfill has no summary row until its first
+        commission: the row is inserted with zero totals (ON CONFLICT DO
+        NOTHING, so concurrent first commissions wait for each other instead
+        of failing) and the UPDATE is applied to it.
+        """
+        summary = AgentCommissionSummary
+        values = {
+            f'{to_status}_count': getattr(summary, f'{to_status}_count') + count,
+            f'{to_status}_amount': getattr(summary, f'{to_status}_amount') + amount
+        }
+        if from_status:
+            values[f'{from_status}_count'] = getattr(summary, f'{from_status}_count') - count
+            values[f'{from_status}_amount'] = getattr(summary, f'{from_status}_amount') - amount
+        
+        statement = update(summary).where(summary.agent_id == agent_id).values(values)
+        result = db.session.execute(statement, execution_options={'synchronize_session': False})
+        if result.rowcount == 0:
+            db.session.execute(
+                pg_insert(summary).values(agent_id=agent_id).on_conflict_do_nothing(index_elements=['agent_id'])
+            )
+            db.session.execute(statement, execution_options={'synchronize_session': False})
@@ -0,0 +1,314 @@
+"""
+Email Delivery Worker
+Drains EmailQueue outside the web process.
+
+Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased
+(status 'sending', next_attempt_at = lease expiry), so any number of
+workers can run side by side without double-sending and rows held by a
+crashed worker become claimable again once the lease runs out. Claimed
+emails are sent concurrently on a bounded thread pool through a pluggable
+transport; failures are retried with exponential backoff until
+attempts reaches max_attempts.
+
+Run with:
+    flask email deliver
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, or_
+from src.database import db
+from src.models.notification import EmailQueue
+import logging
+import random
+import smtplib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    """Delivery failure; retryable=False marks permanent rejections"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SendGridTransport:
+    """SendGrid v3 mail/send over a pooled HTTP session"""
+
+    def __init__(self, app, pool_size):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = app.config.get('SENDGRID_API_KEY')
+        if not self.api_key:
+            raise ValueError('SendGrid API key not configured')
+        self.url = app.config.get('EMAIL_SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Authorization': f'Bearer {self.api_key}'})
+
+    def send(self, to_email, subject, html_content, from_email):
+        import requests
+
+        payload = {
+            'personalizations': [{'to': [{'email': to_email}]}],
+            'from': {'email': from_email},
+            'subject': subject,
+            'content': [{'type': 'text/html', 'value': html_content}]
+        }
+        try:
+            response = self.session.post(self.url, json=payload, timeout=(5, 30))
+        except requests.RequestException as e:
+            raise TransportError(str(e))
+
+        if response.status_code >= 300:
+            # Throttling and server errors are worth retrying, other 4xx are not
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise TransportError(f'SendGrid {response.status_code}: {response.text[:200]}', retryable=retryable)
+
+    def close(self):
+        self.session.close()
+
+
+class SmtpTransport:
+    """Plain SMTP, one connection per sending thread (e.g. a local sink for load tests)"""
+
+    def __init__(self, app, pool_size):
+        self.host = app.config.get('EMAIL_SMTP_HOST', 'localhost')
+        self.port = app.config.get('EMAIL_SMTP_PORT', 1025)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def send(self, to_email, subject, html_content, from_email):
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['From'] = from_email
+        message['To'] = to_email
+        message['Subject'] = subject
+        message.set_content(html_content, subtype='html')
+
+        try:
+            self._connection().send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise TransportError(str(e), retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            # Reconnect on the next send
+            self._local.connection = None
+            raise TransportError(str(e))
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=30)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.quit()
+            except Exception:
+                pass
+
+
+# EMAIL_TRANSPORT -> transport class; any class with send()/close() can be passed to the worker
+TRANSPORTS = {
+    'sendgrid': SendGridTransport,
+    'smtp': SmtpTransport,
+}
+
+
+class DeliveryMetrics:
+    """Throughput counters for one worker"""
+
+    COUNTERS = ('batches', 'claimed', 'sent', 'retried', 'failed')
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.send_seconds = 0.0
+        self._lock = threading.Lock()
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+
+    def add_send_time(self, seconds):
+        # Called from the sending threads
+        with self._lock:
+            self.send_seconds += seconds
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        values = {name: getattr(self, name) for name in self.COUNTERS}
+        values.update(
+            elapsed_seconds=round(elapsed, 2),
+            emails_per_second=round(self.sent / elapsed, 2) if elapsed else 0.0,
+            avg_send_ms=round(self.send_seconds / self.claimed * 1000, 1) if self.claimed else 0.0
+        )
+        return values
+
+
+class EmailDeliveryWorker:
+    """Claims queued emails and delivers them concurrently"""
+
+    def __init__(self, app, transport=None, batch_size=None, concurrency=None):
+        """
+        Args:
+            app: Flask app (config and app context for DB access)
+            transport: TRANSPORTS name, or any object with
+                send(to_email, subject, html, from_email) and close();
+                defaults to EMAIL_TRANSPORT from config
+            batch_size: Emails claimed per batch (EMAIL_WORKER_BATCH_SIZE)
+            concurrency: Sending threads (EMAIL_WORKER_CONCURRENCY)
+        """
+        config = app.config
+        self.app = app
+        self.batch_size = batch_size or config.get('EMAIL_WORKER_BATCH_SIZE', 100)
+        self.concurrency = concurrency or config.get('EMAIL_WORKER_CONCURRENCY', 8)
+        self.lease_seconds = config.get('EMAIL_CLAIM_LEASE_SECONDS', 300)
+        self.retry_base_seconds = config.get('EMAIL_RETRY_BASE_SECONDS', 30)
+        self.retry_max_seconds = config.get('EMAIL_RETRY_MAX_SECONDS', 3600)
+        self.from_email = config.get('SENDGRID_FROM_EMAIL', 'noreply@marketedgepros.com')
+
+        if transport is None or isinstance(transport, str):
+            name = transport or config.get('EMAIL_TRANSPORT', 'sendgrid')
+            if name not in TRANSPORTS:
+                raise ValueError(f'Unknown email transport: {name}')
+            transport = TRANSPORTS[name](app, self.concurrency)
+        self.transport = transport
+        self.metrics = DeliveryMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='email-send')
+
+    def run(self, once=False, poll_interval=None):
+        """
+        Deliver until stopped (or until the queue is empty when once=True)
+
+        Returns:
+            Metrics snapshot
+        """
+        poll_interval = poll_interval or self.app.config.get('EMAIL_WORKER_POLL_SECONDS', 5)
+        try:
+            with self.app.app_context():
+                while True:
+                    delivered = self.run_batch()
+                    if not delivered:
+                        if once:
+                            break
+                        time.sleep(poll_interval)
+        finally:
+            self.close()
+
+        snapshot = self.metrics.snapshot()
+        logger.info(f'Email delivery stopped: {snapshot}')
+        return snapshot
+
+    def run_batch(self):
+        """Claim, send and record one batch; returns the number of emails claimed"""
+        emails = self.claim_batch()
+        if not emails:
+            return 0
+
+        started = time.monotonic()
+        outcomes = list(self._executor.map(self._send, emails))
+        self.record_outcomes(emails, outcomes)
+
+        self.metrics.batches += 1
+        logger.info(
+            f'Email batch: {len(emails)} claimed in {time.monotonic() - started:.2f}s; '
+            f'totals {self.metrics.snapshot()}'
+        )
+        return len(emails)
+
+    def claim_batch(self):
+        """
+        Lease up to batch_size due emails to this worker
+
+        Returns:
+            List of claimed rows (id, to_email, subject, html_body, body, attempts, max_attempts)
+        """
+        now = datetime.utcnow()
+        ids = db.session.execute(
+            select(EmailQueue.id).where(
+                EmailQueue.status.in_(('pending', 'sending')),
+                or_(EmailQueue.next_attempt_at.is_(None), EmailQueue.next_attempt_at <= now)
+            ).order_by(EmailQueue.id).limit(self.batch_size).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            db.session.commit()
+            return []
+
+        emails = db.session.execute(
+            update(EmailQueue).where(EmailQueue.id.in_(ids)).values(
+                status='sending',
+                attempts=EmailQueue.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds),
+                updated_at=now
+            ).returning(
+                EmailQueue.id, EmailQueue.to_email, EmailQueue.subject, EmailQueue.html_body,
+                EmailQueue.body, EmailQueue.attempts, EmailQueue.max_attempts
+            )
+        ).all()
+        db.session.commit()
+
+        self.metrics.claimed += len(emails)
+        return emails
+
+    def record_outcomes(self, emails, outcomes):
+        """Write sent / retry / failed states for a batch in one transaction"""
+        now = datetime.utcnow()
+        changes = []
+        for email, error in zip(emails, outcomes):
+            if error is None:
+                self.metrics.sent += 1
+                changes.append({
+                    'id': email.id, 'status': 'sent', 'sent_at': now,
+                    'next_attempt_at': None, 'error_message': None, 'updated_at': now
+                })
+            elif error.retryable and email.attempts < (email.max_attempts or 0):
+                self.metrics.retried += 1
+                changes.append({
+                    'id': email.id, 'status': 'pending', 'error_message': str(error),
+                    'next_attempt_at': now + timedelta(seconds=self.retry_delay(email.attempts)),
+                    'updated_at': now
+                })
+            else:
+                self.metrics.failed += 1
+                changes.append({
+                    'id': email.id, 'status': 'failed', 'error_message': str(error),
+                    'next_attempt_at': None, 'updated_at': now
+                })
+
+        # Bulk UPDATE by primary key, grouped by the set of keys present
+        db.session.execute(update(EmailQueue), changes)
+        db.session.commit()
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with jitter: base * 2^(attempts-1), capped"""
+        delay = min(self.retry_base_seconds * 2 ** max(attempts - 1, 0), self.retry_max_seconds)
+        return delay * random.uniform(0.8, 1.2)
+
+    def close(self):
+        self._executor.shutdown()
+        self.transport.close()
+
+    def _send(self, email):
+        # Runs on the sending pool: no DB access here
+        started = time.monotonic()
+        try:
+            self.transport.send(email.to_email, email.subject, email.html_body or email.body, self.from_email)
+            return None
+        except TransportError as e:
+            logger.warning(f'Email {email.id} to {email.to_email} failed: {e}')
+            return e
+        except Exception as e:
+            logger.error(f'Email {email.id} to {email.to_email} failed: {str(e)}')
+            return TransportError(str(e))
+        finally:
+            self.metrics.add_send_time(time.monotonic() - started)
@@ -0,0 +1,208 @@
+"""
+Email template engine
+Compiled, cached Jinja templates for all outgoing email.
+
+Templates live in src/templates/email and are compiled once per process
+(warm_email_templates runs in the app factory). The parts of a message
+that only depend on theme and branding (style block, logo, footer) are
+rendered once per (theme, branding) and memoized, and render_email_batch
+renders a template once and personalizes it per recipient by filling in
+the recipient's fields, for bulk sends.
+
+Branding defaults to MarketEdgePros; recipients of other tenants get
+that tenant's name, logo, colors and domain as an overlay.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+from markupsafe import Markup, escape
+from src.database import db
+from src.models.tenant import Tenant
+from src.utils.tenant_cache import get_tenant_snapshot
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')
+
+# Header gradient start/end and accent (buttons, code and amount boxes)
+ThemeColors = namedtuple('ThemeColors', ('start', 'end', 'accent'))
+THEMES = {
+    'brand': ThemeColors('#667eea', '#764ba2', '#667eea'),
+    'alert': ThemeColors('#f093fb', '#f5576c', '#f5576c'),
+    'success': ThemeColors('#11998e', '#38ef7d', '#11998e'),
+}
+
+# colors=None keeps the per-email theme; tenants override it with their own
+Branding = namedtuple('Branding', ('name', 'logo_url', 'site_url', 'colors'))
+DEFAULT_BRANDING = Branding('MarketEdgePros', None, 'https://marketedgepros.com', None)
+
+PRIORITY_COLORS = {
+    'low': '#6B7280',
+    'normal': '#3B82F6',
+    'high': '#F59E0B',
+    'urgent': '#EF4444'
+}
+NotificationAction = namedtuple('NotificationAction', ('path', 'label'))
+NOTIFICATION_ACTIONS = {
+    'withdrawal': NotificationAction('/trader/withdrawals', 'View Withdrawals'),
+    'commission': NotificationAction('/agent/commissions', 'View Commissions'),
+    'kyc': NotificationAction('/kyc', 'View KYC Status'),
+}
+
+Chrome = namedtuple('Chrome', ('colors', 'head', 'logo', 'footer'))
+
+# Delimits recipient fields in batch output; random so template data can't forge it
+_SLOT = f'\x00{uuid.uuid4().hex}\x00'
+
+
+def _money(value, grouping=False):
+    return ('${:,.2f}' if grouping else '${:.2f}').format(float(value or 0))
+
+
+def _create_environment():
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        undefined=StrictUndefined,
+        auto_reload=False,
+        cache_size=-1
+    )
+    environment.filters['money'] = _money
+    environment.globals.update(
+        email_chrome=email_chrome,
+        priority_colors=PRIORITY_COLORS,
+        notification_actions=NOTIFICATION_ACTIONS
+    )
+    return environment
+
+
+@lru_cache(maxsize=256)
+def email_chrome(theme, branding):
+    """
+    Render the static fragments for a theme and branding (memoized)
+
+    Returns:
+        Chrome with colors and Markup head/logo/footer
+    """
+    colors = branding.colors or THEMES[theme]
+    context = {'colors': colors, 'branding': branding}
+    return Chrome(
+        colors,
+        Markup(_environment.get_template('email/partials/head.html').render(context)),
+        Markup(_environment.get_template('email/partials/logo.html').render(context).strip()),
+        Markup(_environment.get_template('email/partials/footer.html').render(context))
+    )
+
+
+class _RecipientSlot:
+    """Stands in for the recipient in batch renders: each attribute is a field marker"""
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Markup(f'{_SLOT}{name}{_SLOT}')
+
+
+_environment = _create_environment()
+_branding_cache = (None, {})
+
+
+def warm_email_templates(app=None):
+    """Compile every email template up front"""
+    names = _environment.list_templates(filter_func=lambda name: name.startswith('email/'))
+    for name in names:
+        _environment.get_template(name)
+    logger.info(f'Email templates compiled: {len(names)}')
+
+
+def get_branding(tenant_id=None):
+    """
+    Branding for a recipient's tenant
+
+    The default tenant (and unknown/inactive ones) use DEFAULT_BRANDING.
+    Lookups are cached until the tenant snapshot is rebuilt, so tenant
+    edits show up as soon as the tenant cache is invalidated.
+    """
+    global _branding_cache
+    if not tenant_id:
+        return DEFAULT_BRANDING
+
+    snapshot = get_tenant_snapshot()
+    if tenant_id == snapshot.default_id or tenant_id not in snapshot.by_id:
+        return DEFAULT_BRANDING
+
+    cached_snapshot, brandings = _branding_cache
+    if cached_snapshot is not snapshot:
+        brandings = {}
+        _branding_cache = (snapshot, brandings)
+
+    branding = brandings.get(tenant_id)
+    if branding is None:
+        tenant = db.session.query(
+            Tenant.name, Tenant.logo_url, Tenant.custom_domain, Tenant.primary_color, Tenant.secondary_color
+        ).filter(Tenant.id == tenant_id).first()
+        if tenant is None:
+            return DEFAULT_BRANDING
+
+        primary = tenant.primary_color or THEMES['brand'].start
+        branding = Branding(
+            name=tenant.name,
+            logo_url=tenant.logo_url,
+            site_url=f'https://{tenant.custom_domain}' if tenant.custom_domain else DEFAULT_BRANDING.site_url,
+            colors=ThemeColors(primary, tenant.secondary_color or primary, primary)
+        )
+        brandings[tenant_id] = branding
+    return branding
+
+
+def render_email(template_name, tenant_id=None, **context):
+    """
+    Render one email
+
+    Args:
+        template_name: Template under src/templates (e.g. 'email/welcome.html')
+        tenant_id: Recipient's tenant for branding
+        **context: Template variables
+
+    Returns:
+        HTML string
+    """
+    context['branding'] = get_branding(tenant_id)
+    return _environment.get_template(template_name).render(context)
+
+
+def render_email_batch(template_name, recipients, tenant_id=None, recipient_name='user', **context):
+    """
+    Render one email per recipient from a single template render
+
+    The template is rendered once with a placeholder in place of the
+    recipient and split at the recipient's fields; each email is then the
+    static fragments joined with that recipient's escaped values. Recipient
+    fields may therefore only be interpolated, not tested or filtered, in
+    templates rendered this way.
+
+    Args:
+        template_name: Template under src/templates
+        recipients: Objects or dicts with the fields the template uses
+        tenant_id: Shared tenant for branding
+        recipient_name: Template variable the recipient is bound to
+        **context: Template variables shared by every recipient
+
+    Returns:
+        List of HTML strings, in the order of recipients
+    """
+    context['branding'] = get_branding(tenant_id)
+    context[recipient_name] = _RecipientSlot()
+    fragments = _environment.get_template(template_name).render(context).split(_SLOT)
+
+    fields = fragments[1::2]
+    pieces = list(fragments)
+    rendered = []
+    for recipient in recipients:
+        get = recipient.get if isinstance(recipient, dict) else lambda field: getattr(recipient, field, None)
+        pieces[1::2] = [escape('' if (value := get(field)) is None else value) for field in fields]
+        rendered.append(''.join(pieces))
+    return rendered
@@ -0,0 +1,323 @@
+"""
+Export Service
+Streams report datasets as CSV / NDJSON and writes large exports to files.
+
+Rows come from a server-side cursor (yield_per) and are encoded in
+fixed-size chunks, so memory stays constant whatever the row count.
+Hierarchy scoping is applied explicitly from the requester snapshot
+rather than by the request-bound ORM hook, so the same query runs in a
+streaming response and in a background job thread.
+"""
+from datetime import datetime, date
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import select, func
+from src.constants.roles import Roles
+from src.database import db
+from src.models.agent import Agent
+from src.models.commission import Commission
+from src.models.payment import Payment
+from src.models.trading_program import Challenge
+from src.models.user import User
+from src.models.user_closure import UserClosure
+from src.services.storage_service import StorageService
+from src.utils.hierarchy_scoping import is_hierarchy_scope_active
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_BYTES = 64 * 1024
+PARQUET_ROW_GROUP_SIZE = 50000
+PROGRESS_EVERY_ROWS = 10000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+STREAMING_FORMATS = ('csv', 'ndjson')
+
+
+class ExportService:
+    """Service for exporting report datasets"""
+
+    # dataset -> (columns, admin only)
+    DATASETS = {
+        'users': ((
+            User.id, User.email, User.first_name, User.last_name, User.role, User.tenant_id,
+            User.parent_id, User.is_active, User.kyc_status, User.created_at
+        ), True),
+        'payments': ((
+            Payment.id, Payment.user_id, Payment.amount, Payment.currency, Payment.payment_method,
+            Payment.payment_type, Payment.status, Payment.purpose, Payment.created_at, Payment.completed_at
+        ), True),
+        'challenges': ((
+            Challenge.id, Challenge.user_id, Challenge.program_id, Challenge.status, Challenge.initial_balance,
+            Challenge.current_balance, Challenge.payment_status, Challenge.created_at, Challenge.passed_at
+        ), True),
+        'commissions': ((
+            Commission.id, Commission.agent_id, Commission.challenge_id, Commission.sale_amount,
+            Commission.commission_rate, Commission.commission_amount, Commission.status,
+            Commission.created_at, Commission.approved_at, Commission.paid_at
+        ), False),
+    }
+
+    @staticmethod
+    def get_requester(user):
+        """
+        Snapshot the requesting user for permission checks and scoping
+
+        Must be called inside the request: it captures whether the request
+        is hierarchy-scoped so background jobs can apply the same filter.
+        """
+        agent_id = db.session.query(Agent.id).filter(Agent.user_id == user.id).scalar()
+        return {
+            'id': user.id,
+            'role': user.role,
+            'is_admin': Roles.is_admin(user.role),
+            'agent_id': agent_id,
+            'scoped': is_hierarchy_scope_active()
+        }
+
+    @staticmethod
+    def validate(dataset, fmt, requester):
+        """
+        Check dataset, format and permission
+
+        Raises:
+            ValueError: unknown dataset/format
+            PermissionError: requester may not export this dataset
+        """
+        if dataset not in ExportService.DATASETS:
+            raise ValueError(f'Unknown dataset: {dataset}')
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown format: {fmt}')
+
+        _, admin_only = ExportService.DATASETS[dataset]
+        if requester['is_admin']:
+            return
+        if admin_only or not requester['agent_id']:
+            raise PermissionError('Admin access required')
+
+    @staticmethod
+    def build_query(dataset, requester, filters=None):
+        """
+        Build the export SELECT for a dataset
+
+        Args:
+            dataset: Dataset name (see DATASETS)
+            requester: Dict from get_requester
+            filters: Optional since/until (ISO dates) and status
+
+        Returns:
+            (column names, SELECT statement)
+        """
+        filters = filters or {}
+        columns, _ = ExportService.DATASETS[dataset]
+        model = columns[0].class_
+        query = select(*columns).order_by(model.id)
+
+        if filters.get('since'):
+            query = query.where(model.created_at >= datetime.fromisoformat(filters['since']))
+        if filters.get('until'):
+            query = query.where(model.created_at < datetime.fromisoformat(filters['until']))
+        if filters.get('status') and hasattr(model, 'status'):
+            query = query.where(model.status == filters['status'])
+
+        if dataset == 'commissions' and not requester['is_admin']:
+            # Agents only ever export their own commissions
+            query = query.where(Commission.agent_id == requester['agent_id'])
+        elif requester['scoped']:
+            downline = UserClosure.descendant_ids(requester['id'])
+            if dataset == 'users':
+                query = query.where(User.id.in_(downline))
+            elif dataset == 'commissions':
+                query = query.join(Agent, Commission.agent_id == Agent.id).where(Agent.user_id.in_(downline))
+            else:
+                query = query.where(model.user_id.in_(downline))
+
+        return [column.key for column in columns], query
+
+    @staticmethod
+    def iter_rows(query):
+        """Yield rows through a server-side cursor in EXPORT_YIELD_PER batches"""
+        result = db.session.execute(
+            query,
+            execution_options={
+                'yield_per': current_app.config.get('EXPORT_YIELD_PER', 2000),
+                'skip_hierarchy_scope': True
+            }
+        )
+        for partition in result.partitions():
+            yield from partition
+
+    @staticmethod
+    def count_rows(query):
+        """Total row count for progress reporting"""
+        return db.session.execute(
+            select(func.count()).select_from(query.order_by(None).subquery()),
+            execution_options={'skip_hierarchy_scope': True}
+        ).scalar()
+
+    @staticmethod
+    def stream(fmt, columns, rows):
+        """
+        Encode rows as CSV or NDJSON text chunks of ~STREAM_CHUNK_BYTES
+
+        Returns:
+            Generator of str chunks
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == 'csv' else None
+
+        if writer:
+            writer.writerow(columns)
+
+        for row in rows:
+            if writer:
+                writer.writerow([_csv_value(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, (_json_value(value) for value in row)))))
+                buffer.write('\n')
+
+            if buffer.tell() >= STREAM_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def run_export_job(params, progress):
+        """
+        Background job handler: write the export to a file and store it
+
+        Args:
+            params: dataset, format, filters, requester
+            progress: progress(processed, total) callback
+
+        Returns:
+            Result with the stored file key and row count (downloaded via
+            the export download route, never a public URL)
+        """
+        dataset = params['dataset']
+        fmt = params['format']
+        columns, query = ExportService.build_query(dataset, params['requester'], params.get('filters'))
+
+        total = ExportService.count_rows(query)
+        progress(0, total)
+
+        content_type, extension = FORMATS[fmt]
+        handle, path = tempfile.mkstemp(suffix=f'.{extension}')
+        os.close(handle)
+
+        try:
+            rows = _ProgressRows(ExportService.iter_rows(query), progress, total)
+            if fmt == 'parquet':
+                ExportService._write_parquet(path, ExportService.DATASETS[dataset][0], rows)
+            else:
+                with open(path, 'w', newline='', encoding='utf-8') as output:
+                    for chunk in ExportService.stream(fmt, columns, rows):
+                        output.write(chunk)
+            progress(rows.count, total)
+
+            filename = f"{dataset}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.{extension}"
+            stored = StorageService().store_path(path, 'exports', filename, content_type)
+            if not stored['success']:
+                raise RuntimeError(stored['error'])
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        logger.info(f"Export {dataset}.{fmt} written: {rows.count} rows -> {stored['key']}")
+        return {
+            'rows': rows.count,
+            'key': stored['key'],
+            'local': stored['local'],
+            'format': fmt
+        }
+
+    @staticmethod
+    def _write_parquet(path, columns, rows):
+        """Write rows as Parquet row groups (requires pyarrow)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.error('pyarrow not installed. Install with: pip install pyarrow')
+            raise ValueError('Parquet export not available')
+
+        def arrow_type(column):
+            python_type = column.type.python_type
+            if python_type is bool:
+                return pa.bool_()
+            if python_type is int:
+                return pa.int64()
+            if python_type in (float, Decimal):
+                return pa.float64()
+            if python_type is datetime:
+                return pa.timestamp('us')
+            if python_type is date:
+                return pa.date32()
+            return pa.string()
+
+        schema = pa.schema([(column.key, arrow_type(column)) for column in columns])
+        batch = []
+
+        with pq.ParquetWriter(path, schema) as writer:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                    writer.write_table(_arrow_table(pa, schema, batch))
+                    batch.clear()
+            if batch:
+                writer.write_table(_arrow_table(pa, schema, batch))
+
+
+class _ProgressRows:
+    """Row iterator that reports progress every PROGRESS_EVERY_ROWS rows"""
+
+    def __init__(self, rows, progress, total):
+        self._rows = rows
+        self._progress = progress
+        self._total = total
+        self.count = 0
+
+    def __iter__(self):
+        for row in self._rows:
+            self.count += 1
+            if self.count % PROGRESS_EVERY_ROWS == 0:
+                self._progress(self.count, self._total)
+            yield row
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _arrow_table(pa, schema, rows):
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays(
+        [
+            pa.array([float(value) if isinstance(value, Decimal) else value for value in values], type=field.type)
+            for values, field in zip(columns, schema)
+        ],
+        schema=schema
+    )
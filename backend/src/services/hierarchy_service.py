@@ -0,0 +1,157 @@
+"""
+Downline loading for the hierarchy views
+
+A user's downline (optionally bounded by depth) is read with one indexed
+probe of user_closure, in level order, as plain rows rather than User
+objects; trees are assembled in Python through an id -> node dict and
+child counts come from grouped counts instead of per-node relationship
+loads. Downline totals and statistics are read from the precomputed
+UserDownlineCount buckets.
+"""
+from collections import Counter
+from sqlalchemy import select, func
+from src.database import db
+from src.models.user import User
+from src.models.user_closure import UserClosure
+from src.models.user_downline_count import UserDownlineCount
+
+DOWNLINE_COLUMNS = (
+    User.id, User.email, User.first_name, User.last_name, User.role, User.level,
+    User.parent_id, User.is_active, User.kyc_status, User.created_at
+)
+
+
+class HierarchyService:
+    """Service for downline trees, levels and counts"""
+
+    @staticmethod
+    def load_downline(root_id, max_depth=None, include_root=False):
+        """
+        Rows of root_id's downline in level order (depth, then id)
+
+        Args:
+            root_id: Root of the subtree
+            max_depth: Deepest relative depth to include (None = all)
+            include_root: Include the root itself (depth 0)
+
+        Returns:
+            list of rows with DOWNLINE_COLUMNS and depth (relative to the root)
+        """
+        query = select(*DOWNLINE_COLUMNS, UserClosure.depth).join(
+            UserClosure, UserClosure.descendant_id == User.id
+        ).where(
+            UserClosure.ancestor_id == root_id
+        )
+        if not include_root:
+            query = query.where(UserClosure.depth > 0)
+        if max_depth is not None:
+            query = query.where(UserClosure.depth <= max_depth)
+
+        return db.session.execute(query.order_by(UserClosure.depth, User.id)).all()
+
+    @staticmethod
+    def child_counts(root_id, max_depth=None):
+        """
+        Direct-children count of every node in root_id's downline (and the root)
+
+        Args:
+            max_depth: Only count children down to this relative depth
+
+        Returns:
+            dict: parent id -> number of children (nodes without children are absent)
+        """
+        query = select(User.parent_id, func.count()).join(
+            UserClosure, UserClosure.descendant_id == User.id
+        ).where(
+            UserClosure.ancestor_id == root_id,
+            UserClosure.depth > 0
+        )
+        if max_depth is not None:
+            query = query.where(UserClosure.depth <= max_depth)
+
+        return dict(db.session.execute(query.group_by(User.parent_id)).all())
+
+    @staticmethod
+    def downline_counts(user_ids):
+        """
+        Children and total downline counts for a page of users (from the counters)
+
+        Returns:
+            dict: user id -> (children_count, downline_count)
+        """
+        return UserDownlineCount.totals(user_ids)
+
+    @staticmethod
+    def build_tree(root_id, max_depth=5):
+        """
+        Nested tree of root_id's downline, max_depth levels including the root
+
+        Two statements regardless of size: the level-order subtree and the
+        grouped child counts (which also cover the nodes of the deepest
+        level shown, whose children are not returned).
+
+        Returns:
+            dict: root node with children, or None if max_depth < 1
+        """
+        if max_depth < 1:
+            return None
+
+        rows = HierarchyService.load_downline(root_id, max_depth=max_depth - 1, include_root=True)
+        children_count = HierarchyService.child_counts(root_id, max_depth=max_depth)
+
+        nodes = {}
+        for row in rows:
+            node = nodes[row.id] = {
+                'id': row.id,
+                'email': row.email,
+                'name': f"{row.first_name} {row.last_name}",
+                'role': row.role,
+                'level': row.level,
+                'is_active': row.is_active,
+                'children_count': children_count.get(row.id, 0),
+                'children': []
+            }
+            # Level order: the parent's node already exists
+            parent = nodes.get(row.parent_id) if row.depth > 0 else None
+            if parent is not None:
+                parent['children'].append(node)
+
+        return nodes.get(root_id)
+
+    @staticmethod
+    def downline_by_level(root_id):
+        """
+        Whole downline grouped by relative depth, with children counts
+
+        Returns:
+            (total, dict: depth -> list of user dicts)
+        """
+        rows = HierarchyService.load_downline(root_id)
+        children_count = Counter(row.parent_id for row in rows)
+
+        by_level = {}
+        for row in rows:
+            by_level.setdefault(row.depth, []).append({
+                'id': row.id,
+                'email': row.email,
+                'first_name': row.first_name,
+                'last_name': row.last_name,
+                'role': row.role,
+                'level': row.level,
+                'parent_id': row.parent_id,
+                'is_active': row.is_active,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'children_count': children_count.get(row.id, 0)
+            })
+
+        return len(rows), by_level
+
+    @staticmethod
+    def downline_stats(root_id):
+        """
+        Downline counts by role, relative depth and active flag (a point read of the counters)
+
+        Returns:
+            dict
+        """
+        return UserDownlineCount.stats(root_id)
@@ -0,0 +1,265 @@
+"""
+Job Service
+Runs BackgroundJob handlers on a small per-process thread pool.
+
+Handlers are plain functions called as handler(params, progress) inside an
+app context; progress(processed, total=None) is written on its own
+connection so it never disturbs the handler's transaction or open cursors.
+
+Every process heartbeats the jobs it owns. Jobs whose process stopped
+(deploy, restart, crash) stop heartbeating and are picked up by
+`flask jobs recover`: resumable job types (see _resumable_handlers) continue
+from the checkpoint they committed with their last unit of work, the others
+are marked failed so clients stop polling and can start them again.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, select, func
+from src.database import db
+from src.models.background_job import BackgroundJob
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def _worker_id():
+    """This process (evaluated per call: forked workers must not share an id)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobProgress:
+    """
+    The progress callback handed to handlers
+    
+    Called as progress(processed, total=None). Resumable handlers also read
+    checkpoint (the state saved by the previous, interrupted run, or None)
+    and call save_checkpoint(state) before committing each unit of work, so
+    the state commits atomically with it.
+    """
+    
+    def __init__(self, job_id, checkpoint=None):
+        self.job_id = job_id
+        self.checkpoint = checkpoint
+    
+    def __call__(self, processed, total=None):
+        JobService.report_progress(self.job_id, processed, total)
+    
+    def save_checkpoint(self, state):
+        """Stage state in the handler's own transaction (committed with its work)"""
+        db.session.execute(
+            update(BackgroundJob.__table__).where(
+                BackgroundJob.__table__.c.id == self.job_id
+            ).values(checkpoint=state, heartbeat_at=datetime.utcnow())
+        )
+
+
+class JobService:
+    """Service for starting and tracking background jobs"""
+    
+    @staticmethod
+    def submit(job_type, handler, params=None, user_id=None):
+        """
+        Create a job row and run handler in the background
+        
+        Args:
+            job_type: Short job name (e.g. 'export')
+            handler: Function handler(params, progress) returning a JSON-able result
+            params: JSON-able parameters passed to the handler
+            user_id: Owner of the job (for polling permissions)
+        
+        Returns:
+            BackgroundJob object
+        """
+        job = BackgroundJob(
+            job_type=job_type,
+            user_id=user_id,
+            params=params or {},
+            worker_id=_worker_id(),
+            heartbeat_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+        
+        app = current_app._get_current_object()
+        JobService._get_executor(app).submit(JobService._run, app, job.id, handler)
+        
+        logger.info(f"Background job {job.id} ({job_type}) queued")
+        return job
+    
+    @staticmethod
+    def get_job(job_id, user_id=None):
+        """Get a job, optionally only if owned by user_id"""
+        job = db.session.get(BackgroundJob, job_id)
+        if job and user_id is not None and job.user_id != user_id:
+            return None
+        return job
+    
+    @staticmethod
+    def report_progress(job_id, processed, total=None):
+        """Record progress from inside a running handler"""
+        now = datetime.utcnow()
+        values = {'processed': processed, 'updated_at': now, 'heartbeat_at': now}
+        if total is not None:
+            values['total'] = total
+        JobService._update(job_id, **values)
+    
+    @staticmethod
+    def recover_stale_jobs(stale_seconds=None):
+        """
+        Fail or resume jobs whose worker stopped heartbeating
+        
+        Each stale job is claimed with a conditional update, so concurrent
+        sweeps never take the same job. Resumable jobs then run to completion
+        in this process (from their checkpoint); run this from a process that
+        may block, e.g. a deploy hook or a cron entry.
+        
+        Args:
+            stale_seconds: Heartbeat age after which a job counts as abandoned
+                (default: BACKGROUND_JOB_STALE_SECONDS)
+        
+        Returns:
+            dict: failed, resumed, resumed_failed counts
+        """
+        app = current_app._get_current_object()
+        stale_seconds = stale_seconds or app.config.get('BACKGROUND_JOB_STALE_SECONDS', 300)
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        last_seen = func.coalesce(BackgroundJob.heartbeat_at, BackgroundJob.created_at)
+        handlers = JobService._resumable_handlers()
+        
+        stale = db.session.execute(
+            select(BackgroundJob.id, BackgroundJob.job_type).where(
+                BackgroundJob.status.in_(UNFINISHED_STATUSES),
+                last_seen < cutoff
+            ).order_by(BackgroundJob.created_at)
+        ).all()
+        db.session.commit()
+        
+        stats = {'failed': 0, 'resumed': 0, 'resumed_failed': 0}
+        for job_id, job_type in stale:
+            now = datetime.utcnow()
+            with db.engine.begin() as connection:
+                claimed = connection.execute(
+                    update(BackgroundJob.__table__).where(
+                        BackgroundJob.__table__.c.id == job_id,
+                        BackgroundJob.__table__.c.status.in_(UNFINISHED_STATUSES),
+                        func.coalesce(
+                            BackgroundJob.__table__.c.heartbeat_at, BackgroundJob.__table__.c.created_at
+                        ) < cutoff
+                    ).values(worker_id=_worker_id(), heartbeat_at=now)
+                ).rowcount
+            if not claimed:
+                continue
+            
+            handler = handlers.get(job_type)
+            if handler is None:
+                JobService._update(
+                    job_id,
+                    status='failed',
+                    error='Interrupted: the worker running this job stopped',
+                    completed_at=now
+                )
+                stats['failed'] += 1
+                logger.warning(f"Background job {job_id} ({job_type}) abandoned by its worker; marked failed")
+                continue
+            
+            logger.info(f"Resuming background job {job_id} ({job_type})")
+            JobService._start_heartbeat(app)
+            JobService._run(app, job_id, handler)
+            if db.session.get(BackgroundJob, job_id).status == 'completed':
+                stats['resumed'] += 1
+            else:
+                stats['resumed_failed'] += 1
+            db.session.commit()
+        
+        return stats
+    
+    @staticmethod
+    def _resumable_handlers():
+        """Job types that can continue from their checkpoint after an interruption"""
+        from src.services.notification_service import NotificationService
+        
+        return {
+            'notification_broadcast': NotificationService.run_broadcast_job
+        }
+    
+    @staticmethod
+    def _run(app, job_id, handler):
+        with app.app_context():
+            try:
+                now = datetime.utcnow()
+                JobService._update(job_id, status='running', started_at=now, worker_id=_worker_id(), heartbeat_at=now)
+                job = db.session.get(BackgroundJob, job_id)
+                
+                result = handler(job.params or {}, JobProgress(job_id, job.checkpoint))
+                db.session.commit()
+                
+                JobService._update(job_id, status='completed', result=result, completed_at=datetime.utcnow())
+                logger.info(f"Background job {job_id} completed")
+            except Exception as e:
+                db.session.rollback()
+                JobService._update(job_id, status='failed', error=str(e), completed_at=datetime.utcnow())
+                logger.error(f"Background job {job_id} failed: {str(e)}")
+            finally:
+                db.session.remove()
+    
+    @staticmethod
+    def _update(job_id, **values):
+        # Separate short transaction: visible to pollers immediately
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(BackgroundJob.__table__).where(BackgroundJob.__table__.c.id == job_id).values(**values)
+            )
+    
+    @staticmethod
+    def _heartbeat(app):
+        """Keep this process's unfinished jobs (queued ones too) from looking abandoned"""
+        interval = app.config.get('BACKGROUND_JOB_HEARTBEAT_SECONDS', 30)
+        table = BackgroundJob.__table__
+        while True:
+            try:
+                with app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(
+                            update(table).where(
+                                table.c.worker_id == _worker_id(),
+                                table.c.status.in_(UNFINISHED_STATUSES)
+                            ).values(heartbeat_at=datetime.utcnow())
+                        )
+            except Exception as e:
+                logger.warning(f"Background job heartbeat failed: {e}")
+            threading.Event().wait(interval)
+    
+    @staticmethod
+    def _start_heartbeat(app):
+        global _heartbeat_thread
+        with _executor_lock:
+            if _heartbeat_thread is None:
+                _heartbeat_thread = threading.Thread(
+                    target=JobService._heartbeat,
+                    args=(app,),
+                    name='background-job-heartbeat',
+                    daemon=True
+                )
+                _heartbeat_thread.start()
+    
+    @staticmethod
+    def _get_executor(app):
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('BACKGROUND_JOB_WORKERS', 2),
+                    thread_name_prefix='background-job'
+                )
+        JobService._start_heartbeat(app)
+        return _executor
@@ -2,6 +2,14 @@ from datetime import datetime
 from src.database import db
 from src.models.notification import Notification, NotificationPreference
 from src.services.email_service import EmailService
+from src.services.realtime_service import RealtimeService
+from src.utils import unread_counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = 1000
+DIGEST_USERS_PER_CHUNK = 500
 
 class NotificationService:
     """Service for managing notifications"""
@@ -41,23 +49,45 @@ class NotificationService:
         )
         
         db.session.add(notification)
-        db.session.commit()
+        db.session.flush()
         
-        # Send email if enabled
+        # Push to the user's open sockets once committed
+        RealtimeService.queue_event(
+            db.session, 'notification', notification.to_dict(), RealtimeService.user_room(user_id)
+        )
+        
+        # Queue email (or buffer it for the user's digest); the delivery worker sends it
         if send_email and prefs.should_send_email(notification_type):
-            EmailService.send_notification_email(notification)
+            from src.models.user import User
+            
+            user = db.session.get(User, user_id)
+            if user and user.email:
+                NotificationService._dispatch_emails([(
+                    {
+                        'id': notification.id,
+                        'user_id': user_id,
+                        'type': notification_type,
+                        'title': title,
+                        'message': message,
+                        'priority': priority
+                    },
+                    user,
+                    prefs.email_frequency
+                )])
+        
+        db.session.commit()
         
         return notification
     
     @staticmethod
-    def get_user_notifications(user_id, filters=None, page=1, per_page=50):
-        """Get notifications for a user"""
-        return Notification.get_user_notifications(user_id, filters, page, per_page)
+    def get_user_notifications(user_id, filters=None, page=1, per_page=50, cursor=None):
+        """Get notifications for a user (keyset-paginated when a cursor is given)"""
+        return Notification.get_user_notifications(user_id, filters, page, per_page, cursor)
     
     @staticmethod
     def get_unread_count(user_id):
-        """Get count of unread notifications"""
-        return Notification.get_unread_count(user_id)
+        """Get count of unread notifications (cached counter, see src/utils/unread_counter.py)"""
+        return unread_counter.get_unread_count(user_id)
     
     @staticmethod
     def mark_as_read(notification_id, user_id):
@@ -76,19 +106,20 @@ class NotificationService:
     
     @staticmethod
     def mark_all_as_read(user_id):
-        """Mark all notifications as read for a user"""
-        notifications = Notification.query.filter_by(
-            user_id=user_id,
-            is_read=False,
-            is_deleted=False
-        ).all()
+        """Mark all notifications as read for a user (one UPDATE)"""
+        from sqlalchemy import update
         
-        for notification in notifications:
-            notification.is_read = True
-            notification.read_at = datetime.utcnow()
+        result = db.session.execute(
+            update(Notification).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False,
+                Notification.is_deleted == False
+            ).values(is_read=True, read_at=datetime.utcnow())
+        )
+        unread_counter.record_unread_change(db.session, user_id, -result.rowcount)
         
         db.session.commit()
-        return len(notifications)
+        return result.rowcount
     
     @staticmethod
     def delete_notification(notification_id, user_id):
@@ -105,10 +136,13 @@ class NotificationService:
         return notification
     
     @staticmethod
-    def broadcast_notification(notification_type, title, message, data=None, priority='normal', user_ids=None, role=None):
+    def broadcast_notification(notification_type, title, message, data=None, priority='normal', user_ids=None, role=None, requested_by=None):
         """
         Broadcast notification to multiple users
         
+        The fan-out runs as a background job (see run_broadcast_job); this
+        only records the job and returns it so the caller can poll progress.
+        
         Args:
             notification_type: Type of notification
             title: Notification title
@@ -117,34 +151,484 @@ class NotificationService:
             priority: Priority level
             user_ids: List of specific user IDs (optional)
             role: Send to all users with this role (optional)
+            requested_by: ID of the user starting the broadcast; their
+                downline limits the recipients when the request is
+                hierarchy-scoped
+        
+        Returns:
+            BackgroundJob object
+        """
+        from src.services.job_service import JobService
+        from src.utils.hierarchy_scoping import is_hierarchy_scope_active
+        
+        params = {
+            'notification_type': notification_type,
+            'title': title,
+            'message': message,
+            'data': data,
+            'priority': priority,
+            'user_ids': list(user_ids) if user_ids else None,
+            'role': role,
+            # The job thread has no request, so scoping is applied explicitly
+            'scope_user_id': requested_by if requested_by and is_hierarchy_scope_active() else None
+        }
+        return JobService.submit(
+            'notification_broadcast',
+            NotificationService.run_broadcast_job,
+            params=params,
+            user_id=requested_by
+        )
+    
+    @staticmethod
+    def run_broadcast_job(params, progress):
+        """
+        Background job handler: fan a broadcast out to its recipients
+        
+        Target users are read in id order, BROADCAST_CHUNK_SIZE at a time,
+        with their preferences joined in SQL so only users accepting the
+        in-app notification come back. Each chunk is one bulk notification
+        insert plus bulk EmailQueue / digest buffer inserts, committed
+        together. Recipients' sockets get each notification after its chunk
+        commits; broadcasts to all users notify each tenant room once at the
+        end instead.
+        
+        Args:
+            params: Parameters recorded by broadcast_notification
+            progress: JobProgress (progress callback and checkpoint)
+        
+        Returns:
+            dict: recipients, notifications created, emails queued and
+            emails buffered for digests
+        """
+        from sqlalchemy import select, insert, func, and_, true
+        from src.models.user import User
+        from src.models.user_closure import UserClosure
+        
+        notification_type = params['notification_type']
+        
+        filters = []
+        if params.get('user_ids'):
+            filters.append(User.id.in_(params['user_ids']))
+        elif params.get('role'):
+            filters.append(User.role == params['role'])
+        if params.get('scope_user_id'):
+            filters.append(User.id.in_(UserClosure.descendant_ids(params['scope_user_id'])))
+        
+        def preference(prefix):
+            # Users without a preferences row get the column default
+            column = NotificationPreference.__table__.columns.get(f'{prefix}_{notification_type}')
+            if column is None:
+                return true()
+            return func.coalesce(column, column.default.arg)
+        
+        email_enabled = NotificationPreference.__table__.c.email_enabled
+        wants_email = and_(
+            func.coalesce(email_enabled, email_enabled.default.arg),
+            preference('email')
+        ).label('wants_email')
+        email_frequency = NotificationPreference.__table__.c.email_frequency
+        email_frequency = func.coalesce(email_frequency, email_frequency.default.arg).label('email_frequency')
+        
+        total = db.session.execute(
+            select(func.count(User.id)).where(*filters),
+            execution_options={'skip_hierarchy_scope': True}
+        ).scalar()
+        
+        # A resumed job continues after the last chunk it committed
+        checkpoint = progress.checkpoint or {}
+        stats = checkpoint.get('stats') or {'notifications': 0, 'emails_queued': 0, 'emails_digested': 0}
+        stats['recipients'] = total
+        processed = checkpoint.get('processed', 0)
+        last_id = checkpoint.get('last_id', 0)
+        progress(processed, total)
+        
+        # Everyone gets it: one event per tenant room instead of one per recipient
+        tenant_wide = not filters
+        tenant_ids = set(checkpoint.get('tenant_ids') or [])
+        
+        while True:
+            # Keyset pagination: each chunk commits, so no cursor is held open across chunks
+            users = db.session.execute(
+                select(
+                    User.id, User.email, User.first_name, User.tenant_id,
+                    preference('in_app').label('wants_in_app'), wants_email, email_frequency
+                ).outerjoin(
+                    NotificationPreference, NotificationPreference.user_id == User.id
+                ).where(
+                    User.id > last_id, *filters
+                ).order_by(User.id).limit(BROADCAST_CHUNK_SIZE),
+                execution_options={'skip_hierarchy_scope': True}
+            ).all()
+            if not users:
+                break
+            last_id = users[-1].id
+            processed += len(users)
+            
+            rows = []
+            email_items = []
+            for user in users:
+                if not user.wants_in_app:
+                    continue
+                row = {
+                    'user_id': user.id,
+                    'type': notification_type,
+                    'title': params['title'],
+                    'message': params['message'],
+                    'data': params.get('data'),
+                    'priority': params.get('priority') or 'normal'
+                }
+                rows.append(row)
+                if user.wants_email and user.email:
+                    email_items.append((row, user, user.email_frequency))
+            
+            if rows:
+                ids = db.session.execute(
+                    insert(Notification).returning(
+                        Notification.id, Notification.created_at, sort_by_parameter_order=True
+                    ), rows
+                ).all()
+                for row, (notification_id, created_at) in zip(rows, ids):
+                    row.update(id=notification_id, created_at=created_at)
+                NotificationService._track_inserted(rows, push=not tenant_wide)
+                tenant_ids.update(user.tenant_id for user in users if user.wants_in_app)
+            queued, digested = NotificationService._dispatch_emails(email_items)
+            
+            stats['notifications'] += len(rows)
+            stats['emails_queued'] += queued
+            stats['emails_digested'] += digested
+            progress.save_checkpoint({
+                'last_id': last_id,
+                'processed': processed,
+                'stats': {key: value for key, value in stats.items() if key != 'recipients'},
+                'tenant_ids': list(tenant_ids)
+            })
+            db.session.commit()
+            progress(processed, total)
+        
+        if tenant_wide:
+            RealtimeService.publish([
+                ('notifications_changed', {'type': notification_type, 'title': params['title']},
+                 RealtimeService.tenant_room(tenant_id))
+                for tenant_id in tenant_ids
+            ])
+        
+        return stats
+    
+    @staticmethod
+    def create_notifications_bulk(notifications, send_email=True):
+        """
+        Create many notifications with a constant number of queries
+        
+        Preferences and recipient emails are loaded in one query each,
+        notifications are bulk inserted and emails are queued in EmailQueue
+        or the digest buffer (in the caller's transaction) instead of being
+        sent inline.
+        
+        Args:
+            notifications: List of dicts with user_id, notification_type,
+                title, message and optional data/priority
+            send_email: Whether to also queue email notifications
         
         Returns:
             Number of notifications created
         """
+        from sqlalchemy import insert
+        from src.models.user import User
+        
+        if not notifications:
+            return 0
+        
+        user_ids = {item['user_id'] for item in notifications}
+        prefs = {
+            pref.user_id: pref
+            for pref in NotificationPreference.query.filter(NotificationPreference.user_id.in_(user_ids))
+        }
+        # Users without a preferences row get the column defaults
+        default_prefs = NotificationPreference(
+            **{column.name: column.default.arg for column in NotificationPreference.__table__.columns
+               if column.default is not None and not callable(column.default.arg)}
+        )
+        
+        rows = []
+        for item in notifications:
+            pref = prefs.get(item['user_id'], default_prefs)
+            if pref.should_send_in_app(item['notification_type']):
+                rows.append({
+                    'user_id': item['user_id'],
+                    'type': item['notification_type'],
+                    'title': item['title'],
+                    'message': item['message'],
+                    'data': item.get('data'),
+                    'priority': item.get('priority', 'normal')
+                })
+        
+        if not rows:
+            return 0
+        
+        ids = db.session.execute(
+            insert(Notification).returning(Notification.id, Notification.created_at, sort_by_parameter_order=True), rows
+        ).all()
+        for row, (notification_id, created_at) in zip(rows, ids):
+            row.update(id=notification_id, created_at=created_at)
+        NotificationService._track_inserted(rows)
+        
+        if send_email:
+            email_rows = [
+                row for row in rows
+                if prefs.get(row['user_id'], default_prefs).should_send_email(row['type'])
+            ]
+            users = {
+                user.id: user
+                for user in User.query.filter(User.id.in_({row['user_id'] for row in email_rows}))
+            } if email_rows else {}
+            
+            NotificationService._dispatch_emails([
+                (row, users[row['user_id']], prefs.get(row['user_id'], default_prefs).email_frequency)
+                for row in email_rows
+                if row['user_id'] in users and users[row['user_id']].email
+            ])
+        
+        return len(rows)
+    
+    @staticmethod
+    def send_digests(frequency):
+        """
+        Email each user one summary of their buffered notifications
+        
+        Run on a schedule per frequency (flask email digest --frequency
+        daily|weekly). Users are processed DIGEST_USERS_PER_CHUNK at a time;
+        their buffer rows are locked with SKIP LOCKED, turned into one
+        EmailQueue row per user and deleted in the same commit, so an
+        overlapping run never sends a notification twice.
+        
+        Args:
+            frequency: 'daily' or 'weekly'
+        
+        Returns:
+            dict: users, notifications summarized and emails queued
+        """
+        from itertools import groupby
+        from sqlalchemy import select, insert, delete
         from src.models.user import User
+        from src.models.notification import EmailQueue, NotificationDigestItem
+        
+        if frequency not in NotificationPreference.DIGEST_FREQUENCIES:
+            raise ValueError(f'Unknown digest frequency: {frequency}')
         
-        # Get target users
-        if user_ids:
-            users = User.query.filter(User.id.in_(user_ids)).all()
-        elif role:
-            users = User.query.filter_by(role=role).all()
-        else:
-            users = User.query.all()
-        
-        count = 0
-        for user in users:
-            notification = NotificationService.create_notification(
-                user_id=user.id,
-                notification_type=notification_type,
-                title=title,
-                message=message,
-                data=data,
-                priority=priority
+        stats = {'users': 0, 'notifications': 0, 'emails_queued': 0}
+        last_user_id = 0
+        
+        while True:
+            user_ids = db.session.execute(
+                select(NotificationDigestItem.user_id).where(
+                    NotificationDigestItem.frequency == frequency,
+                    NotificationDigestItem.user_id > last_user_id
+                ).group_by(
+                    NotificationDigestItem.user_id
+                ).order_by(NotificationDigestItem.user_id).limit(DIGEST_USERS_PER_CHUNK)
+            ).scalars().all()
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+            
+            items = db.session.execute(
+                select(
+                    NotificationDigestItem.id.label('item_id'),
+                    NotificationDigestItem.user_id,
+                    Notification.type,
+                    Notification.title,
+                    Notification.message,
+                    Notification.priority,
+                    Notification.is_deleted,
+                    Notification.created_at
+                ).join(
+                    Notification, Notification.id == NotificationDigestItem.notification_id
+                ).where(
+                    NotificationDigestItem.frequency == frequency,
+                    NotificationDigestItem.user_id.in_(user_ids)
+                ).order_by(
+                    NotificationDigestItem.user_id, NotificationDigestItem.id
+                ).with_for_update(skip_locked=True, of=NotificationDigestItem)
+            ).all()
+            if not items:
+                db.session.commit()
+                continue
+            
+            users = {
+                user.id: user
+                for user in db.session.execute(
+                    select(User.id, User.email, User.first_name, User.tenant_id).where(User.id.in_(user_ids))
+                )
+            }
+            
+            queued = []
+            for user_id, group in groupby(items, key=lambda item: item.user_id):
+                # Notifications the user already deleted are left out
+                notifications = [item for item in group if not item.is_deleted]
+                user = users.get(user_id)
+                if not notifications or not user or not user.email:
+                    continue
+                subject, html_body = EmailService.render_digest_email(user, notifications, frequency)
+                queued.append({
+                    'user_id': user.id,
+                    'to_email': user.email,
+                    'subject': subject,
+                    'body': '',
+                    'html_body': html_body
+                })
+                stats['users'] += 1
+                stats['notifications'] += len(notifications)
+            
+            if queued:
+                db.session.execute(insert(EmailQueue), queued)
+            db.session.execute(
+                delete(NotificationDigestItem).where(NotificationDigestItem.id.in_([item.item_id for item in items]))
             )
-            if notification:
-                count += 1
+            db.session.commit()
+            stats['emails_queued'] += len(queued)
+        
+        return stats
+    
+    @staticmethod
+    def compact_notifications(older_than_days=None, batch_size=None, archive=None, pause=0.0):
+        """
+        Retention: move old read / deleted notifications out of notifications
+        
+        Notifications created more than older_than_days ago that are read or
+        soft-deleted are deleted in batches of batch_size, each its own short
+        transaction (rows locked by other sessions are skipped), and copied
+        into notifications_archive unless archive is False. Unread
+        notifications are never touched, so unread counters are unaffected.
+        
+        Args:
+            older_than_days: Age cutoff (NOTIFICATION_RETENTION_DAYS)
+            batch_size: Rows per batch (NOTIFICATION_RETENTION_BATCH_SIZE)
+            archive: Copy rows to notifications_archive before deleting
+                (NOTIFICATION_RETENTION_ARCHIVE)
+            pause: Seconds to sleep between batches
+        
+        Returns:
+            dict: batches, archived and deleted counts
+        """
+        from datetime import timedelta
+        from flask import current_app
+        from sqlalchemy import select, insert, delete, or_
+        from src.models.notification import NotificationArchive
+        import time
+        
+        config = current_app.config
+        older_than_days = older_than_days or config.get('NOTIFICATION_RETENTION_DAYS', 90)
+        batch_size = batch_size or config.get('NOTIFICATION_RETENTION_BATCH_SIZE', 1000)
+        if archive is None:
+            archive = config.get('NOTIFICATION_RETENTION_ARCHIVE', True)
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        
+        columns = [getattr(Notification, name) for name in NotificationArchive.NOTIFICATION_COLUMNS]
+        stats = {'batches': 0, 'archived': 0, 'deleted': 0}
+        
+        while True:
+            ids = select(Notification.id).where(
+                Notification.created_at < cutoff,
+                or_(Notification.is_read == True, Notification.is_deleted == True)
+            ).order_by(Notification.created_at).limit(batch_size).with_for_update(skip_locked=True)
+            
+            rows = db.session.execute(
+                delete(Notification).where(Notification.id.in_(ids)).returning(*columns),
+                execution_options={'synchronize_session': False}
+            ).all()
+            if not rows:
+                db.session.commit()
+                break
+            
+            if archive:
+                db.session.execute(insert(NotificationArchive), [row._asdict() for row in rows])
+                stats['archived'] += len(rows)
+            db.session.commit()
+            
+            stats['batches'] += 1
+            stats['deleted'] += len(rows)
+            if pause:
+                time.sleep(pause)
+        
+        logger.info(f'Notification retention (older than {older_than_days} days): {stats}')
+        return stats
+    
+    @staticmethod
+    def _track_inserted(rows, push=True):
+        """
+        Unread counters and realtime pushes for bulk-inserted notifications
+        (both applied when the caller commits)
+        
+        Args:
+            rows: Inserted rows, with id and created_at
+            push: Also push each row to its user's sockets
+        """
+        for row in rows:
+            unread_counter.record_unread_change(db.session, row['user_id'], 1)
+            if push:
+                RealtimeService.queue_event(db.session, 'notification', {
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'type': row['type'],
+                    'title': row['title'],
+                    'message': row['message'],
+                    'data': row['data'],
+                    'priority': row['priority'],
+                    'is_read': False,
+                    'read_at': None,
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                }, RealtimeService.user_room(row['user_id']))
+    
+    @staticmethod
+    def _dispatch_emails(items):
+        """
+        Queue emails for new notifications (caller commits)
+        
+        Instant recipients get an EmailQueue row each; daily/weekly ones get
+        a digest buffer row that send_digests picks up.
+        
+        Args:
+            items: List of (notification row, user, email_frequency); rows
+                need 'id' for digest recipients, users need id, email,
+                first_name and tenant_id
         
-        return count
+        Returns:
+            (emails queued, notifications buffered for digests)
+        """
+        from sqlalchemy import insert
+        from src.models.notification import EmailQueue, NotificationDigestItem
+        
+        instant = []
+        digest = []
+        for row, user, frequency in items:
+            if frequency in NotificationPreference.DIGEST_FREQUENCIES:
+                digest.append({'user_id': row['user_id'], 'notification_id': row['id'], 'frequency': frequency})
+            else:
+                instant.append((row, user))
+        
+        queued = NotificationService._queued_emails(instant)
+        if queued:
+            db.session.execute(insert(EmailQueue), queued)
+        if digest:
+            db.session.execute(insert(NotificationDigestItem), digest)
+        return len(queued), len(digest)
+    
+    @staticmethod
+    def _queued_emails(items):
+        """EmailQueue rows for (notification row, user) pairs; user needs id, email, first_name, tenant_id"""
+        if not items:
+            return []
+        bodies = EmailService.render_notification_batch(items)
+        return [
+            {
+                'user_id': user.id,
+                'to_email': user.email,
+                'subject': f"[MarketEdgePros] {row['title']}",
+                'body': '',
+                'html_body': html_body
+            }
+            for (row, user), html_body in zip(items, bodies)
+        ]
     
     # Specific notification creators for common events
     
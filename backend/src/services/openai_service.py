@@ -1,10 +1,49 @@
 """
 OpenAI GPT-5 Service
 Handles all interactions with OpenAI API
+
+At most OPENAI_MAX_CONCURRENCY upstream calls run at once across all
+workers: slots are members of a Redis sorted set (openai:slots) scored by
+their expiry, so a slot left by a killed worker frees itself after
+OPENAI_TIMEOUT. A request that finds no free slot gets a busy response
+(503) immediately instead of waiting, so slow completions occupy at most
+that many request threads and cannot starve the rest of the API; keep it
+below the server's workers x threads. Without Redis the bound is per
+process. FAQ answers and program recommendations are cached and coalesced
+(see src.utils.llm_cache).
+
+For local testing point OPENAI_API_BASE at scripts/stub_openai_server.py.
 """
+from flask import current_app
+from src.database import get_redis
+from src.utils import llm_cache
+import logging
 import os
+import threading
+import time
+import uuid
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGE = 'The AI assistant is busy, please try again shortly'
+
+SLOTS_KEY = 'openai:slots'
+
+# Take a slot if fewer than ARGV[3] unexpired ones are held
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+_scripts = {}
+_local_slots = None  # without Redis
+_local_slots_lock = threading.Lock()
+
 class OpenAIService:
     """Service for OpenAI GPT-5 integration"""
     
@@ -16,13 +55,14 @@ class OpenAIService:
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
         
-        # Initialize OpenAI client
+        # Initialize OpenAI client (no retries: callers are waiting on a request)
+        timeout = float(os.getenv('OPENAI_TIMEOUT', 30))
         if api_base:
-            self.client = OpenAI(api_key=api_key, base_url=api_base)
+            self.client = OpenAI(api_key=api_key, base_url=api_base, timeout=timeout, max_retries=0)
         else:
-            self.client = OpenAI(api_key=api_key)
+            self.client = OpenAI(api_key=api_key, timeout=timeout, max_retries=0)
     
-    def chat_completion(self, messages, model="gpt-5", temperature=0.7, max_tokens=1000):
+    def chat_completion(self, messages, model="gpt-5", temperature=0.7, max_tokens=1000, cache=False):
         """
         Generate chat completion using GPT-5
         
@@ -31,25 +71,61 @@ class OpenAIService:
             model (str): Model to use (default: gpt-5)
             temperature (float): Sampling temperature (0-2)
             max_tokens (int): Maximum tokens to generate
+            cache (bool): Serve from / store in the response cache and coalesce
+                identical concurrent requests (only for prompts without
+                per-user data)
             
         Returns:
-            dict: Response containing message and usage info
+            dict: Response containing message and usage info (cached: True
+            when no upstream call was made for this request; busy: True
+            when no call slot was free or an identical request is still
+            running)
         """
+        if not cache:
+            return self._call_pooled(messages, model, temperature, max_tokens)
+        
+        key = llm_cache.cache_key(messages, model, temperature=temperature, max_tokens=max_tokens)
+        try:
+            response, cached = llm_cache.cached_call(
+                key,
+                lambda: self._call_pooled(messages, model, temperature, max_tokens),
+                cacheable=lambda response: response['success']
+            )
+        except llm_cache.CoalesceTimeout:
+            # The identical request in flight is slow; its answer will be cached
+            return {'success': False, 'busy': True, 'error': BUSY_MESSAGE}
+        return {**response, 'cached': cached}
+    
+    def _call_pooled(self, messages, model, temperature, max_tokens):
+        """Run one upstream call if a slot is free, else answer busy at once"""
+        slot = _acquire_slot()
+        if slot is None:
+            logger.warning('OpenAI concurrency limit reached; rejecting request')
+            return {'success': False, 'busy': True, 'error': BUSY_MESSAGE}
+        
+        try:
+            # Bounded by the client's OPENAI_TIMEOUT
+            return self._call(messages, model, temperature, max_tokens)
+        finally:
+            _release_slot(slot)
+    
+    def _call(self, messages, model, temperature, max_tokens):
         try:
             response = self.client.responses.create(
                 model=model,
-                input=messages[-1]['content'] if messages else "",
+                input=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_output_tokens=max_tokens
             )
+            usage = getattr(response, 'usage', None)
             
             return {
                 'success': True,
-                'message': response.output,
+                'message': response.output_text,
                 'usage': {
-                    'prompt_tokens': getattr(response, 'prompt_tokens', 0),
-                    'completion_tokens': getattr(response, 'completion_tokens', 0),
-                    'total_tokens': getattr(response, 'total_tokens', 0)
+                    'prompt_tokens': getattr(usage, 'input_tokens', 0),
+                    'completion_tokens': getattr(usage, 'output_tokens', 0),
+                    'total_tokens': getattr(usage, 'total_tokens', 0)
                 }
             }
         except Exception as e:
@@ -122,7 +198,7 @@ would be best and why."""
             {"role": "user", "content": prompt}
         ]
         
-        return self.chat_completion(messages, temperature=0.7, max_tokens=300)
+        return self.chat_completion(messages, temperature=0.7, max_tokens=300, cache=True)
     
     def analyze_trading_performance(self, performance_data):
         """
@@ -189,12 +265,58 @@ MarketEdgePros policies, suggest contacting support."""
         
         messages.append({"role": "user", "content": question})
         
-        return self.chat_completion(messages, temperature=0.5, max_tokens=400)
+        return self.chat_completion(messages, temperature=0.5, max_tokens=400, cache=True)
+
+
+def _acquire_slot():
+    """
+    Take one of the OPENAI_MAX_CONCURRENCY call slots without waiting
+    
+    Returns:
+        Slot token for _release_slot, or None when all slots are taken
+    """
+    limit = current_app.config.get('OPENAI_MAX_CONCURRENCY', 8)
+    redis = get_redis()
+    if redis is not None:
+        token = uuid.uuid4().hex
+        now = time.time()
+        # Held slots expire shortly after the client timeout
+        expires_at = now + current_app.config.get('OPENAI_TIMEOUT', 30) + 5
+        try:
+            script = _scripts.get(id(redis))
+            if script is None:
+                script = _scripts[id(redis)] = redis.register_script(_ACQUIRE_SCRIPT)
+            if script(keys=[SLOTS_KEY], args=[now, expires_at, limit, token]):
+                return token
+            return None
+        except Exception as e:
+            logger.warning(f'OpenAI slot acquire failed, using the per-process bound: {e}')
+    
+    global _local_slots
+    with _local_slots_lock:
+        if _local_slots is None:
+            _local_slots = threading.BoundedSemaphore(limit)
+    if _local_slots.acquire(blocking=False):
+        return _local_slots
+    return None
+
+
+def _release_slot(slot):
+    if slot is _local_slots:
+        slot.release()
+        return
+    
+    try:
+        get_redis().zrem(SLOTS_KEY, slot)
+    except Exception as e:
+        # The slot expires on its own
+        logger.warning(f'OpenAI slot release failed: {e}')
 
 
 # Singleton instance
 _openai_service = None
 
+
 def get_openai_service():
     """Get or create OpenAI service instance"""
     global _openai_service
@@ -0,0 +1,141 @@
+"""
+Realtime notification delivery (Socket.IO)
+
+Clients connect to the /notifications namespace with their access token
+(`io(url + '/notifications', {auth: {token}, transports: ['websocket']})`)
+and are placed in two rooms: user:{id} and tenant:{tenant_id}. New
+notifications are pushed to the user room as a `notification` event with
+the same payload as GET /notifications; tenant-wide broadcasts send a
+single `notifications_changed` event to each tenant room instead of one
+event per recipient, and clients refetch.
+
+Events are queued on the database session and emitted after commit, so
+clients never see a notification that was rolled back. Emits go through
+the Redis message queue (SOCKETIO_MESSAGE_QUEUE), which relays them to
+every Socket.IO worker. The API's threaded gunicorn workers run in
+SOCKETIO_ASYNC_MODE=threading and only emit; client connections are served
+by a dedicated process that the proxy routes /socket.io/ to:
+
+    SOCKETIO_ASYNC_MODE=eventlet gunicorn --worker-class eventlet -w 1 --bind 127.0.0.1:8001 "src.app:create_app()"
+
+(see setup.sh and the Dockerfile). Several such processes can run behind
+the proxy: websocket-only clients need no sticky sessions, long-polling
+clients do. CLI jobs and background jobs emit through the same queue.
+"""
+from flask import request
+from flask_socketio import ConnectionRefusedError, join_room
+from sqlalchemy import event
+from src import socketio
+from src.database import db, get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/notifications'
+
+
+class RealtimeService:
+    """Socket.IO rooms and post-commit event publishing"""
+
+    @staticmethod
+    def user_room(user_id):
+        return f'user:{user_id}'
+
+    @staticmethod
+    def tenant_room(tenant_id):
+        # Users without a tenant belong to the default one
+        return f"tenant:{tenant_id or 'default'}"
+
+    @staticmethod
+    def queue_event(session, event_name, payload, room):
+        """
+        Emit an event when the session commits
+
+        Args:
+            session: Session whose commit releases the event
+            event_name: Socket.IO event name
+            payload: JSON-serializable payload
+            room: Target room (user_room / tenant_room)
+        """
+        session.info.setdefault('realtime_events', []).append((event_name, payload, room))
+
+    @staticmethod
+    def publish(events):
+        """Emit (event_name, payload, room) triples now"""
+        if not events or socketio.server is None:
+            return
+
+        try:
+            for event_name, payload, room in events:
+                socketio.emit(event_name, payload, to=room, namespace=NAMESPACE)
+        except Exception as e:
+            # Clients still catch up through the REST endpoints
+            logger.warning(f'Realtime publish failed: {e}')
+
+    @staticmethod
+    def authenticate(auth):
+        """
+        Resolve the handshake's access token into a principal
+
+        The token is read from the Socket.IO auth payload ({token}) or the
+        Authorization header, and checked like token_required does (revoked
+        tokens are refused).
+
+        Returns:
+            CurrentUser or None
+        """
+        from src.models import User
+        from src.services.auth_service import AuthService
+        from src.utils.principal import load_current_user
+
+        token = (auth or {}).get('token') if isinstance(auth, dict) else None
+        token = token or request.headers.get('Authorization', '')
+        if token.startswith('Bearer '):
+            token = token[len('Bearer '):]
+        if not token:
+            return None
+
+        if AuthService.is_token_blacklisted(token):
+            return None
+
+        payload = User.verify_token(token, token_type='access')
+        if not payload:
+            return None
+
+        return load_current_user(payload['user_id'])
+
+
+def init_realtime(app):
+    """Attach Socket.IO to the app (message queue only when Redis is reachable)"""
+    message_queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if message_queue and not get_redis():
+        logger.warning('Redis unavailable: realtime events only reach clients of this process')
+        message_queue = None
+
+    socketio.init_app(
+        app,
+        message_queue=message_queue,
+        channel=app.config.get('SOCKETIO_CHANNEL', 'marketedgepros-socketio'),
+        async_mode=app.config.get('SOCKETIO_ASYNC_MODE'),
+        cors_allowed_origins=app.config.get('CORS_ORIGINS', '*')
+    )
+
+
+@socketio.on('connect', namespace=NAMESPACE)
+def _on_connect(auth=None):
+    principal = RealtimeService.authenticate(auth)
+    if principal is None:
+        raise ConnectionRefusedError('unauthorized')
+
+    join_room(RealtimeService.user_room(principal.id))
+    join_room(RealtimeService.tenant_room(principal.tenant_id))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _realtime_after_commit(session):
+    RealtimeService.publish(session.info.pop('realtime_events', None))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _realtime_after_rollback(session):
+    session.info.pop('realtime_events', None)
@@ -3,6 +3,7 @@ Storage Service using DigitalOcean Spaces (S3-compatible)
 Handles file uploads for KYC documents and other assets
 """
 import os
+import shutil
 import boto3
 from botocore.exceptions import ClientError
 from flask import current_app
@@ -152,6 +153,86 @@ class StorageService:
                 'error': f"Local upload failed: {str(e)}"
             }
     
+    def store_path(self, path, folder, filename, content_type='application/octet-stream'):
+        """
+        Store a private file that already exists on disk (e.g. a generated export)
+        
+        Locally the file goes under PRIVATE_STORAGE_FOLDER, which (unlike
+        UPLOAD_FOLDER) is never served; callers hand it out themselves after
+        their own access checks. In Spaces it is uploaded without a public ACL.
+        
+        Args:
+            path (str): Local file path; moved or uploaded, then removed
+            folder (str): Folder path in the bucket
+            filename (str): Target filename
+            content_type (str): MIME type
+        
+        Returns:
+            dict: {'success': bool, 'key': str, 'local': bool} or {'success': False, 'error': str}
+        """
+        key = f"{folder}/{filename}"
+        try:
+            if not self.client:
+                target = self.private_path(key)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+                
+                logger.info(f"File stored locally: {key}")
+                return {
+                    'success': True,
+                    'key': key,
+                    'filename': filename,
+                    'local': True
+                }
+            
+            self.client.upload_file(
+                path,
+                self.spaces_name,
+                key,
+                ExtraArgs={'ContentType': content_type}
+            )
+            os.remove(path)
+            
+            logger.info(f"File uploaded successfully: {key}")
+            return {
+                'success': True,
+                'key': key,
+                'filename': filename,
+                'local': False
+            }
+        
+        except ClientError as e:
+            logger.error(f"Failed to upload file to Spaces: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Upload failed: {str(e)}"
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error storing file: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Unexpected error: {str(e)}"
+            }
+    
+    def private_path(self, key):
+        """
+        Local path of a file stored with store_path (local storage only)
+        
+        Args:
+            key (str): File key returned by store_path
+        
+        Returns:
+            str: Absolute path inside PRIVATE_STORAGE_FOLDER
+        
+        Raises:
+            ValueError: if the key points outside PRIVATE_STORAGE_FOLDER
+        """
+        root = os.path.abspath(os.getenv('PRIVATE_STORAGE_FOLDER', '/tmp/private-storage'))
+        path = os.path.abspath(os.path.join(root, key))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+    
     def delete_file(self, key):
         """
         Delete a file from DigitalOcean Spaces
@@ -1,12 +1,47 @@
 """
 Wallet service for managing user balances and transactions
+
+Every balance change is a ledger posting: the balance column is moved with
+an atomic UPDATE ... SET balance = balance + :delta RETURNING (guarded
+against overdrafts in the same statement) and the Transaction row is
+written in the same database transaction, using exact Decimal amounts
+rounded to cents. Concurrent postings to one wallet serialize on its row
+lock, so no update is lost.
+
+post_batch applies many postings (e.g. a commission payout run) in one
+transaction: wallets are locked once, in user_id order, balances are
+computed per wallet in Python and written back with one bulk UPDATE and
+one bulk Transaction insert.
+
+History is keyset-paginated on (wallet_id, created_at, id); balances as of
+a date and statements start from the nearest WalletBalanceSnapshot
+instead of summing the whole ledger.
 """
-from datetime import datetime
-from decimal import Decimal
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import select, insert, update, func, case, literal, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from src.database import db
-from src.models.wallet import Wallet, Transaction
+from src.models.wallet import Wallet, Transaction, WalletBalanceSnapshot
 from src.models.user import User
 
+BALANCE_TYPES = ('main', 'commission', 'bonus')
+CENT = Decimal('0.01')
+
+# Wallets locked per SELECT ... FOR UPDATE in post_batch
+LOCK_CHUNK_SIZE = 1000
+
+# snapshot_balances re-ranks this much ledger before the last snapshot (late commits)
+SNAPSHOT_OVERLAP = timedelta(hours=1)
+
+# One ledger entry for post_batch; amount is signed (credit > 0, debit < 0)
+Posting = namedtuple(
+    'Posting',
+    ('user_id', 'amount', 'balance_type', 'type', 'description', 'reference_type', 'reference_id', 'created_by'),
+    defaults=('main', None, None, None, None, None)
+)
+
 
 class WalletService:
     """Service for wallet operations"""
@@ -17,9 +52,9 @@ class WalletService:
         wallet = Wallet.query.filter_by(user_id=user_id).first()
         
         if not wallet:
-            wallet = Wallet(user_id=user_id)
-            db.session.add(wallet)
+            WalletService._ensure_wallets([user_id])
             db.session.commit()
+            wallet = Wallet.query.filter_by(user_id=user_id).first()
         
         return wallet
     
@@ -40,179 +75,467 @@ class WalletService:
         return 0.0
     
     @staticmethod
-    def add_funds(user_id, amount, balance_type='main', description=None, 
-                  reference_type=None, reference_id=None, created_by=None):
+    def add_funds(user_id, amount, balance_type='main', description=None,
+                  reference_type=None, reference_id=None, created_by=None, commit=True):
         """Add funds to wallet"""
+        amount = WalletService._amount(amount)
         if amount <= 0:
             raise ValueError("Amount must be positive")
         
-        wallet = WalletService.get_or_create_wallet(user_id)
-        
-        # Get current balance
-        if balance_type == 'main':
-            balance_before = float(wallet.main_balance)
-            wallet.main_balance = Decimal(str(balance_before + amount))
-        elif balance_type == 'commission':
-            balance_before = float(wallet.commission_balance)
-            wallet.commission_balance = Decimal(str(balance_before + amount))
-        elif balance_type == 'bonus':
-            balance_before = float(wallet.bonus_balance)
-            wallet.bonus_balance = Decimal(str(balance_before + amount))
-        else:
-            raise ValueError(f"Invalid balance type: {balance_type}")
-        
-        balance_after = balance_before + amount
-        
-        # Create transaction record
-        transaction = Transaction(
-            wallet_id=wallet.id,
-            type='deposit',
-            amount=Decimal(str(amount)),
-            balance_type=balance_type,
-            balance_before=Decimal(str(balance_before)),
-            balance_after=Decimal(str(balance_after)),
+        return WalletService._post(
+            user_id, amount, balance_type, 'deposit',
+            description=description or f"Added {amount} to {balance_type} balance",
             reference_type=reference_type,
             reference_id=reference_id,
-            description=description or f"Added {amount} to {balance_type} balance",
-            created_by=created_by
+            created_by=created_by,
+            commit=commit
         )
-        
-        wallet.last_transaction_at = datetime.utcnow()
-        
-        db.session.add(transaction)
-        db.session.commit()
-        
-        return wallet, transaction
     
     @staticmethod
     def deduct_funds(user_id, amount, balance_type='main', description=None,
-                     reference_type=None, reference_id=None, created_by=None):
+                     reference_type=None, reference_id=None, created_by=None, commit=True):
         """Deduct funds from wallet"""
+        amount = WalletService._amount(amount)
         if amount <= 0:
             raise ValueError("Amount must be positive")
         
-        wallet = WalletService.get_or_create_wallet(user_id)
+        return WalletService._post(
+            user_id, -amount, balance_type, 'withdrawal',
+            description=description or f"Deducted {amount} from {balance_type} balance",
+            reference_type=reference_type,
+            reference_id=reference_id,
+            created_by=created_by,
+            commit=commit
+        )
+    
+    @staticmethod
+    def transfer_funds(from_user_id, to_user_id, amount, balance_type='main',
+                      description=None, reference_type=None, reference_id=None, commit=True):
+        """Transfer funds between wallets (both legs in one transaction)"""
+        amount = WalletService._amount(amount)
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
         
-        # Get current balance
-        if balance_type == 'main':
-            balance_before = float(wallet.main_balance)
-            if balance_before < amount:
-                raise ValueError("Insufficient main balance")
-            wallet.main_balance = Decimal(str(balance_before - amount))
-        elif balance_type == 'commission':
-            balance_before = float(wallet.commission_balance)
-            if balance_before < amount:
-                raise ValueError("Insufficient commission balance")
-            wallet.commission_balance = Decimal(str(balance_before - amount))
-        elif balance_type == 'bonus':
-            balance_before = float(wallet.bonus_balance)
-            if balance_before < amount:
-                raise ValueError("Insufficient bonus balance")
-            wallet.bonus_balance = Decimal(str(balance_before - amount))
+        WalletService.post_batch([
+            Posting(
+                from_user_id, -amount, balance_type, 'withdrawal',
+                description=f"Transfer to user {to_user_id}: {description or ''}",
+                reference_type=reference_type,
+                reference_id=reference_id
+            ),
+            Posting(
+                to_user_id, amount, balance_type, 'deposit',
+                description=f"Transfer from user {from_user_id}: {description or ''}",
+                reference_type=reference_type,
+                reference_id=reference_id
+            )
+        ], commit=commit)
+        
+        return True
+    
+    @staticmethod
+    def get_transaction_history(user_id, limit=50, offset=0, balance_type=None, cursor=None):
+        """
+        Get transaction history for user, newest first
+        
+        With a cursor (next_cursor of the previous page) the page is read by
+        keyset from ix_transaction_wallet_created instead of with an offset.
+        
+        Returns:
+            dict: transactions (Transaction rows) and next_cursor
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        wallet_id = WalletService._wallet_id(user_id)
+        if wallet_id is None:
+            return {'transactions': [], 'next_cursor': None}
+        
+        query = Transaction.query.filter_by(wallet_id=wallet_id)
+        
+        if balance_type:
+            query = query.filter_by(balance_type=balance_type)
+        
+        query = query.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        if cursor is not None:
+            query = Transaction.after_cursor(query, cursor)
         else:
+            query = query.offset(offset)
+        
+        transactions = query.limit(limit + 1).all()
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
+        
+        return {
+            'transactions': transactions,
+            'next_cursor': Transaction.encode_cursor(transactions[-1]) if has_more else None
+        }
+    
+    @staticmethod
+    def get_balance_as_of(user_id, as_of, balance_type='main'):
+        """
+        Balance just before a point in time
+        
+        Starts from the nearest earlier snapshot and adds the ledger rows
+        between it and as_of, so the cost is bounded by the snapshot
+        interval rather than by the size of the ledger.
+        
+        Returns:
+            Decimal
+        """
+        if balance_type not in BALANCE_TYPES:
             raise ValueError(f"Invalid balance type: {balance_type}")
         
-        balance_after = balance_before - amount
+        wallet_id = WalletService._wallet_id(user_id)
+        if wallet_id is None:
+            return Decimal('0.00')
         
-        # Create transaction record
-        transaction = Transaction(
-            wallet_id=wallet.id,
-            type='withdrawal',
-            amount=Decimal(str(amount)),
-            balance_type=balance_type,
-            balance_before=Decimal(str(balance_before)),
-            balance_after=Decimal(str(balance_after)),
-            reference_type=reference_type,
-            reference_id=reference_id,
-            description=description or f"Deducted {amount} from {balance_type} balance",
-            created_by=created_by
+        return WalletService._balance_before(wallet_id, balance_type, as_of)
+    
+    @staticmethod
+    def get_statement(user_id, start, end, balance_type='main', limit=500, cursor=None):
+        """
+        Statement for [start, end): opening/closing balance, totals and rows
+        
+        The opening balance comes from get_balance_as_of and the totals from
+        one aggregate over the period; rows are oldest first and paged by
+        cursor for long periods.
+        
+        Returns:
+            dict
+        
+        Raises:
+            ValueError: Invalid balance type or cursor
+        """
+        if balance_type not in BALANCE_TYPES:
+            raise ValueError(f"Invalid balance type: {balance_type}")
+        
+        statement = {
+            'balance_type': balance_type,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'opening_balance': Decimal('0.00'),
+            'closing_balance': Decimal('0.00'),
+            'credited': Decimal('0.00'),
+            'debited': Decimal('0.00'),
+            'transaction_count': 0,
+            'transactions': [],
+            'next_cursor': None
+        }
+        wallet_id = WalletService._wallet_id(user_id)
+        if wallet_id is None:
+            return statement
+        
+        in_period = (
+            Transaction.wallet_id == wallet_id,
+            Transaction.balance_type == balance_type,
+            Transaction.created_at >= start,
+            Transaction.created_at < end
         )
+        delta = Transaction.balance_after - Transaction.balance_before
+        totals = db.session.execute(
+            select(
+                func.count(Transaction.id),
+                func.coalesce(func.sum(case((delta > 0, delta), else_=0)), 0),
+                func.coalesce(func.sum(case((delta < 0, -delta), else_=0)), 0)
+            ).where(*in_period)
+        ).one()
         
-        wallet.last_transaction_at = datetime.utcnow()
+        opening = WalletService._balance_before(wallet_id, balance_type, start)
+        statement.update({
+            'opening_balance': opening,
+            'closing_balance': opening + Decimal(totals[1]) - Decimal(totals[2]),
+            'credited': Decimal(totals[1]),
+            'debited': Decimal(totals[2]),
+            'transaction_count': totals[0]
+        })
         
-        db.session.add(transaction)
-        db.session.commit()
+        query = Transaction.query.filter(*in_period).order_by(Transaction.created_at, Transaction.id)
+        if cursor is not None:
+            query = Transaction.after_cursor(query, cursor, descending=False)
+        transactions = query.limit(limit + 1).all()
+        has_more = len(transactions) > limit
+        statement['transactions'] = transactions[:limit]
+        if has_more:
+            statement['next_cursor'] = Transaction.encode_cursor(transactions[limit - 1])
         
-        return wallet, transaction
+        return statement
     
     @staticmethod
-    def transfer_funds(from_user_id, to_user_id, amount, balance_type='main',
-                      description=None, reference_type=None, reference_id=None):
-        """Transfer funds between wallets"""
-        if amount <= 0:
-            raise ValueError("Amount must be positive")
+    def snapshot_balances(full=False):
+        """
+        Snapshot the latest ledger balance of every wallet balance that moved
         
-        # Deduct from sender
-        WalletService.deduct_funds(
-            from_user_id, amount, balance_type,
-            description=f"Transfer to user {to_user_id}: {description or ''}",
-            reference_type=reference_type,
-            reference_id=reference_id
+        One INSERT ... SELECT ranks recent ledger rows per wallet and balance
+        type and stores the newest one unless a snapshot already covers it.
+        Only rows newer than the last snapshot (less SNAPSHOT_OVERLAP, for
+        transactions that were still open) are ranked unless full is set.
+        Schedule it (e.g. daily) with flask wallet snapshot-balances.
+        
+        Returns:
+            dict: snapshots created
+        """
+        since = None
+        if not full:
+            last_snapshot_at = db.session.execute(select(func.max(WalletBalanceSnapshot.snapshot_at))).scalar()
+            if last_snapshot_at is not None:
+                since = last_snapshot_at - SNAPSHOT_OVERLAP
+        
+        latest = select(
+            Transaction.id,
+            Transaction.wallet_id,
+            Transaction.balance_type,
+            Transaction.created_at,
+            Transaction.balance_after,
+            func.row_number().over(
+                partition_by=(Transaction.wallet_id, Transaction.balance_type),
+                order_by=(Transaction.created_at.desc(), Transaction.id.desc())
+            ).label('position')
         )
+        if since is not None:
+            latest = latest.where(Transaction.created_at > since)
+        latest = latest.subquery()
         
-        # Add to recipient
-        WalletService.add_funds(
-            to_user_id, amount, balance_type,
-            description=f"Transfer from user {from_user_id}: {description or ''}",
-            reference_type=reference_type,
-            reference_id=reference_id
+        covered = select(WalletBalanceSnapshot.id).where(
+            WalletBalanceSnapshot.wallet_id == latest.c.wallet_id,
+            WalletBalanceSnapshot.balance_type == latest.c.balance_type,
+            tuple_(WalletBalanceSnapshot.snapshot_at, WalletBalanceSnapshot.transaction_id)
+            >= tuple_(latest.c.created_at, latest.c.id)
+        ).exists()
+        
+        result = db.session.execute(
+            insert(WalletBalanceSnapshot).from_select(
+                ['wallet_id', 'balance_type', 'transaction_id', 'snapshot_at', 'balance', 'created_at'],
+                select(
+                    latest.c.wallet_id,
+                    latest.c.balance_type,
+                    latest.c.id,
+                    latest.c.created_at,
+                    latest.c.balance_after,
+                    literal(datetime.utcnow(), db.DateTime)
+                ).where(latest.c.position == 1, ~covered)
+            )
         )
+        db.session.commit()
         
-        return True
+        return {'snapshots': result.rowcount}
     
     @staticmethod
-    def get_transaction_history(user_id, limit=50, offset=0, balance_type=None):
-        """Get transaction history for user"""
-        wallet = WalletService.get_or_create_wallet(user_id)
+    def adjust_balance(user_id, amount, balance_type='main', description=None, created_by=None, commit=True):
+        """Manual balance adjustment (admin only; may take the balance below zero)"""
+        amount = WalletService._amount(amount)
+        
+        return WalletService._post(
+            user_id, amount, balance_type, 'adjustment',
+            description=description or f"Manual adjustment: {amount}",
+            created_by=created_by,
+            allow_negative=True,
+            commit=commit
+        )
+    
+    @staticmethod
+    def post_batch(postings, allow_negative=False, commit=True):
+        """
+        Apply many postings atomically
         
-        query = Transaction.query.filter_by(wallet_id=wallet.id)
+        Postings are grouped per wallet and applied in order; all wallets
+        are locked (FOR UPDATE, in user_id order so concurrent batches
+        cannot deadlock), balances are computed with Decimal and written
+        with one bulk UPDATE, and one Transaction row per posting is bulk
+        inserted. Nothing is written if any posting would overdraw its
+        balance.
         
-        if balance_type:
-            query = query.filter_by(balance_type=balance_type)
+        Args:
+            postings: Posting tuples (or dicts with the same fields); amount
+                is signed and type defaults to deposit/withdrawal by sign
+            allow_negative: Permit balances below zero
+            commit: Commit when done (False to join the caller's transaction)
+        
+        Returns:
+            dict: postings, wallets, credited and debited totals
+        
+        Raises:
+            ValueError: Invalid amount/balance type, or insufficient balance
+        """
+        postings = [
+            posting if isinstance(posting, Posting) else Posting(**posting)
+            for posting in postings
+        ]
+        stats = {'postings': len(postings), 'wallets': 0, 'credited': Decimal('0'), 'debited': Decimal('0')}
+        if not postings:
+            return stats
+        
+        for posting in postings:
+            if posting.balance_type not in BALANCE_TYPES:
+                raise ValueError(f"Invalid balance type: {posting.balance_type}")
+        amounts = [WalletService._amount(posting.amount) for posting in postings]
+        
+        user_ids = sorted({posting.user_id for posting in postings})
+        WalletService._ensure_wallets(user_ids)
         
-        transactions = query.order_by(Transaction.created_at.desc())\
-                           .limit(limit)\
-                           .offset(offset)\
-                           .all()
+        balance_columns = [getattr(Wallet, f'{balance_type}_balance') for balance_type in BALANCE_TYPES]
+        wallets = {}
+        for start in range(0, len(user_ids), LOCK_CHUNK_SIZE):
+            chunk = user_ids[start:start + LOCK_CHUNK_SIZE]
+            for row in db.session.execute(
+                select(Wallet.id, Wallet.user_id, *balance_columns).where(
+                    Wallet.user_id.in_(chunk)
+                ).order_by(Wallet.user_id).with_for_update()
+            ):
+                wallets[row.user_id] = {
+                    'id': row.id,
+                    **{f'{balance_type}_balance': getattr(row, f'{balance_type}_balance') for balance_type in BALANCE_TYPES}
+                }
         
-        return transactions
+        now = datetime.utcnow()
+        transactions = []
+        for posting, amount in zip(postings, amounts):
+            wallet = wallets[posting.user_id]
+            key = f'{posting.balance_type}_balance'
+            balance_before = wallet[key]
+            balance_after = balance_before + amount
+            if balance_after < 0 and not allow_negative:
+                raise ValueError(f"Insufficient {posting.balance_type} balance for user {posting.user_id}")
+            wallet[key] = balance_after
+            
+            if amount >= 0:
+                stats['credited'] += amount
+            else:
+                stats['debited'] -= amount
+            transactions.append({
+                'wallet_id': wallet['id'],
+                'type': posting.type or ('deposit' if amount >= 0 else 'withdrawal'),
+                'amount': abs(amount),
+                'balance_type': posting.balance_type,
+                'balance_before': balance_before,
+                'balance_after': balance_after,
+                'reference_type': posting.reference_type,
+                'reference_id': posting.reference_id,
+                'description': posting.description,
+                'created_by': posting.created_by,
+                'created_at': now,
+                'updated_at': now
+            })
+        
+        db.session.execute(
+            update(Wallet),
+            [{**wallet, 'last_transaction_at': now, 'updated_at': now} for wallet in wallets.values()]
+        )
+        db.session.execute(insert(Transaction), transactions)
+        
+        if commit:
+            db.session.commit()
+        
+        stats['wallets'] = len(wallets)
+        return stats
     
     @staticmethod
-    def adjust_balance(user_id, amount, balance_type='main', description=None, created_by=None):
-        """Manual balance adjustment (admin only)"""
-        wallet = WalletService.get_or_create_wallet(user_id)
+    def _post(user_id, delta, balance_type, transaction_type, description=None, reference_type=None,
+              reference_id=None, created_by=None, allow_negative=False, commit=True):
+        """
+        Apply one signed posting with a single atomic UPDATE ... RETURNING
         
-        # Get current balance
-        if balance_type == 'main':
-            balance_before = float(wallet.main_balance)
-            wallet.main_balance = Decimal(str(balance_before + amount))
-        elif balance_type == 'commission':
-            balance_before = float(wallet.commission_balance)
-            wallet.commission_balance = Decimal(str(balance_before + amount))
-        elif balance_type == 'bonus':
-            balance_before = float(wallet.bonus_balance)
-            wallet.bonus_balance = Decimal(str(balance_before + amount))
-        else:
+        Returns:
+            (wallet, transaction)
+        """
+        if balance_type not in BALANCE_TYPES:
             raise ValueError(f"Invalid balance type: {balance_type}")
         
-        balance_after = balance_before + amount
+        column = getattr(Wallet, f'{balance_type}_balance')
+        now = datetime.utcnow()
+        
+        statement = update(Wallet).where(Wallet.user_id == user_id)
+        if delta < 0 and not allow_negative:
+            # Overdraft check and write are one statement, under the row lock
+            statement = statement.where(column >= -delta)
+        statement = statement.values({
+            column: column + delta,
+            Wallet.last_transaction_at: now
+        }).returning(Wallet.id, column)
+        
+        row = db.session.execute(statement, execution_options={'synchronize_session': False}).first()
+        if row is None:
+            if not db.session.execute(select(Wallet.id).where(Wallet.user_id == user_id)).first():
+                WalletService._ensure_wallets([user_id])
+                return WalletService._post(
+                    user_id, delta, balance_type, transaction_type, description, reference_type,
+                    reference_id, created_by, allow_negative, commit
+                )
+            raise ValueError(f"Insufficient {balance_type} balance")
         
-        # Create transaction record
+        wallet_id, balance_after = row
         transaction = Transaction(
-            wallet_id=wallet.id,
-            type='adjustment',
-            amount=Decimal(str(abs(amount))),
+            wallet_id=wallet_id,
+            type=transaction_type,
+            amount=abs(delta),
             balance_type=balance_type,
-            balance_before=Decimal(str(balance_before)),
-            balance_after=Decimal(str(balance_after)),
-            description=description or f"Manual adjustment: {amount}",
+            balance_before=balance_after - delta,
+            balance_after=balance_after,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            description=description,
             created_by=created_by
         )
+        db.session.add(transaction)
         
-        wallet.last_transaction_at = datetime.utcnow()
+        # The UPDATE bypassed the identity map; reload so callers see the new balance
+        wallet = db.session.get(Wallet, wallet_id, populate_existing=True)
         
-        db.session.add(transaction)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         
         return wallet, transaction
-
+    
+    @staticmethod
+    def _wallet_id(user_id):
+        """Wallet id for a user, or None (read-only, unlike get_or_create_wallet)"""
+        return db.session.execute(select(Wallet.id).where(Wallet.user_id == user_id)).scalar()
+    
+    @staticmethod
+    def _balance_before(wallet_id, balance_type, as_of):
+        """Nearest snapshot before as_of plus the ledger rows after it"""
+        snapshot = WalletBalanceSnapshot.query.filter(
+            WalletBalanceSnapshot.wallet_id == wallet_id,
+            WalletBalanceSnapshot.balance_type == balance_type,
+            WalletBalanceSnapshot.snapshot_at < as_of
+        ).order_by(
+            WalletBalanceSnapshot.snapshot_at.desc(),
+            WalletBalanceSnapshot.transaction_id.desc()
+        ).first()
+        
+        query = select(
+            func.coalesce(func.sum(Transaction.balance_after - Transaction.balance_before), 0)
+        ).where(
+            Transaction.wallet_id == wallet_id,
+            Transaction.balance_type == balance_type,
+            Transaction.created_at < as_of
+        )
+        balance = Decimal('0.00')
+        if snapshot is not None:
+            balance = snapshot.balance
+            query = query.where(
+                tuple_(Transaction.created_at, Transaction.id) > (snapshot.snapshot_at, snapshot.transaction_id)
+            )
+        
+        return (balance + Decimal(db.session.execute(query).scalar())).quantize(CENT)
+    
+    @staticmethod
+    def _ensure_wallets(user_ids):
+        """Create missing wallets (concurrency-safe; caller commits)"""
+        db.session.execute(
+            pg_insert(Wallet).values([
+                {'user_id': user_id, 'main_balance': 0, 'commission_balance': 0, 'bonus_balance': 0}
+                for user_id in user_ids
+            ]).on_conflict_do_nothing(index_elements=['user_id'])
+        )
+    
+    @staticmethod
+    def _amount(value):
+        """Exact Decimal rounded to cents (floats go through their repr, not their binary value)"""
+        try:
+            amount = value if isinstance(value, Decimal) else Decimal(str(value))
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Invalid amount: {value}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {value}")
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
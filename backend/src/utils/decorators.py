@@ -5,6 +5,7 @@ from src.models import User
 from src.services.auth_service import AuthService
 from src.constants.roles import Roles
 from src.utils.hierarchy_scoping import set_request_hierarchy_scope
+from src.utils.principal import load_current_user
 from src.database import db
 
 
@@ -34,9 +35,9 @@ def token_required(f):
         if not payload:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        # Get user
-        current_user = User.query.get(payload['user_id'])
-        if not current_user or not current_user.is_active:
+        # Get user (cached principal, full row loaded lazily)
+        current_user = load_current_user(payload['user_id'])
+        if not current_user:
             return jsonify({'error': 'User not found or inactive'}), 401
         
         # Store user in g
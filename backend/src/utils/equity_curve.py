@@ -0,0 +1,106 @@
+"""
+Vectorized equity curve evaluation
+
+Pure NumPy, no app or database imports, so it can run inside
+ProcessPoolExecutor workers. All loss limits are percentages of the
+initial balance, matching TradingProgram's rule columns.
+"""
+import numpy as np
+
+
+def evaluate_equity_curve(initial_balance, close_days, pnl, rules):
+    """
+    Rebuild the equity curve from closed trades and check the program rules
+
+    Args:
+        initial_balance: Starting balance of the phase
+        close_days: numpy datetime64[D] array of trade close days, ascending
+        pnl: numpy float array of net P&L per trade, same order
+        rules: Dict with profit_target, max_daily_loss, max_total_loss
+            (percentages, None = no limit) and min_trading_days
+
+    Returns:
+        Dictionary of metrics and rule outcomes
+    """
+    initial_balance = float(initial_balance)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    trade_count = len(pnl)
+
+    if trade_count:
+        equity = initial_balance + np.cumsum(pnl)
+        peak = np.maximum(np.maximum.accumulate(equity), initial_balance)
+        drawdown = peak - equity
+        max_drawdown = float(drawdown.max())
+
+        # First trade of each day; trades are sorted so day changes are the boundaries
+        day_starts = np.concatenate(([0], np.flatnonzero(close_days[1:] != close_days[:-1]) + 1))
+        equity_before = np.concatenate(([initial_balance], equity[:-1]))
+        day_open = equity_before[day_starts]
+        day_low = np.minimum.reduceat(equity, day_starts)
+        day_loss = day_open - day_low
+        worst_day_index = int(day_loss.argmax())
+        max_daily_loss = max(float(day_loss[worst_day_index]), 0.0)
+        worst_day = str(close_days[day_starts[worst_day_index]]) if max_daily_loss > 0 else None
+
+        trading_days = len(day_starts)
+        final_balance = float(equity[-1])
+        gross_profit = float(pnl[pnl > 0].sum())
+        gross_loss = float(-pnl[pnl < 0].sum())
+    else:
+        max_drawdown = max_daily_loss = gross_profit = gross_loss = 0.0
+        worst_day = None
+        trading_days = 0
+        final_balance = initial_balance
+
+    def percent(amount):
+        return amount / initial_balance * 100 if initial_balance else 0.0
+
+    net_profit = final_balance - initial_balance
+    profit_percentage = percent(net_profit)
+    max_drawdown_percentage = percent(max_drawdown)
+    max_daily_loss_percentage = percent(max_daily_loss)
+
+    profit_target = rules.get('profit_target')
+    max_daily_loss_limit = rules.get('max_daily_loss')
+    max_total_loss_limit = rules.get('max_total_loss')
+    min_trading_days = rules.get('min_trading_days') or 0
+
+    profit_target_met = profit_target is not None and profit_percentage >= float(profit_target)
+    days_requirement_met = trading_days >= min_trading_days
+    daily_loss_violated = max_daily_loss_limit is not None and max_daily_loss_percentage > float(max_daily_loss_limit)
+    drawdown_violated = max_total_loss_limit is not None and max_drawdown_percentage > float(max_total_loss_limit)
+
+    if daily_loss_violated or drawdown_violated:
+        outcome = 'failed'
+    elif profit_target_met and days_requirement_met:
+        outcome = 'passed'
+    else:
+        outcome = 'in_progress'
+
+    return {
+        'trade_count': trade_count,
+        'trading_days': trading_days,
+        'final_balance': round(final_balance, 2),
+        'net_profit': round(net_profit, 2),
+        'profit_percentage': round(profit_percentage, 2),
+        'gross_profit': round(gross_profit, 2),
+        'gross_loss': round(gross_loss, 2),
+        'max_drawdown': round(max_drawdown, 2),
+        'max_drawdown_percentage': round(max_drawdown_percentage, 2),
+        'max_daily_loss': round(max_daily_loss, 2),
+        'max_daily_loss_percentage': round(max_daily_loss_percentage, 2),
+        'worst_day': worst_day,
+        'profit_target_met': bool(profit_target_met),
+        'days_requirement_met': bool(days_requirement_met),
+        'daily_loss_violated': bool(daily_loss_violated),
+        'drawdown_violated': bool(drawdown_violated),
+        'outcome': outcome
+    }
+
+
+def evaluate_job(job):
+    """ProcessPoolExecutor entry point: (challenge_id, initial_balance, close_days, pnl, rules)"""
+    challenge_id, initial_balance, close_days, pnl, rules = job
+    result = evaluate_equity_curve(initial_balance, close_days, pnl, rules)
+    result['challenge_id'] = challenge_id
+    return result
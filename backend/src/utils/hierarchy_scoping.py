@@ -16,7 +16,186 @@ Date: October 25, 2025
 
 from sqlalchemy import event, inspect
 from sqlalchemy.orm import with_loader_criteria
-from flask import g, has_request_context
+from flask import g, has_request_context, current_app
+from src.database import get_redis
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Redis keys for the cross-request descendant cache. Every hierarchy change
+# bumps the generation, which orphans all cached sets at once.
+SCOPE_GENERATION_KEY = 'hierarchy:generation'
+SCOPE_DESCENDANTS_KEY = 'hierarchy:descendants:{generation}:{user_id}'
+LARGE_DOWNLINE_MARKER = 'large'
+
+
+class _ScopeData:
+    """Snapshot of the scoping user, built once per request"""
+    
+    __slots__ = ('id', 'tree_path', 'role', 'descendant_ids')
+    
+    def __init__(self, user_id, tree_path, role, descendant_ids=None):
+        self.id = user_id
+        self.tree_path = tree_path
+        self.role = role
+        # Tuple of downline ids (incl. self), or None for large downlines
+        self.descendant_ids = descendant_ids
+
+
+class _ScopeStats:
+    """Process-wide counters for how often scoping ran and what it cost"""
+    
+    COUNTERS = (
+        'statements_scoped',
+        'filters_built',
+        'filter_cache_hits',
+        'descendant_loads',
+        'descendant_cache_hits',
+        'large_downline_fallbacks',
+    )
+    TIMERS = ('scope_seconds', 'descendant_load_seconds')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self.COUNTERS, 0)
+            self._values.update(dict.fromkeys(self.TIMERS, 0.0))
+    
+    def add(self, name, amount=1):
+        with self._lock:
+            self._values[name] += amount
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+_scope_stats = _ScopeStats()
+
+
+def get_hierarchy_scope_stats():
+    """
+    Get hierarchy scoping counters for this process
+    
+    Returns:
+        dict of counters and cumulative timings (seconds)
+    """
+    return _scope_stats.snapshot()
+
+
+def scope_user_ids(scope):
+    """
+    Return what a scoped user_id column should be IN
+    
+    Uses the request's precomputed descendant set when it is small enough to
+    inline, otherwise the indexed closure-table subquery.
+    
+    Args:
+        scope: _ScopeData or a User
+        
+    Returns:
+        Tuple of ids or a SELECT of ids
+    """
+    from src.models.user_closure import UserClosure
+    
+    descendant_ids = getattr(scope, 'descendant_ids', None)
+    if descendant_ids is not None:
+        return descendant_ids
+    return UserClosure.descendant_ids(scope.id)
+
+
+def mark_hierarchy_changed(session):
+    """
+    Flag the session so cached descendant sets are invalidated on commit.
+    Called by the closure-table maintenance hooks.
+    """
+    if session is not None:
+        session.info['hierarchy_changed'] = True
+
+
+def bump_hierarchy_generation():
+    """Invalidate every cached descendant set (this request's and Redis')"""
+    if has_request_context():
+        g.pop('hierarchy_scope_data', None)
+        g.pop('hierarchy_scope_filters', None)
+    
+    redis = get_redis()
+    if redis:
+        try:
+            redis.incr(SCOPE_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f'Failed to bump hierarchy scope generation: {e}')
+
+
+def _load_descendant_ids(session, user_id):
+    """
+    Load the caller's downline ids once, via Redis when available
+    
+    Returns:
+        Tuple of ids, or None if the downline exceeds HIERARCHY_SCOPE_INLINE_MAX_IDS
+    """
+    from src.models.user_closure import UserClosure
+    
+    redis = get_redis()
+    cache_key = None
+    if redis:
+        try:
+            generation = redis.get(SCOPE_GENERATION_KEY) or '0'
+            cache_key = SCOPE_DESCENDANTS_KEY.format(generation=generation, user_id=user_id)
+            cached = redis.get(cache_key)
+            if cached is not None:
+                _scope_stats.add('descendant_cache_hits')
+                return None if cached == LARGE_DOWNLINE_MARKER else tuple(json.loads(cached))
+        except Exception as e:
+            logger.warning(f'Hierarchy scope cache unavailable: {e}')
+            cache_key = None
+    
+    limit = current_app.config.get('HIERARCHY_SCOPE_INLINE_MAX_IDS', 1000)
+    started = time.perf_counter()
+    ids = session.execute(
+        UserClosure.descendant_ids(user_id).limit(limit + 1),
+        execution_options={'skip_hierarchy_scope': True}
+    ).scalars().all()
+    _scope_stats.add('descendant_loads')
+    _scope_stats.add('descendant_load_seconds', time.perf_counter() - started)
+    
+    descendant_ids = tuple(ids) if len(ids) <= limit else None
+    if descendant_ids is None:
+        _scope_stats.add('large_downline_fallbacks')
+    
+    if cache_key:
+        try:
+            redis.setex(
+                cache_key,
+                current_app.config.get('HIERARCHY_SCOPE_CACHE_TTL', 300),
+                LARGE_DOWNLINE_MARKER if descendant_ids is None else json.dumps(descendant_ids)
+            )
+        except Exception as e:
+            logger.warning(f'Failed to cache hierarchy scope: {e}')
+    
+    return descendant_ids
+
+
+def _get_request_scope(session):
+    """Build (once per request) the scope snapshot used by every statement"""
+    scope = g.get('hierarchy_scope_data')
+    if scope is None:
+        user_id = g.get('hierarchy_scope_user_id')
+        scope = _ScopeData(
+            user_id,
+            g.hierarchy_scope_tree_path,
+            g.hierarchy_scope_role,
+            _load_descendant_ids(session, user_id) if user_id is not None else None
+        )
+        g.hierarchy_scope_data = scope
+        g.hierarchy_scope_filters = {}
+    return scope
 
 
 class HierarchyScopedMixin:
@@ -51,8 +230,6 @@ class HierarchyScopedMixin:
         Returns:
             SQLAlchemy filter condition or None (if supermaster)
         """
-        from src.models.user import User
-        
         # Supermaster sees everything
         if current_user.role == 'supermaster':
             return None
@@ -60,12 +237,9 @@ class HierarchyScopedMixin:
         # Get FK column name
         fk_col = getattr(cls, cls.__hierarchy_user_fk__)
         
-        # Filter: user_id IN (SELECT id FROM users WHERE tree_path LIKE 'current_user_path%')
-        return fk_col.in_(
-            User.query.filter(
-                User.tree_path.like(f"{current_user.tree_path}%")
-            ).with_entities(User.id)
-        )
+        # Filter: user_id IN (precomputed downline ids), or for large downlines
+        # user_id IN (SELECT descendant_id FROM user_closure WHERE ancestor_id = :id)
+        return fk_col.in_(scope_user_ids(current_user))
 
 
 def set_request_hierarchy_scope(session, current_user):
@@ -86,11 +260,53 @@ def set_request_hierarchy_scope(session, current_user):
     """
     if has_request_context():
         g.hierarchy_scope_user = current_user
+        g.hierarchy_scope_user_id = getattr(current_user, 'id', None)
         # Store user data to avoid accessing current_user object in Event Hook
         g.hierarchy_scope_role = getattr(current_user, 'role', None)
         g.hierarchy_scope_tree_path = getattr(current_user, 'tree_path', None)
         g.hierarchy_scope_parent_id = getattr(current_user, 'parent_id', None)
         g.hierarchy_scope_enabled = True
+        # Drop any memoized scope from a previous principal
+        g.pop('hierarchy_scope_data', None)
+        g.pop('hierarchy_scope_filters', None)
+
+
+def hierarchy_filter(session, model):
+    """
+    The condition the scoping hook would add for model in this request.
+    
+    For statements the hook cannot see through (e.g. aggregate-only
+    selects), which then apply it themselves and run with
+    skip_hierarchy_scope.
+    
+    Args:
+        session: SQLAlchemy session
+        model: Model class with HierarchyScopedMixin
+        
+    Returns:
+        SQLAlchemy filter condition, or None if queries are unscoped
+    """
+    if not is_hierarchy_scope_active():
+        return None
+    
+    scope = _get_request_scope(session)
+    filters = g.hierarchy_scope_filters
+    if model not in filters:
+        _scope_stats.add('filters_built')
+        filters[model] = model.hierarchy_filter_for_entity(scope)
+    return filters[model]
+
+
+def hierarchy_scope_key():
+    """
+    Cache key part identifying whose data this request sees
+    
+    Returns:
+        'all' when unscoped, otherwise role and tree_path of the scoping user
+    """
+    if not is_hierarchy_scope_active():
+        return 'all'
+    return f'{g.hierarchy_scope_role}:{g.hierarchy_scope_tree_path}'
 
 
 def without_hierarchy_scope(session):
@@ -122,6 +338,35 @@ def without_hierarchy_scope(session):
     return _ScopeDisabler()
 
 
+def is_hierarchy_scope_active():
+    """
+    Check whether queries in the current request are hierarchy-filtered.
+    
+    Returns:
+        bool: False outside requests, when scoping is disabled, or for the
+        ROOT supermaster (who sees everything); True otherwise
+    """
+    if not has_request_context():
+        return False
+    
+    if not getattr(g, 'hierarchy_scope_enabled', False):
+        return False
+    
+    role_value = getattr(g, 'hierarchy_scope_role', None)
+    tree_path = getattr(g, 'hierarchy_scope_tree_path', None)
+    parent_id = getattr(g, 'hierarchy_scope_parent_id', None)
+    
+    if not role_value or not tree_path:
+        return False
+    
+    # ROOT supermaster (parent_id=None) sees everything
+    # Created supermasters (parent_id != None) are filtered like others
+    if role_value == 'supermaster' and parent_id is None:
+        return False
+    
+    return True
+
+
 def init_hierarchy_scoping(db, user_model):
     """
     Initialize the hierarchy scoping system.
@@ -154,25 +399,8 @@ def init_hierarchy_scoping(db, user_model):
         This is the MAGIC that makes everything work!
         """
         
-        # Skip if not in request context
-        if not has_request_context():
-            return
-        
-        # Skip if scoping is disabled
-        if not getattr(g, 'hierarchy_scope_enabled', False):
-            return
-        
-        # Skip if no current user data
-        role_value = getattr(g, 'hierarchy_scope_role', None)
-        tree_path = getattr(g, 'hierarchy_scope_tree_path', None)
-        parent_id = getattr(g, 'hierarchy_scope_parent_id', None)
-        
-        if not role_value or not tree_path:
-            return
-        
-        # Skip if ROOT supermaster (parent_id=None) - sees everything
-        # Created supermasters (parent_id != None) are filtered like others
-        if role_value == 'supermaster' and parent_id is None:
+        # Skip outside requests, when disabled, or for the ROOT supermaster
+        if not is_hierarchy_scope_active():
             return
         
         # Skip if explicitly bypassed
@@ -183,6 +411,10 @@ def init_hierarchy_scoping(db, user_model):
         if not hasattr(execute_state.statement, 'column_descriptions'):
             return
         
+        started = time.perf_counter()
+        scope = None
+        scoped = False
+        
         # Apply filtering to each entity in the query
         for entity in execute_state.statement.column_descriptions:
             model = entity.get('entity')
@@ -194,17 +426,21 @@ def init_hierarchy_scoping(db, user_model):
             if not issubclass(model, HierarchyScopedMixin):
                 continue
             
-            # Get the filter for this model
-            # Create a simple object with tree_path and role to avoid accessing current_user
-            class _ScopeData:
-                def __init__(self, tree_path, role):
-                    self.tree_path = tree_path
-                    self.role = role
+            # The scope (and its descendant set) is built once per request,
+            # and each model's filter once per request on top of it
+            if scope is None:
+                scope = _get_request_scope(execute_state.session)
             
-            scope_data = _ScopeData(tree_path, role_value)
-            filter_condition = model.hierarchy_filter_for_entity(scope_data)
+            filters = g.hierarchy_scope_filters
+            if model in filters:
+                _scope_stats.add('filter_cache_hits')
+                filter_condition = filters[model]
+            else:
+                _scope_stats.add('filters_built')
+                filter_condition = filters[model] = model.hierarchy_filter_for_entity(scope)
             
             if filter_condition is not None:
+                scoped = True
                 # Apply the filter using with_loader_criteria
                 execute_state.statement = execute_state.statement.options(
                     with_loader_criteria(
@@ -213,6 +449,20 @@ def init_hierarchy_scoping(db, user_model):
                         include_aliases=True
                     )
                 )
+        
+        if scoped:
+            _scope_stats.add('statements_scoped')
+            _scope_stats.add('scope_seconds', time.perf_counter() - started)
+    
+    @event.listens_for(db.session, "after_commit")
+    def _invalidate_hierarchy_scope(session):
+        """Drop cached descendant sets once a hierarchy change is committed"""
+        if session.info.pop('hierarchy_changed', False):
+            bump_hierarchy_generation()
+    
+    @event.listens_for(db.session, "after_rollback")
+    def _discard_hierarchy_change(session):
+        session.info.pop('hierarchy_changed', None)
 
 
 # Utility function for explicit bypass using execution_options
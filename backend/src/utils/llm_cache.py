@@ -0,0 +1,219 @@
+"""
+Response cache and request coalescing for LLM completions
+
+Completions are cached under a key built from the model, the sampling
+parameters and the messages with their text normalized (case, whitespace,
+trailing punctuation), so "What is the payout split?" and "what is the
+payout split" share one answer. Entries live in Redis with a TTL; an
+openai:cache:lru sorted set records their last use and, past
+OPENAI_CACHE_MAX_ENTRIES, the least recently used entries are evicted.
+Without Redis a per-process LRU dict is used instead.
+
+Identical requests are coalesced: within a process followers wait on the
+leader's future, and across workers the leader holds a short Redis lock
+while followers poll for its cached result, so a burst of the same FAQ
+question makes one upstream call. Followers wait at most
+OPENAI_COALESCE_WAIT and then get CoalesceTimeout (answered as busy), so
+a slow completion holds one request thread, not one per duplicate.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from flask import current_app
+from src.database import get_redis
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ENTRY_KEY = 'openai:cache:{key}'
+LOCK_KEY = 'openai:cache:lock:{key}'
+LRU_KEY = 'openai:cache:lru'
+POLL_INTERVAL = 0.1  # seconds between followers' cache checks
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+
+class CoalesceTimeout(Exception):
+    """An identical request is still computing the value after OPENAI_COALESCE_WAIT"""
+
+
+_local = OrderedDict()  # key -> (expires_at, value), without Redis
+_local_lock = threading.Lock()
+_inflight = {}  # key -> Future of the in-process leader
+_inflight_lock = threading.Lock()
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of a prompt"""
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', str(text)).strip().lower())
+
+
+def cache_key(messages, model, **params):
+    """Stable key for a completion request"""
+    payload = {
+        'model': model,
+        'params': params,
+        'messages': [(message['role'], normalize_text(message['content'])) for message in messages]
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_cached(key):
+    """Cached value for key, or None (refreshes its LRU position)"""
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            entry = _local.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                _local.pop(key, None)
+                return None
+            _local.move_to_end(key)
+            return entry[1]
+
+    try:
+        raw = redis.get(ENTRY_KEY.format(key=key))
+        if raw is None:
+            return None
+        redis.zadd(LRU_KEY, {key: time.time()})
+        return json.loads(raw)
+    except Exception as e:
+        logger.warning(f'LLM cache read failed: {e}')
+        return None
+
+
+def store(key, value):
+    """Cache a JSON-serializable value and evict beyond the size bound"""
+    ttl = current_app.config.get('OPENAI_CACHE_TTL', 86400)
+    max_entries = current_app.config.get('OPENAI_CACHE_MAX_ENTRIES', 10000)
+
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local[key] = (time.monotonic() + ttl, value)
+            _local.move_to_end(key)
+            while len(_local) > max_entries:
+                _local.popitem(last=False)
+        return
+
+    try:
+        now = time.time()
+        pipe = redis.pipeline()
+        pipe.set(ENTRY_KEY.format(key=key), json.dumps(value), ex=ttl)
+        pipe.zadd(LRU_KEY, {key: now})
+        # Members whose entries have expired anyway
+        pipe.zremrangebyscore(LRU_KEY, '-inf', now - ttl)
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+
+        if size > max_entries:
+            evicted = [member for member, _score in redis.zpopmin(LRU_KEY, size - max_entries)]
+            if evicted:
+                redis.delete(*(ENTRY_KEY.format(key=member) for member in evicted))
+    except Exception as e:
+        logger.warning(f'LLM cache write failed: {e}')
+
+
+def clear():
+    """Drop every cached response"""
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local.clear()
+        return 0
+
+    keys = [ENTRY_KEY.format(key=member) for member in redis.zrange(LRU_KEY, 0, -1)]
+    for start in range(0, len(keys), 500):
+        redis.delete(*keys[start:start + 500])
+    redis.delete(LRU_KEY)
+    return len(keys)
+
+
+def cached_call(key, compute, cacheable=lambda value: True):
+    """
+    Return the cached value for key, or compute it once for all concurrent callers
+
+    Args:
+        key: cache_key(...)
+        compute: Zero-argument function producing the value
+        cacheable: Predicate deciding whether a computed value is stored
+
+    Returns:
+        (value, cached) where cached is False only for the caller that computed it
+
+    Raises:
+        CoalesceTimeout: Another caller is computing key and did not finish in time
+    """
+    value = get_cached(key)
+    if value is not None:
+        return value, True
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        try:
+            return future.result(timeout=current_app.config.get('OPENAI_COALESCE_WAIT', 3)), True
+        except FutureTimeoutError:
+            raise CoalesceTimeout(key)
+
+    try:
+        value, cached = _compute_once(key, compute, cacheable)
+        future.set_result(value)
+        return value, cached
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _compute_once(key, compute, cacheable):
+    """Compute under the cross-worker lock, or wait for the worker that holds it"""
+    redis = get_redis()
+    if redis is None:
+        value = compute()
+        if cacheable(value):
+            store(key, value)
+        return value, False
+
+    lock_key = LOCK_KEY.format(key=key)
+    timeout = current_app.config.get('OPENAI_TIMEOUT', 30)
+    try:
+        acquired = redis.set(lock_key, '1', nx=True, ex=int(timeout) + 5)
+    except Exception as e:
+        logger.warning(f'LLM cache lock failed: {e}')
+        acquired = True
+
+    if not acquired:
+        deadline = time.monotonic() + current_app.config.get('OPENAI_COALESCE_WAIT', 3)
+        while True:
+            time.sleep(POLL_INTERVAL)
+            value = get_cached(key)
+            if value is not None:
+                return value, True
+            if not redis.exists(lock_key):
+                # The leader finished without caching (error); compute ourselves
+                break
+            if time.monotonic() >= deadline:
+                raise CoalesceTimeout(key)
+
+    try:
+        value = compute()
+        if cacheable(value):
+            store(key, value)
+        return value, False
+    finally:
+        if acquired:
+            try:
+                redis.delete(lock_key)
+            except Exception:
+                pass
@@ -1,9 +1,15 @@
 """
 Hierarchical permissions system
 Each role can see more data based on their position in the hierarchy
+
+Ancestry checks are a single primary-key probe of user_closure and scoped
+filters use the closure table as a subquery, so neither walks the tree in
+Python nor materializes id lists, whatever the size of the downline.
 """
+from src.database import db
 from src.models.user import User
-from sqlalchemy import or_, and_
+from src.models.user_closure import UserClosure
+from sqlalchemy import or_, and_, select, false
 
 
 class PermissionManager:
@@ -24,6 +30,46 @@ class PermissionManager:
         """Get numeric level for role"""
         return PermissionManager.ROLE_HIERARCHY.get(role, 999)
     
+    @staticmethod
+    def is_in_downline(user, target_id):
+        """Check if target_id is user or anyone below user (one closure-table lookup)"""
+        if user.id == target_id:
+            return True
+        
+        return db.session.execute(
+            select(UserClosure.depth).where(
+                UserClosure.ancestor_id == user.id,
+                UserClosure.descendant_id == target_id
+            )
+        ).first() is not None
+    
+    @staticmethod
+    def viewable_user_filter(user, column):
+        """
+        Condition restricting a user id column to the users this user can view
+        
+        Args:
+            user: The viewing user
+            column: Column holding a user id (e.g. Challenge.user_id)
+            
+        Returns:
+            SQLAlchemy condition, or None if nothing is filtered (admin)
+        """
+        # Admin sees all
+        if user.role == 'admin':
+            return None
+        
+        # Guest sees none
+        if user.role == 'guest':
+            return false()
+        
+        # Trader sees only self
+        if user.role == 'trader':
+            return column == user.id
+        
+        # Others see self + all downline
+        return column.in_(UserClosure.descendant_ids(user.id))
+    
     @staticmethod
     def can_view_user(viewer, target_user):
         """Check if viewer can see target_user's data"""
@@ -45,57 +91,29 @@ class PermissionManager:
             return viewer.id == target_user.id
         
         # Check if target is in viewer's downline
-        target_ancestors = target_user.get_ancestors()
-        return viewer in target_ancestors
+        return PermissionManager.is_in_downline(viewer, target_user.id)
     
     @staticmethod
     def get_viewable_user_ids(user):
-        """Get list of user IDs that this user can view"""
-        
-        # Admin sees all
-        if user.role == 'admin':
-            all_users = User.query.all()
-            return [u.id for u in all_users]
-        
-        # Guest sees none
-        if user.role == 'guest':
-            return []
-        
-        # Trader sees only self
-        if user.role == 'trader':
-            return [user.id]
-        
-        # Others see self + all downline
-        descendants = user.get_all_descendants()
-        viewable_ids = [user.id] + [d.id for d in descendants]
-        return viewable_ids
+        """
+        Get list of user IDs that this user can view
+        
+        Materializes the whole downline; filter queries with
+        viewable_user_filter instead.
+        """
+        condition = PermissionManager.viewable_user_filter(user, User.id)
+        query = select(User.id)
+        if condition is not None:
+            query = query.where(condition)
+        return list(db.session.execute(query).scalars())
     
     @staticmethod
     def get_viewable_users_query(user):
         """Get SQLAlchemy query for users this user can view"""
-        
-        # Admin sees all
-        if user.role == 'admin':
+        condition = PermissionManager.viewable_user_filter(user, User.id)
+        if condition is None:
             return User.query
-        
-        # Guest sees none
-        if user.role == 'guest':
-            return User.query.filter(User.id == -1)  # No results
-        
-        # Trader sees only self
-        if user.role == 'trader':
-            return User.query.filter(User.id == user.id)
-        
-        # Others see self + downline using tree_path
-        if user.tree_path:
-            return User.query.filter(
-                or_(
-                    User.id == user.id,
-                    User.tree_path.like(f"{user.tree_path}/%")
-                )
-            )
-        else:
-            return User.query.filter(User.id == user.id)
+        return User.query.filter(condition)
     
     @staticmethod
     def can_create_role(creator, target_role):
@@ -136,8 +154,7 @@ class PermissionManager:
             return editor.id == target_user.id
         
         # Can edit users in downline
-        target_ancestors = target_user.get_ancestors()
-        return editor in target_ancestors
+        return PermissionManager.is_in_downline(editor, target_user.id)
     
     @staticmethod
     def can_delete_user(deleter, target_user):
@@ -156,8 +173,7 @@ class PermissionManager:
             return False
         
         # Can delete users in downline
-        target_ancestors = target_user.get_ancestors()
-        return deleter in target_ancestors
+        return PermissionManager.is_in_downline(deleter, target_user.id)
     
     @staticmethod
     def get_data_scope(user):
@@ -189,9 +205,8 @@ class PermissionManager:
         if user.role == 'trader':
             return query.filter(Challenge.user_id == user.id)
         
-        # Others see challenges of viewable users
-        viewable_ids = PermissionManager.get_viewable_user_ids(user)
-        return query.filter(Challenge.user_id.in_(viewable_ids))
+        # Others see challenges of self + downline
+        return query.filter(Challenge.user_id.in_(UserClosure.descendant_ids(user.id)))
     
     @staticmethod
     def filter_payments_by_permission(user, query):
@@ -210,9 +225,8 @@ class PermissionManager:
         if user.role == 'trader':
             return query.filter(Payment.user_id == user.id)
         
-        # Others see payments of viewable users
-        viewable_ids = PermissionManager.get_viewable_user_ids(user)
-        return query.filter(Payment.user_id.in_(viewable_ids))
+        # Others see payments of self + downline
+        return query.filter(Payment.user_id.in_(UserClosure.descendant_ids(user.id)))
     
     @staticmethod
     def filter_withdrawals_by_permission(user, query):
@@ -231,9 +245,8 @@ class PermissionManager:
         if user.role == 'trader':
             return query.filter(Withdrawal.user_id == user.id)
         
-        # Others see withdrawals of viewable users
-        viewable_ids = PermissionManager.get_viewable_user_ids(user)
-        return query.filter(Withdrawal.user_id.in_(viewable_ids))
+        # Others see withdrawals of self + downline
+        return query.filter(Withdrawal.user_id.in_(UserClosure.descendant_ids(user.id)))
     
     @staticmethod
     def filter_leads_by_permission(user, query):
@@ -253,10 +266,9 @@ class PermissionManager:
             return query.filter(Lead.id == -1)
         
         # Others see leads assigned to them or their downline
-        viewable_ids = PermissionManager.get_viewable_user_ids(user)
         return query.filter(
             or_(
-                Lead.assigned_to.in_(viewable_ids),
+                Lead.assigned_to.in_(UserClosure.descendant_ids(user.id)),
                 Lead.assigned_to == None  # Unassigned leads
             )
         )
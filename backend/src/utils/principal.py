@@ -0,0 +1,218 @@
+"""
+Cached request principal
+
+jwt_required/token_required only need a handful of columns to authenticate
+a request and scope its queries. Those are kept as an immutable snapshot in
+a per-process LRU (short TTL) backed by Redis (longer TTL), so the users
+table is only hit on a cache miss. The full User row is loaded lazily, the
+first time a route touches anything outside the snapshot.
+
+Snapshots are invalidated explicitly when a user's role, activation,
+tenant or position in the tree changes.
+"""
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from src.database import db, get_redis
+from src.models.user import User
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_KEY = 'principal:{user_id}'
+
+# Columns that make up the snapshot; a change to any of them invalidates it
+PRINCIPAL_FIELDS = ('id', 'role', 'tree_path', 'parent_id', 'tenant_id', 'is_active')
+
+PrincipalSnapshot = namedtuple('PrincipalSnapshot', PRINCIPAL_FIELDS)
+
+
+class _LRUCache:
+    """Small thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_size=10000):
+        self._max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = _LRUCache()
+
+
+def _load_snapshot(user_id):
+    """Read the snapshot columns straight from the users table"""
+    row = db.session.query(
+        *(getattr(User, field) for field in PRINCIPAL_FIELDS)
+    ).filter(
+        User.id == user_id
+    ).execution_options(
+        skip_hierarchy_scope=True
+    ).first()
+    return PrincipalSnapshot(*row) if row else None
+
+
+def get_principal(user_id):
+    """
+    Get the principal snapshot for a user: local LRU, then Redis, then DB
+
+    Args:
+        user_id: User ID from the access token
+
+    Returns:
+        PrincipalSnapshot or None if the user does not exist
+    """
+    snapshot = _local_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+
+    redis = get_redis()
+    if redis:
+        try:
+            cached = redis.get(PRINCIPAL_KEY.format(user_id=user_id))
+            if cached:
+                snapshot = PrincipalSnapshot(**json.loads(cached))
+        except Exception as e:
+            logger.warning(f'Principal cache read failed: {e}')
+
+    if snapshot is None:
+        snapshot = _load_snapshot(user_id)
+        if snapshot is None:
+            return None
+        if redis:
+            try:
+                redis.setex(
+                    PRINCIPAL_KEY.format(user_id=user_id),
+                    current_app.config.get('PRINCIPAL_CACHE_TTL', 300),
+                    json.dumps(snapshot._asdict())
+                )
+            except Exception as e:
+                logger.warning(f'Principal cache write failed: {e}')
+
+    _local_cache.set(user_id, snapshot, current_app.config.get('PRINCIPAL_CACHE_LOCAL_TTL', 15))
+    return snapshot
+
+
+def invalidate_principal(*user_ids):
+    """
+    Drop cached snapshots (this process and Redis)
+
+    Call after bulk UPDATEs that bypass the ORM; ORM changes are picked up
+    automatically on commit.
+    """
+    redis = get_redis()
+    for user_id in user_ids:
+        _local_cache.delete(user_id)
+    if redis and user_ids:
+        try:
+            redis.delete(*(PRINCIPAL_KEY.format(user_id=user_id) for user_id in user_ids))
+        except Exception as e:
+            logger.warning(f'Principal cache invalidation failed: {e}')
+
+
+class CurrentUser:
+    """
+    Request principal stored in g.current_user
+
+    Snapshot fields are answered without touching the database; any other
+    attribute (read or write) transparently loads the full User once.
+    """
+
+    __slots__ = ('_snapshot', '_user')
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def user(self):
+        """The full User ORM object, loaded on first access"""
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self._snapshot.id))
+        return self._user
+
+    def __getattr__(self, name):
+        if name in PRINCIPAL_FIELDS:
+            # Prefer the live row once loaded so in-request edits are visible
+            if self._user is not None:
+                return getattr(self._user, name)
+            return getattr(self._snapshot, name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __repr__(self):
+        return f'<CurrentUser {self._snapshot.id}>'
+
+
+def load_current_user(user_id):
+    """
+    Resolve an authenticated user id into a request principal
+
+    Returns:
+        CurrentUser, or None if the user is missing or inactive
+    """
+    snapshot = get_principal(user_id)
+    if snapshot is None or not snapshot.is_active:
+        return None
+    return CurrentUser(snapshot)
+
+
+@event.listens_for(User, 'after_update')
+def _principal_after_update(mapper, connection, target):
+    """Queue invalidation when a snapshot column changes"""
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS if field != 'id'):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('principals_changed', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _principal_after_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('principals_changed', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _principal_after_commit(session):
+    changed = session.info.pop('principals_changed', None)
+    if changed:
+        invalidate_principal(*changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _principal_after_rollback(session):
+    session.info.pop('principals_changed', None)
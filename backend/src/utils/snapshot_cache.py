@@ -0,0 +1,155 @@
+"""
+Short-lived, single-flight snapshot cache
+
+For expensive read models that many requests ask for at once (e.g. the
+admin dashboard): a snapshot is served while it is younger than its TTL;
+once it is older, exactly one caller across all workers (the holder of a
+Redis lock) recomputes it while everyone else keeps getting the previous
+snapshot. Only when there is no snapshot at all do the other callers wait
+for the holder. Without Redis the same happens per process.
+"""
+from src.database import get_redis
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'snapshot:{key}'
+LOCK_KEY = 'snapshot:lock:{key}'
+LOCK_SECONDS = 30  # recompute time after which the lock is considered abandoned
+WAIT_SECONDS = 5  # how long callers without any snapshot wait for the holder
+POLL_INTERVAL = 0.05
+
+_local = {}  # key -> (computed_at, value, expires_at), without Redis
+_local_locks = set()
+_local_lock = threading.Lock()
+
+
+def get_snapshot(key, compute, ttl, keep=None):
+    """
+    Get a snapshot no older than ttl seconds, recomputing it single-flight
+
+    Args:
+        key: Snapshot name (including whatever scopes it)
+        compute: Zero-argument function returning a JSON-serializable value
+        ttl: Seconds a snapshot is fresh
+        keep: Seconds a stale snapshot may still be served while it is
+            recomputed (default 12 x ttl)
+
+    Returns:
+        The snapshot value
+    """
+    keep = keep or ttl * 12
+    entry = _read(key)
+    if entry is not None and time.time() - entry[0] < ttl:
+        return entry[1]
+
+    if _acquire(key):
+        try:
+            value = compute()
+            _write(key, value, keep)
+            return value
+        finally:
+            _release(key)
+
+    if entry is not None:
+        # Someone else is refreshing it
+        return entry[1]
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _read(key)
+        if entry is not None:
+            return entry[1]
+        if not _is_locked(key):
+            break
+    return compute()
+
+
+def invalidate_snapshot(key):
+    """Drop a snapshot so the next caller recomputes it"""
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local.pop(key, None)
+        return
+
+    try:
+        redis.delete(SNAPSHOT_KEY.format(key=key))
+    except Exception as e:
+        logger.warning(f'Snapshot invalidation failed for {key}: {e}')
+
+
+def _read(key):
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            entry = _local.get(key)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0], entry[1]
+
+    try:
+        raw = redis.get(SNAPSHOT_KEY.format(key=key))
+        return tuple(json.loads(raw)) if raw is not None else None
+    except Exception as e:
+        logger.warning(f'Snapshot read failed for {key}: {e}')
+        return None
+
+
+def _write(key, value, keep):
+    now = time.time()
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local[key] = (now, value, now + keep)
+        return
+
+    try:
+        redis.set(SNAPSHOT_KEY.format(key=key), json.dumps([now, value]), ex=max(1, int(keep)))
+    except Exception as e:
+        logger.warning(f'Snapshot write failed for {key}: {e}')
+
+
+def _acquire(key):
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            if key in _local_locks:
+                return False
+            _local_locks.add(key)
+            return True
+
+    try:
+        return bool(redis.set(LOCK_KEY.format(key=key), '1', nx=True, ex=LOCK_SECONDS))
+    except Exception as e:
+        logger.warning(f'Snapshot lock failed for {key}: {e}')
+        return True
+
+
+def _release(key):
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            _local_locks.discard(key)
+        return
+
+    try:
+        redis.delete(LOCK_KEY.format(key=key))
+    except Exception as e:
+        logger.warning(f'Snapshot unlock failed for {key}: {e}')
+
+
+def _is_locked(key):
+    redis = get_redis()
+    if redis is None:
+        with _local_lock:
+            return key in _local_locks
+
+    try:
+        return bool(redis.exists(LOCK_KEY.format(key=key)))
+    except Exception:
+        return False
@@ -0,0 +1,152 @@
+"""
+In-process tenant resolution cache
+
+Active tenants are few and rarely change, so each worker keeps an immutable
+snapshot of them (by id, subdomain and custom domain) and tenant_middleware
+resolves every request with dict lookups. The snapshot is rebuilt when its
+TTL expires or when any worker commits a tenant change, which is broadcast
+over a Redis pub/sub channel so all gunicorn workers drop it together.
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from src.database import db, get_redis
+from src.models.tenant import Tenant
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'tenants:invalidate'
+DEFAULT_SUBDOMAIN = 'main'
+
+
+class TenantSnapshot:
+    """Immutable lookup tables of the active tenants"""
+
+    __slots__ = ('by_id', 'by_domain', 'by_subdomain', 'default_id', 'expires_at')
+
+    def __init__(self, rows, ttl):
+        self.by_id = {row.id: row for row in rows}
+        self.by_domain = {row.custom_domain.lower(): row.id for row in rows if row.custom_domain}
+        self.by_subdomain = {row.subdomain.lower(): row.id for row in rows}
+        # Fallback order of the old middleware: the 'main' tenant, then any active tenant
+        self.default_id = self.by_subdomain.get(DEFAULT_SUBDOMAIN, min(self.by_id) if self.by_id else None)
+        self.expires_at = time.monotonic() + ttl
+
+
+_snapshot = None
+_lock = threading.Lock()
+_listener_pid = None
+
+
+def get_tenant_snapshot():
+    """
+    Get the current tenant snapshot, rebuilding it if expired or invalidated
+
+    Returns:
+        TenantSnapshot
+    """
+    global _snapshot
+    _ensure_listener()
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.expires_at > time.monotonic():
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.expires_at <= time.monotonic():
+            rows = db.session.query(
+                Tenant.id, Tenant.subdomain, Tenant.custom_domain
+            ).filter(
+                Tenant.status == 'active'
+            ).all()
+            snapshot = TenantSnapshot(rows, current_app.config.get('TENANT_CACHE_TTL', 60))
+            _snapshot = snapshot
+    return snapshot
+
+
+def warm_tenant_cache(app):
+    """Load the snapshot at startup so the first request doesn't pay for it"""
+    with app.app_context():
+        try:
+            snapshot = get_tenant_snapshot()
+            logger.info(f'Tenant cache warmed: {len(snapshot.by_id)} active tenant(s)')
+        except Exception as e:
+            # Tables may not exist yet (fresh database, migrations pending)
+            db.session.rollback()
+            logger.warning(f'Tenant cache warm-up skipped: {e}')
+
+
+def invalidate_tenant_cache(broadcast=True):
+    """
+    Drop the snapshot in this worker and, by default, in every other worker
+
+    Args:
+        broadcast: Publish the invalidation on the Redis channel
+    """
+    global _snapshot
+    _snapshot = None
+
+    redis = get_redis()
+    if broadcast and redis:
+        try:
+            redis.publish(INVALIDATION_CHANNEL, '1')
+        except Exception as e:
+            logger.warning(f'Tenant cache invalidation publish failed: {e}')
+
+
+def _ensure_listener():
+    """Start the pub/sub listener once per process (workers are forked after app creation)"""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+
+    with _lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+        redis = get_redis()
+        if redis:
+            thread = threading.Thread(target=_listen, args=(redis,), name='tenant-cache-listener', daemon=True)
+            thread.start()
+
+
+def _listen(redis):
+    global _snapshot
+    while True:
+        try:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected
+            _snapshot = None
+            for _message in pubsub.listen():
+                _snapshot = None
+        except Exception as e:
+            logger.warning(f'Tenant cache listener error: {e}; reconnecting')
+            time.sleep(5)
+
+
+def _mark_tenants_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['tenants_changed'] = True
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Tenant, _event_name, _mark_tenants_changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _tenant_cache_after_commit(session):
+    if session.info.pop('tenants_changed', False):
+        invalidate_tenant_cache()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _tenant_cache_after_rollback(session):
+    session.info.pop('tenants_changed', None)
@@ -0,0 +1,227 @@
+"""
+Unread notification counters
+
+The notification bell polls the unread count constantly. Each user's count
+is kept in Redis (notifications:unread:{user_id}) and adjusted by the
+writes that change it: new notifications, mark as read (one or all) and
+soft deletes. Adjustments are collected on the session and applied after
+commit, so rolled-back work never reaches the counters.
+
+Counters are only adjusted while they exist. A missing counter is
+recounted from the database (an index-only scan of
+idx_notifications_user_unread) and cached with a TTL, which also bounds
+how long any drift can survive; `flask notifications reconcile-unread`
+recounts every cached counter on demand. Without Redis every read is a
+database count.
+"""
+from collections import Counter
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import object_session
+from src.database import db, get_redis
+from src.models.notification import Notification
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNREAD_KEY = 'notifications:unread:{user_id}'
+
+# Adjust a counter only if it is cached; drop it if it would go negative
+_INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('DEL', KEYS[1])
+end
+return value
+"""
+
+# Replace a counter only if nothing adjusted it since it was read
+_COMPARE_AND_SET_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_scripts = {}
+
+
+def _script(redis, source):
+    """Registered Lua script, per Redis client"""
+    key = (id(redis), source)
+    script = _scripts.get(key)
+    if script is None:
+        script = _scripts[key] = redis.register_script(source)
+    return script
+
+
+def _count_unread(user_ids):
+    """Unread counts from the database for several users (missing users have 0)"""
+    rows = db.session.execute(
+        select(Notification.user_id, func.count()).where(
+            Notification.user_id.in_(user_ids),
+            Notification.is_read == False,
+            Notification.is_deleted == False
+        ).group_by(Notification.user_id)
+    ).all()
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(rows)
+    return counts
+
+
+def get_unread_count(user_id):
+    """
+    Unread notification count for a user
+
+    Served from the Redis counter; on a miss the count is loaded from the
+    database and cached.
+    """
+    redis = get_redis()
+    key = UNREAD_KEY.format(user_id=user_id)
+    if redis:
+        try:
+            cached = redis.get(key)
+            if cached is not None:
+                return int(cached)
+        except Exception as e:
+            logger.warning(f'Unread counter read failed: {e}')
+            redis = None
+
+    count = Notification.get_unread_count(user_id)
+
+    if redis:
+        try:
+            redis.set(key, count, ex=current_app.config.get('NOTIFICATION_UNREAD_CACHE_TTL', 3600), nx=True)
+        except Exception as e:
+            logger.warning(f'Unread counter write failed: {e}')
+    return count
+
+
+def record_unread_change(session, user_id, delta):
+    """
+    Adjust a user's counter when the session commits
+
+    ORM changes to notifications are recorded automatically; call this for
+    Core/bulk statements that bypass the ORM.
+    """
+    if session is not None and delta:
+        session.info.setdefault('unread_deltas', Counter())[user_id] += delta
+
+
+def invalidate_unread_counts(*user_ids):
+    """Drop cached counters so the next read recounts from the database"""
+    redis = get_redis()
+    if redis and user_ids:
+        try:
+            redis.delete(*(UNREAD_KEY.format(user_id=user_id) for user_id in user_ids))
+        except Exception as e:
+            logger.warning(f'Unread counter invalidation failed: {e}')
+
+
+def apply_unread_changes(deltas):
+    """Apply committed {user_id: delta} adjustments in one round trip"""
+    redis = get_redis()
+    if not redis or not deltas:
+        return
+
+    try:
+        increment = _script(redis, _INCREMENT_SCRIPT)
+        pipeline = redis.pipeline(transaction=False)
+        for user_id, delta in deltas.items():
+            if delta:
+                increment(keys=[UNREAD_KEY.format(user_id=user_id)], args=[delta], client=pipeline)
+        pipeline.execute()
+    except Exception as e:
+        # Stale counters would otherwise survive until they expire
+        logger.warning(f'Unread counter update failed: {e}')
+        invalidate_unread_counts(*deltas)
+
+
+def reconcile_unread_counts(batch_size=500):
+    """
+    Recount every cached counter from the database
+
+    Counters adjusted while their batch is being recounted are left alone
+    (their next expiry recounts them).
+
+    Returns:
+        dict with checked and corrected counts
+    """
+    stats = {'checked': 0, 'corrected': 0}
+    redis = get_redis()
+    if not redis:
+        return stats
+
+    ttl = current_app.config.get('NOTIFICATION_UNREAD_CACHE_TTL', 3600)
+    compare_and_set = _script(redis, _COMPARE_AND_SET_SCRIPT)
+    prefix = UNREAD_KEY.format(user_id='')
+
+    def reconcile(keys):
+        cached = redis.mget(keys)
+        user_ids = [int(key[len(prefix):]) for key in keys]
+        counts = _count_unread(user_ids)
+
+        for key, user_id, value in zip(keys, user_ids, cached):
+            if value is None:
+                continue
+            stats['checked'] += 1
+            if int(value) != counts[user_id] and compare_and_set(keys=[key], args=[value, counts[user_id], ttl]):
+                stats['corrected'] += 1
+
+    batch = []
+    for key in redis.scan_iter(match=f'{prefix}*', count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            reconcile(batch)
+            batch = []
+    if batch:
+        reconcile(batch)
+
+    logger.info(f'Unread counters reconciled: {stats}')
+    return stats
+
+
+def _is_unread(is_read, is_deleted):
+    return not is_read and not is_deleted
+
+
+@event.listens_for(Notification, 'after_insert')
+def _unread_after_insert(mapper, connection, target):
+    if _is_unread(target.is_read, target.is_deleted):
+        record_unread_change(object_session(target), target.user_id, 1)
+
+
+@event.listens_for(Notification, 'after_update')
+def _unread_after_update(mapper, connection, target):
+    state = inspect(target)
+
+    def previous(field):
+        history = state.attrs[field].history
+        return history.deleted[0] if history.deleted else getattr(target, field)
+
+    was_unread = _is_unread(previous('is_read'), previous('is_deleted'))
+    is_unread = _is_unread(target.is_read, target.is_deleted)
+    if was_unread != is_unread:
+        record_unread_change(object_session(target), target.user_id, 1 if is_unread else -1)
+
+
+@event.listens_for(Notification, 'after_delete')
+def _unread_after_delete(mapper, connection, target):
+    if _is_unread(target.is_read, target.is_deleted):
+        record_unread_change(object_session(target), target.user_id, -1)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _unread_after_commit(session):
+    deltas = session.info.pop('unread_deltas', None)
+    if deltas:
+        apply_unread_changes(deltas)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _unread_after_rollback(session):
+    session.info.pop('unread_deltas', None)
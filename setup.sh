@@ -144,6 +144,16 @@ server {
     listen 5000;
     server_name _;
 
+    location /socket.io/ {
+        proxy_pass http://127.0.0.1:8001;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_read_timeout 3600s;
+    }
+
     location / {
         proxy_pass http://127.0.0.1:8000;
         proxy_set_header Host $host;
@@ -193,7 +203,28 @@ Type=simple
 User=root
 WorkingDirectory=/var/www/MarketEdgePros/backend
 Environment="PATH=/var/www/MarketEdgePros/backend/venv/bin"
-ExecStart=/var/www/MarketEdgePros/backend/venv/bin/gunicorn -w 4 -b 127.0.0.1:8000 --timeout 300 "src.app:create_app()"
+Environment="SOCKETIO_ASYNC_MODE=threading"
+ExecStart=/var/www/MarketEdgePros/backend/venv/bin/gunicorn -w 4 --worker-class gthread --threads 8 -b 127.0.0.1:8000 --timeout 300 "src.app:create_app()"
+Restart=always
+RestartSec=10
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# Socket.IO gets its own single eventlet worker (websockets); nginx routes /socket.io/ to it
+cat > /etc/systemd/system/proptradepro-socketio.service << 'EOF'
+[Unit]
+Description=MarketEdgePros realtime notifications (Socket.IO)
+After=network.target
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory=/var/www/MarketEdgePros/backend
+Environment="PATH=/var/www/MarketEdgePros/backend/venv/bin"
+Environment="SOCKETIO_ASYNC_MODE=eventlet"
+ExecStart=/var/www/MarketEdgePros/backend/venv/bin/gunicorn --worker-class eventlet -w 1 -b 127.0.0.1:8001 "src.app:create_app()"
 Restart=always
 RestartSec=10
 
@@ -202,8 +233,8 @@ WantedBy=multi-user.target
 EOF
 
 systemctl daemon-reload
-systemctl enable proptradepro
-systemctl start proptradepro
+systemctl enable proptradepro proptradepro-socketio
+systemctl start proptradepro proptradepro-socketio
 
 # Configure firewall
 echo "🔒 Configuring firewall..."
@@ -229,6 +260,7 @@ echo ""
 echo "📊 Useful Commands:"
 echo "   systemctl status proptradepro"
 echo "   journalctl -u proptradepro -f"
+echo "   journalctl -u proptradepro-socketio -f"
 echo "   systemctl restart proptradepro"
 echo ""
 echo "🎉 Enjoy your MarketEdgePros platform!"